@@ -0,0 +1,118 @@
+# agent/agregado_conversaciones.py
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+import networkx as nx
+
+UMBRAL_RELACION_TEMPORAL = 0.3  # relevancia_temporal a partir de la cual una conexión cuenta como temporal
+
+
+class AgregadoConversaciones:
+    """
+    Tabla compacta de relaciones entre pares de conversaciones, agregada desde
+    las aristas (dirigidas) entre fragmentos de conversaciones distintas:
+    peso total, cantidad de conexiones, peso máximo y si hay conexiones temporales.
+    Además indexa las aristas incidentes a cada conversación (y las internas por
+    separado) y cuenta las relaciones intra/inter conversación.
+    Se mantiene al ingerir cada nodo nuevo (y se reconstruye en los recálculos
+    completos, los únicos que reemplazan aristas), así la vista macro, la micro filtrada
+    y las estadísticas no recorren todas las aristas de fragmentos en cada request.
+    """
+
+    def __init__(self, grafo: nx.DiGraph, metadatos_contextos: Dict[str, Dict]):
+        self.grafo = grafo
+        self.metadatos_contextos = metadatos_contextos
+        self._pares: Dict[Tuple[str, str], Dict] = {}
+        self._incidentes: Dict[str, Set[Tuple[str, str]]] = {}  # conversación → aristas que la tocan
+        self._internas: Dict[str, Set[Tuple[str, str]]] = {}    # conversación → aristas entre sus fragmentos
+        self.intra_conversacion = 0
+        self.inter_conversacion = 0
+        self.total_aristas = 0
+        self._lock = threading.Lock()
+        self.reconstruir()
+
+    def reconstruir(self) -> Dict:
+        """Recalcula la tabla completa (carga inicial o recálculo de relaciones)."""
+        with self._lock:
+            self._pares = {}
+            self._incidentes = {}
+            self._internas = {}
+            self.intra_conversacion = 0
+            self.inter_conversacion = 0
+            self.total_aristas = 0
+            for origen, destino, datos in self.grafo.edges(data=True):
+                self._acumular(origen, destino, datos)
+        return self.estadisticas()
+
+    def actualizar_nodo_nuevo(self, nodo_nuevo: str):
+        """Suma las aristas que _actualizar_relaciones_incremental creó para `nodo_nuevo`."""
+        if nodo_nuevo not in self.grafo:
+            return
+        with self._lock:
+            for origen, destino, datos in self.grafo.out_edges(nodo_nuevo, data=True):
+                self._acumular(origen, destino, datos)
+            for origen, destino, datos in self.grafo.in_edges(nodo_nuevo, data=True):
+                if origen != nodo_nuevo:
+                    self._acumular(origen, destino, datos)
+
+    def pares(self) -> List[Tuple[Tuple[str, str], Dict]]:
+        """Copia de la tabla: ((conv_a, conv_b), {peso_total, conexiones_fragmentos, max_peso_individual, ...})."""
+        with self._lock:
+            return [
+                (par, {
+                    "peso_total": round(datos["peso_total"], 6),
+                    "conexiones_fragmentos": datos["conexiones"],
+                    "max_peso_individual": datos["max_peso"],
+                    "conexiones_temporales": datos["temporales"],
+                    "es_temporal": datos["temporales"] > 0,
+                    "tipos_relacion": [
+                        tipo for tipo, cantidad in (("temporal", datos["temporales"]),
+                                                    ("semantica", datos["conexiones"] - datos["temporales"]))
+                        if cantidad > 0
+                    ]
+                })
+                for par, datos in self._pares.items()
+            ]
+
+    def aristas_de_conversacion(self, conversacion_id: str, solo_internas: bool = False) -> List[Tuple[str, str]]:
+        """Aristas (origen, destino) que tocan la conversación, o solo las internas."""
+        indice = self._internas if solo_internas else self._incidentes
+        with self._lock:
+            return list(indice.get(conversacion_id, ()))
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            return {
+                "pares_conversaciones": len(self._pares),
+                "intra_conversacion": self.intra_conversacion,
+                "inter_conversacion": self.inter_conversacion,
+                "total_aristas": self.total_aristas
+            }
+
+    def _conversacion(self, nodo: str) -> Optional[str]:
+        return self.metadatos_contextos.get(nodo, {}).get("conversacion_id")
+
+    def _acumular(self, origen: str, destino: str, datos: Dict):
+        self.total_aristas += 1
+        conv_origen = self._conversacion(origen)
+        conv_destino = self._conversacion(destino)
+        arista = (origen, destino)
+        for conv_id in {conv for conv in (conv_origen, conv_destino) if conv}:
+            self._incidentes.setdefault(conv_id, set()).add(arista)
+
+        if not conv_origen or not conv_destino:
+            return
+        if conv_origen == conv_destino:
+            self.intra_conversacion += 1
+            self._internas.setdefault(conv_origen, set()).add(arista)
+            return
+
+        self.inter_conversacion += 1
+        par = tuple(sorted((conv_origen, conv_destino)))
+        peso = datos.get("peso_efectivo", 0)
+        entrada = self._pares.setdefault(par, {"peso_total": 0.0, "conexiones": 0, "temporales": 0,
+                                               "max_peso": 0.0})
+        entrada["peso_total"] += peso
+        entrada["conexiones"] += 1
+        entrada["max_peso"] = max(entrada["max_peso"], peso)
+        if datos.get("relevancia_temporal", 0) > UMBRAL_RELACION_TEMPORAL:
+            entrada["temporales"] += 1
@@ -0,0 +1,157 @@
+# agent/cache_disco.py
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+ESPERA_GUARDADO_S = 2.0  # Agrupa las escrituras a disco de varias inserciones seguidas
+
+
+class GuardadoDiferido:
+    """
+    Escritura atómica de un JSON a disco, diferida a un hilo aparte y agrupada:
+    varias llamadas a programar() dentro de la espera producen una sola escritura.
+    `tomar_copia` devuelve una copia consistente de los datos (tomando el lock del dueño).
+    """
+
+    def __init__(self, archivo: str, tomar_copia: Callable[[], Dict], descripcion: str,
+                 espera_s: float = ESPERA_GUARDADO_S):
+        self.archivo = archivo
+        self.tomar_copia = tomar_copia
+        self.descripcion = descripcion
+        self.espera_s = espera_s
+        self._lock = threading.Lock()
+        self._lock_escritura = threading.Lock()
+        self._programado: Optional[threading.Timer] = None
+
+    def programar(self):
+        with self._lock:
+            if self._programado is not None:
+                return
+            self._programado = threading.Timer(self.espera_s, self.guardar_ahora)
+            self._programado.daemon = True
+            self._programado.start()
+
+    def guardar_ahora(self):
+        """Escribe ya (lo usa el guardado diferido y el cierre del servidor)."""
+        # La copia se toma dentro del lock de escritura: una copia vieja nunca pisa a una más nueva
+        with self._lock_escritura:
+            with self._lock:
+                if self._programado is not None:
+                    self._programado.cancel()
+                    self._programado = None
+            datos = self.tomar_copia()
+            try:
+                os.makedirs(os.path.dirname(self.archivo) or ".", exist_ok=True)
+                temporal = f"{self.archivo}.tmp"
+                with open(temporal, 'w', encoding='utf-8') as f:
+                    json.dump(datos, f, ensure_ascii=False)
+                os.replace(temporal, self.archivo)
+            except Exception as e:
+                print(f"⚠️ No se pudo guardar {self.descripcion}: {e}")
+
+
+class CacheLRUDisco:
+    """
+    Base de los cachés LRU con TTL por entrada y persistencia opcional en un
+    archivo JSON (archivo=None para mantenerlo solo en memoria).
+    Las subclases arman la clave y deciden qué guardar en cada entrada.
+    La escritura a disco se difiere a un hilo aparte: insertar nunca bloquea
+    al llamador (que puede ser el event loop) con la serialización del archivo.
+    """
+    nombre = "caché"
+
+    def __init__(self, archivo: Optional[str], ttl_horas: float, max_entradas: int,
+                 espera_guardado_s: float = ESPERA_GUARDADO_S):
+        self.archivo = archivo
+        self.ttl_segundos = ttl_horas * 3600
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._guardado = GuardadoDiferido(archivo, self._copiar_entradas, f"el {self.nombre}",
+                                          espera_guardado_s) if archivo else None
+        self._entradas: "OrderedDict[str, Dict]" = self._cargar()
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.expiradas = 0
+        self.desalojadas = 0
+
+    def _obtener_entrada(self, clave: str) -> Optional[Dict]:
+        """Entrada vigente (la marca como usada recientemente) o None si no está o venció."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            if time.time() - entrada["guardado_en"] > self.ttl_segundos:
+                del self._entradas[clave]
+                self.expiradas += 1
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    def _guardar_entrada(self, clave: str, entrada: Dict):
+        with self._lock:
+            self._entradas[clave] = {**entrada, "guardado_en": time.time()}
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.desalojadas += 1
+            self._programar_guardado()
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.aciertos = self.fallos = self.expiradas = self.desalojadas = 0
+            self._programar_guardado()
+
+    def guardar_ahora(self):
+        """Escribe el caché a disco ya (cierre del servidor)."""
+        if self._guardado is not None:
+            self._guardado.guardar_ahora()
+
+    def _programar_guardado(self):
+        if self._guardado is not None:
+            self._guardado.programar()
+
+    def _copiar_entradas(self) -> Dict[str, Dict]:
+        with self._lock:
+            return dict(self._entradas)  # Las entradas no se modifican: alcanza con copiar el índice
+
+    def obtener_estadisticas(self) -> Dict:
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_horas": round(self.ttl_segundos / 3600, 2),
+                "persistente": self.archivo is not None,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expiradas": self.expiradas,
+                "desalojadas": self.desalojadas,
+                "tasa_aciertos": round(self.aciertos / total, 3) if total else 0.0
+            }
+
+    def _cargar(self) -> "OrderedDict[str, Dict]":
+        """Carga el caché desde disco descartando entradas vencidas"""
+        if not self.archivo or not os.path.exists(self.archivo):
+            return OrderedDict()
+        try:
+            with open(self.archivo, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+        except Exception as e:
+            print(f"⚠️ No se pudo cargar el {self.nombre}: {e}")
+            return OrderedDict()
+
+        ahora = time.time()
+        vigentes = sorted(
+            ((clave, entrada) for clave, entrada in datos.items()
+             if ahora - entrada.get("guardado_en", 0) <= self.ttl_segundos),
+            key=lambda item: item[1]["guardado_en"]
+        )
+        return OrderedDict(vigentes[-self.max_entradas:])
@@ -0,0 +1,57 @@
+# agent/cache_respuestas.py
+import hashlib
+import os
+from typing import Dict, Optional
+from agent.cache_disco import CacheLRUDisco
+from agent.cache_temporal import normalizar_pregunta
+
+# Persistencia opcional en disco (CACHE_RESPUESTAS_PERSISTIR=0 para mantenerlo solo en memoria)
+ARCHIVO_CACHE_RESPUESTAS = "data/cache_respuestas.json"
+CACHE_RESPUESTAS_PERSISTIR = os.getenv("CACHE_RESPUESTAS_PERSISTIR", "1") == "1"
+
+
+def huella_contexto(contexto: Dict) -> str:
+    """Hash del contenido de un contexto: cambia si cambia su texto, título o fecha."""
+    contenido = "\x1f".join([
+        contexto.get("titulo", ""),
+        contexto.get("texto", ""),
+        str(contexto.get("timestamp") or "")
+    ])
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheRespuestas(CacheLRUDisco):
+    """
+    Caché LRU de respuestas del LLM.
+    La clave combina la pregunta normalizada con los IDs recuperados (ordenados)
+    y el hash de contenido de cada uno: si cambia algún contexto, o se recupera
+    otro conjunto, la clave cambia y la respuesta vieja deja de usarse.
+    """
+    nombre = "caché de respuestas"
+
+    def __init__(self, archivo: Optional[str] = ARCHIVO_CACHE_RESPUESTAS, max_entradas: int = 1000,
+                 ttl_horas: float = 24.0):
+        super().__init__(archivo, ttl_horas, max_entradas)
+
+    @staticmethod
+    def construir_clave(pregunta: str, contextos: Dict[str, Dict], variante: str = "") -> str:
+        partes = [normalizar_pregunta(pregunta)]
+        if variante:
+            # Respuestas generadas de otra forma (p. ej. map-reduce) no se mezclan con las directas
+            partes.append(f"variante:{variante}")
+        partes.extend(f"{ctx_id}:{huella_contexto(contextos[ctx_id])}" for ctx_id in sorted(contextos))
+        return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+
+    def obtener(self, pregunta: str, contextos: Dict[str, Dict], variante: str = "") -> Optional[str]:
+        entrada = self._obtener_entrada(self.construir_clave(pregunta, contextos, variante))
+        return entrada["respuesta"] if entrada is not None else None
+
+    def guardar(self, pregunta: str, contextos: Dict[str, Dict], respuesta: str, variante: str = ""):
+        # Los errores del LLM no se cachean: el próximo intento debe volver a consultar
+        if not respuesta or respuesta.startswith("[ERROR]"):
+            return
+        self._guardar_entrada(self.construir_clave(pregunta, contextos, variante), {"respuesta": respuesta})
+
+
+# Instancia global
+cache_respuestas = CacheRespuestas(archivo=ARCHIVO_CACHE_RESPUESTAS if CACHE_RESPUESTAS_PERSISTIR else None)
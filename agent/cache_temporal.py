@@ -0,0 +1,52 @@
+# agent/cache_temporal.py
+import re
+import unicodedata
+from datetime import datetime
+from typing import Dict, Optional
+from agent.cache_disco import CacheLRUDisco
+
+# Archivo para persistir el caché entre reinicios
+ARCHIVO_CACHE_TEMPORAL = "data/cache_temporal.json"
+
+
+def normalizar_pregunta(pregunta: str) -> str:
+    """Normaliza la pregunta: minúsculas, sin tildes, sin puntuación y espacios simples."""
+    texto = unicodedata.normalize('NFKD', pregunta.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^\w\s/\-]', ' ', texto)
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+class CacheAnalisisTemporal(CacheLRUDisco):
+    """
+    Caché persistente de análisis temporales del LLM.
+    La clave es la pregunta normalizada + el día de momento_consulta, porque
+    la ventana resuelta ("ayer", "esta semana") solo depende de esas dos cosas.
+    Política LRU con límite de tamaño y TTL por entrada.
+    """
+    nombre = "caché temporal"
+
+    def __init__(self, archivo: str = ARCHIVO_CACHE_TEMPORAL, ttl_horas: float = 48.0,
+                 max_entradas: int = 2000):
+        super().__init__(archivo, ttl_horas, max_entradas)
+
+    @staticmethod
+    def construir_clave(pregunta: str, momento: datetime) -> str:
+        return f"{momento.date().isoformat()}|{normalizar_pregunta(pregunta)}"
+
+    def obtener(self, pregunta: str, momento: datetime) -> Optional[Dict]:
+        """Devuelve una copia del resultado cacheado (actualizando momento_consulta) o None."""
+        entrada = self._obtener_entrada(self.construir_clave(pregunta, momento))
+        if entrada is None:
+            return None
+        resultado = dict(entrada["resultado"])
+        resultado["momento_consulta"] = momento.isoformat()
+        resultado["desde_cache"] = True
+        return resultado
+
+    def guardar(self, pregunta: str, momento: datetime, resultado: Dict):
+        self._guardar_entrada(self.construir_clave(pregunta, momento), {"resultado": dict(resultado)})
+
+
+# Instancia global
+cache_temporal = CacheAnalisisTemporal()
@@ -0,0 +1,67 @@
+# agent/cache_visualizacion.py
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+
+class CacheVisualizacion:
+    """
+    Vistas del grafo (macro, micro, micro por conversación) ya serializadas a JSON.
+    Cada entrada vale para una versión del grafo y una generación del caché:
+    cualquier cambio del grafo o una invalidación explícita (ingesta) la descarta.
+    El ETag es el hash del cuerpo, así sirve también entre reinicios del servidor.
+    """
+
+    def __init__(self, max_entradas: int = 32):
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, Dict]" = OrderedDict()
+        self._generacion = 0
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    def obtener(self, vista: str, version: int, construir: Callable[[], Dict]) -> Tuple[bytes, str]:
+        """(cuerpo JSON, ETag) de la vista; se construye y serializa solo si no está vigente."""
+        with self._lock:
+            generacion = self._generacion
+            entrada = self._entradas.get(vista)
+            if entrada is not None and entrada["version"] == (version, generacion):
+                self._entradas.move_to_end(vista)
+                self.aciertos += 1
+                return entrada["cuerpo"], entrada["etag"]
+            self.fallos += 1
+
+        cuerpo = json.dumps(construir(), ensure_ascii=False, default=str).encode("utf-8")
+        etag = f'"{hashlib.blake2b(cuerpo, digest_size=12).hexdigest()}"'
+
+        with self._lock:
+            # Si hubo una invalidación mientras se construía, no guardar una vista vieja
+            if self._generacion == generacion:
+                self._entradas[vista] = {"version": (version, generacion), "cuerpo": cuerpo, "etag": etag}
+                self._entradas.move_to_end(vista)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+        return cuerpo, etag
+
+    def invalidar(self, *_):
+        """Descarta todas las vistas (acepta la versión cuando se usa como oyente de cambios)."""
+        with self._lock:
+            self._generacion += 1
+            self._entradas.clear()
+            self.invalidaciones += 1
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "vistas_cacheadas": len(self._entradas),
+                "bytes": sum(len(e["cuerpo"]) for e in self._entradas.values()),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else 0.0,
+                "invalidaciones": self.invalidaciones
+            }
@@ -0,0 +1,59 @@
+# agent/cambios_grafo.py
+import threading
+from collections import deque
+from typing import Dict, Iterable, Tuple
+
+MAX_VERSIONES_REGISTRADAS = 500
+
+
+class RegistroCambiosGrafo:
+    """
+    Log acotado en memoria de qué nodos y aristas tocó cada versión del grafo.
+    Permite responder "qué cambió desde la versión N" sin reenviar el grafo completo.
+    Los cambios masivos (recálculo, carga, borrado) se registran como reinicio:
+    quien venga de antes de un reinicio tiene que recargar todo.
+    """
+
+    def __init__(self, max_versiones: int = MAX_VERSIONES_REGISTRADAS):
+        self._lock = threading.Lock()
+        self._versiones = deque(maxlen=max_versiones)  # (version, nodos, aristas, reinicio)
+
+    def registrar(self, version: int, nodos: Iterable[str] = (), aristas: Iterable[Tuple[str, str]] = (),
+                  reinicio: bool = False):
+        pares = {tuple(sorted(par)) for par in aristas}
+        with self._lock:
+            self._versiones.append((version, set(nodos), pares, reinicio))
+
+    def cambios_desde(self, desde: int, version_actual: int) -> Dict:
+        """
+        {"completo": True} si no se puede armar el delta (versión desconocida, fuera
+        del log o anterior a un reinicio); si no, los nodos y pares de aristas tocados.
+        """
+        nodos, aristas = set(), set()
+        if desde == version_actual:
+            return {"completo": False, "nodos": nodos, "aristas": aristas}
+        if desde > version_actual:
+            # El cliente viene de otra ejecución del servidor
+            return {"completo": True}
+
+        with self._lock:
+            versiones = list(self._versiones)
+        # El log tiene que cubrir todas las versiones posteriores a `desde`
+        if not versiones or versiones[0][0] > desde + 1:
+            return {"completo": True}
+        for version, nodos_version, aristas_version, reinicio in versiones:
+            if version <= desde:
+                continue
+            if reinicio:
+                return {"completo": True}
+            nodos |= nodos_version
+            aristas |= aristas_version
+        return {"completo": False, "nodos": nodos, "aristas": aristas}
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            return {
+                "versiones_registradas": len(self._versiones),
+                "version_mas_antigua": self._versiones[0][0] if self._versiones else None,
+                "max_versiones": self._versiones.maxlen
+            }
@@ -0,0 +1,77 @@
+# agent/centralidad.py
+from typing import Dict, List
+import networkx as nx
+from agent.tareas_fondo import RefrescoEnSegundoPlano, copiar_grafo_seguro
+
+
+def calcular_centralidad_sparse(grafo: nx.DiGraph, alpha: float = 0.85,
+                                max_iter: int = 100, tol: float = 1e-6) -> Dict[str, float]:
+    """
+    Centralidad por iteración de potencias sobre la matriz dispersa de relaciones
+    (PageRank ponderado por peso_efectivo). Costo O(aristas) por iteración,
+    en lugar de una propagación completa desde cada nodo.
+    Returns:
+        Dict[nodo_id, score] ordenado por score descendente
+    """
+    if grafo.number_of_nodes() == 0:
+        return {}
+
+    try:
+        scores = nx.pagerank(grafo, alpha=alpha, weight='peso_efectivo', max_iter=max_iter, tol=tol)
+    except nx.PowerIterationFailedConvergence as e:
+        print(f"⚠️ Centralidad sin converger en {max_iter} iteraciones: {e}")
+        scores = nx.pagerank(grafo, alpha=alpha, weight='peso_efectivo', max_iter=max_iter * 5, tol=tol * 10)
+
+    return dict(sorted(scores.items(), key=lambda x: x[1], reverse=True))
+
+
+class ServicioCentralidad(RefrescoEnSegundoPlano):
+    """Centralidad de nodos recalculada en segundo plano por versión del grafo."""
+    nombre = "centralidad"
+
+    def calcular(self, grafo: nx.DiGraph) -> Dict:
+        scores = calcular_centralidad_sparse(copiar_grafo_seguro(grafo))
+        ranking = list(scores.items())
+        score_maximo = ranking[0][1] if ranking else 0.0
+        return {
+            "scores": scores,
+            "ranking": ranking,
+            "score_maximo": score_maximo
+        }
+
+    def obtener_score(self, nodo_id: str) -> float:
+        """Score en caché de un nodo (0.0 si todavía no fue calculado)."""
+        resultado, _ = self.obtener()
+        if not resultado:
+            return 0.0
+        return resultado["scores"].get(nodo_id, 0.0)
+
+    def obtener_pagina(self, top_k: int = None, pagina: int = 1, por_pagina: int = 20) -> Dict:
+        """Ranking paginado desde la caché. top_k limita el ranking antes de paginar."""
+        resultado, _ = self.obtener()
+        ranking: List = resultado["ranking"] if resultado else []
+        score_maximo = resultado["score_maximo"] if resultado else 0.0
+
+        if top_k is not None:
+            ranking = ranking[:max(0, top_k)]
+
+        pagina = max(1, pagina)
+        por_pagina = max(1, min(500, por_pagina))
+        inicio = (pagina - 1) * por_pagina
+
+        return {
+            **self.estado(),
+            "total_nodos": len(ranking),
+            "pagina": pagina,
+            "por_pagina": por_pagina,
+            "total_paginas": (len(ranking) + por_pagina - 1) // por_pagina,
+            "resultados": [
+                {
+                    "posicion": inicio + i + 1,
+                    "id": nodo_id,
+                    "score": score,
+                    "score_normalizado": round(score / score_maximo, 4) if score_maximo > 0 else 0.0
+                }
+                for i, (nodo_id, score) in enumerate(ranking[inicio:inicio + por_pagina])
+            ]
+        }
@@ -0,0 +1,178 @@
+# agent/cliente_llm.py
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, Optional
+import httpx
+
+# Configuración por variables de entorno (GEMINI_BASE_URL permite apuntar a un servidor local de prueba)
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MODELO = os.getenv("GEMINI_MODELO", "gemini-2.5-flash")
+LLM_MAX_CONCURRENCIA = int(os.getenv("LLM_MAX_CONCURRENCIA", "8"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+
+# Nombres de generation_config del SDK → nombres de la API REST
+_CLAVES_GENERACION = {
+    'temperature': 'temperature',
+    'top_p': 'topP',
+    'top_k': 'topK',
+    'max_output_tokens': 'maxOutputTokens',
+}
+
+
+class ErrorLLM(Exception):
+    """Error de la llamada al LLM (HTTP, timeout o respuesta sin texto)."""
+
+
+class ClienteGeminiAsync:
+    """
+    Cliente asíncrono reutilizable para la API REST de Gemini.
+    Mantiene un único httpx.AsyncClient (reutiliza conexiones), limita las
+    llamadas simultáneas con un semáforo y aplica timeout por llamada.
+    """
+
+    def __init__(self, api_key: str = GEMINI_API_KEY, base_url: str = GEMINI_BASE_URL,
+                 modelo: str = GEMINI_MODELO, max_concurrencia: int = LLM_MAX_CONCURRENCIA,
+                 timeout_s: float = LLM_TIMEOUT_S):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.modelo = modelo
+        self.max_concurrencia = max_concurrencia
+        self.timeout_s = timeout_s
+
+        self._cliente: Optional[httpx.AsyncClient] = None
+        self._semaforo: Optional[asyncio.Semaphore] = None
+
+        self.llamadas = 0
+        self.errores = 0
+        self.timeouts = 0
+        self.en_curso = 0
+        self.en_espera = 0
+        self.tiempo_total_ms = 0.0
+
+    def _obtener_cliente(self) -> httpx.AsyncClient:
+        if self._cliente is None or self._cliente.is_closed:
+            self._cliente = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout_s),
+                limits=httpx.Limits(max_connections=self.max_concurrencia,
+                                    max_keepalive_connections=self.max_concurrencia),
+                headers={"x-goog-api-key": self.api_key or ""}
+            )
+        return self._cliente
+
+    def _obtener_semaforo(self) -> asyncio.Semaphore:
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_concurrencia)
+        return self._semaforo
+
+    async def generar(self, prompt: str, generation_config: Dict = None, timeout_s: float = None) -> str:
+        """Genera texto para `prompt`. Lanza ErrorLLM si la llamada falla o excede el timeout."""
+        cuerpo = self._construir_cuerpo(prompt, generation_config)
+
+        self.en_espera += 1
+        async with self._obtener_semaforo():
+            self.en_espera -= 1
+            self.en_curso += 1
+            self.llamadas += 1
+            inicio = time.time()
+            try:
+                respuesta = await asyncio.wait_for(
+                    self._obtener_cliente().post(f"/models/{self.modelo}:generateContent", json=cuerpo),
+                    timeout=timeout_s or self.timeout_s
+                )
+                respuesta.raise_for_status()
+                return self._extraer_texto(respuesta.json())
+            except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+                self.timeouts += 1
+                self.errores += 1
+                raise ErrorLLM(f"Timeout llamando a Gemini ({timeout_s or self.timeout_s}s)") from e
+            except httpx.HTTPError as e:
+                self.errores += 1
+                raise ErrorLLM(f"Error HTTP llamando a Gemini: {e}") from e
+            finally:
+                self.en_curso -= 1
+                self.tiempo_total_ms += (time.time() - inicio) * 1000
+
+    async def generar_stream(self, prompt: str, generation_config: Dict = None,
+                             timeout_s: float = None) -> AsyncIterator[str]:
+        """
+        Genera texto por fragmentos (streamGenerateContent con SSE) a medida que llegan.
+        El timeout aplica a la espera de cada fragmento, no a la respuesta completa.
+        """
+        cuerpo = self._construir_cuerpo(prompt, generation_config)
+        timeout = httpx.Timeout(timeout_s or self.timeout_s)
+
+        self.en_espera += 1
+        async with self._obtener_semaforo():
+            self.en_espera -= 1
+            self.en_curso += 1
+            self.llamadas += 1
+            inicio = time.time()
+            try:
+                async with self._obtener_cliente().stream(
+                    "POST", f"/models/{self.modelo}:streamGenerateContent",
+                    params={"alt": "sse"}, json=cuerpo, timeout=timeout
+                ) as respuesta:
+                    respuesta.raise_for_status()
+                    async for linea in respuesta.aiter_lines():
+                        if not linea.startswith("data:"):
+                            continue
+                        texto = self._extraer_texto(json.loads(linea[5:].strip()), requerido=False)
+                        if texto:
+                            yield texto
+            except httpx.TimeoutException as e:
+                self.timeouts += 1
+                self.errores += 1
+                raise ErrorLLM(f"Timeout esperando fragmentos de Gemini ({timeout_s or self.timeout_s}s)") from e
+            except httpx.HTTPError as e:
+                self.errores += 1
+                raise ErrorLLM(f"Error HTTP llamando a Gemini: {e}") from e
+            finally:
+                self.en_curso -= 1
+                self.tiempo_total_ms += (time.time() - inicio) * 1000
+
+    @staticmethod
+    def _construir_cuerpo(prompt: str, generation_config: Dict = None) -> Dict:
+        cuerpo = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if generation_config:
+            cuerpo["generationConfig"] = {
+                _CLAVES_GENERACION.get(clave, clave): valor for clave, valor in generation_config.items()
+            }
+        return cuerpo
+
+    @staticmethod
+    def _extraer_texto(datos: Dict, requerido: bool = True) -> str:
+        try:
+            partes = datos["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError, TypeError):
+            # En streaming el último fragmento puede traer solo finishReason
+            if not requerido:
+                return ""
+            raise ErrorLLM(f"Respuesta de Gemini sin texto: {str(datos)[:200]}")
+        return "".join(parte.get("text", "") for parte in partes)
+
+    async def cerrar(self):
+        if self._cliente is not None and not self._cliente.is_closed:
+            await self._cliente.aclose()
+        self._cliente = None
+
+    def estadisticas(self) -> Dict:
+        return {
+            "modelo": self.modelo,
+            "base_url": self.base_url,
+            "max_concurrencia": self.max_concurrencia,
+            "timeout_s": self.timeout_s,
+            "en_curso": self.en_curso,
+            "en_espera": self.en_espera,
+            "llamadas": self.llamadas,
+            "errores": self.errores,
+            "timeouts": self.timeouts,
+            "tiempo_promedio_ms": round(self.tiempo_total_ms / self.llamadas, 2) if self.llamadas else 0
+        }
+
+
+# Instancia global compartida por todos los endpoints
+cliente_llm = ClienteGeminiAsync()
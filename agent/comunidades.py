@@ -0,0 +1,78 @@
+# agent/comunidades.py
+import os
+from typing import Dict, List, Set, Tuple
+import networkx as nx
+from agent.tareas_fondo import RefrescoEnSegundoPlano, copiar_grafo_seguro
+
+ALGORITMO_COMUNIDADES = os.getenv("ALGORITMO_COMUNIDADES", "louvain")  # louvain | label_propagation
+REPRESENTANTES_POR_CLUSTER = 3
+
+
+def detectar_comunidades(grafo: nx.Graph, algoritmo: str = ALGORITMO_COMUNIDADES) -> List[Set[str]]:
+    """
+    Comunidades del grafo no dirigido ponderado por peso_efectivo.
+    Louvain da mejores grupos; label propagation es más rápido en grafos muy grandes.
+    """
+    if grafo.number_of_nodes() == 0:
+        return []
+    if algoritmo == "label_propagation":
+        return [set(c) for c in nx.community.asyn_lpa_communities(grafo, weight="peso_efectivo", seed=42)]
+    return [set(c) for c in nx.community.louvain_communities(grafo, weight="peso_efectivo", seed=42)]
+
+
+def id_cluster(miembros: Set[str]) -> str:
+    """ID estable entre recálculos mientras el cluster conserve a su miembro menor."""
+    return f"cluster:{min(miembros)}"
+
+
+class ServicioComunidades(RefrescoEnSegundoPlano):
+    """
+    Grafo de clusters (comunidades de fragmentos) recalculado en segundo plano
+    por versión del grafo: miembros, representantes y pesos agregados entre clusters.
+    Es el nivel más grueso de la vista por nivel de detalle.
+    """
+    nombre = "comunidades"
+
+    def calcular(self, grafo: nx.DiGraph) -> Dict:
+        copia = copiar_grafo_seguro(grafo)
+        no_dirigido = copia.to_undirected()
+        comunidades = sorted(detectar_comunidades(no_dirigido), key=len, reverse=True)
+
+        cluster_de: Dict[str, str] = {}
+        clusters: Dict[str, Dict] = {}
+        for miembros in comunidades:
+            cluster_id = id_cluster(miembros)
+            # Representantes: los nodos con más peso de conexiones dentro del cluster
+            grado_interno = {
+                nodo: sum(datos.get("peso_efectivo", 0) for vecino, datos in no_dirigido[nodo].items()
+                          if vecino in miembros)
+                for nodo in miembros
+            }
+            clusters[cluster_id] = {
+                "miembros": sorted(miembros),
+                "representantes": sorted(grado_interno, key=grado_interno.get, reverse=True)[:REPRESENTANTES_POR_CLUSTER],
+                "peso_interno": 0.0,
+                "aristas_internas": 0
+            }
+            for nodo in miembros:
+                cluster_de[nodo] = cluster_id
+
+        aristas: Dict[Tuple[str, str], Dict] = {}
+        for origen, destino, datos in copia.edges(data=True):
+            cluster_a, cluster_b = cluster_de[origen], cluster_de[destino]
+            peso = datos.get("peso_efectivo", 0)
+            if cluster_a == cluster_b:
+                clusters[cluster_a]["peso_interno"] += peso
+                clusters[cluster_a]["aristas_internas"] += 1
+                continue
+            entrada = aristas.setdefault(tuple(sorted((cluster_a, cluster_b))), {"peso_total": 0.0, "conexiones": 0})
+            entrada["peso_total"] += peso
+            entrada["conexiones"] += 1
+
+        return {
+            "clusters": clusters,
+            "cluster_de": cluster_de,
+            "aristas": aristas,
+            "algoritmo": ALGORITMO_COMUNIDADES
+        }
+
@@ -6,18 +6,34 @@ import os
 import uuid
 import threading
 import math
+import asyncio
 from datetime import datetime, timedelta
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Set
 from agent.extractor import extraer_palabras_clave
-from agent.semantica import indexar_documento, coleccion
+from agent.semantica import indexar_documento, coleccion, eliminar_documentos
+from agent.semantica import buscar_similares, buscar_similares_en_ventana, matriz_embeddings, modelo_embeddings
+from agent.semantica import buscar_similares_batch
 from agent.temporal_parser import extraer_referencias_del_texto, parsear_referencia_temporal
-from agent.temporal_llm_parser import analizar_temporalidad_con_llm
+from agent.temporal_llm_parser import analizar_temporalidad_hibrida, analizar_temporalidad_hibrida_async
 from agent.visualizador_doble import VisualizadorDobleNivel
 from agent.fragmentador import fragmentar_conversacion
 from agent.propagacion import crear_propagador, propagar_desde_consulta_integrado
+from agent.indice_dos_saltos import IndiceDosSaltos
+from agent.agregado_conversaciones import AgregadoConversaciones
+from agent.indice_temporal import IndiceTemporal
+from agent.centralidad import ServicioCentralidad
+from agent.resumenes import ServicioResumenes
+from agent.cache_visualizacion import CacheVisualizacion
+from agent.layout_grafo import ServicioLayout
+from agent.tareas_fondo import reintentar_si_cambia
+from agent.comunidades import ServicioComunidades
+from agent.cambios_grafo import RegistroCambiosGrafo
+from agent.plazo import PlazoConsulta
 from agent.utils import parse_iso_datetime_safe
 from agent.utils import normalizar_timestamp_para_guardar
+from agent.utils import timestamp_a_epoch
 from agent.pdf_processor import fragmentar_texto_pdf, crear_attachment_pdf
 from agent.semantica import calcular_similitudes_batch
 from agent.semantica import indexar_documentos_batch
@@ -26,6 +42,30 @@ from agent.semantica import verificar_estado_coleccion
 # Variable global para el propagador
 propagador_global = None
 
+# Vecindario a 2 saltos materializado (se mantiene incrementalmente)
+indice_dos_saltos = None
+
+# Relaciones agregadas entre pares de conversaciones (vista macro, se mantiene incrementalmente)
+agregado_conversaciones = None
+
+# Índice ordenado por timestamp para filtrar ventanas temporales por bisección
+indice_temporal = IndiceTemporal()
+
+# Versión del grafo: aumenta con cada cambio de nodos/aristas.
+# Los cálculos derivados (centralidad, etc.) se invalidan por versión.
+version_grafo = 0
+_lock_version = threading.Lock()  # La versión también la cambia el hilo de resúmenes
+_oyentes_cambio_grafo = []
+
+# Qué nodos/aristas tocó cada versión (para enviar deltas a la visualización)
+registro_cambios = RegistroCambiosGrafo()
+
+# Pool para ejecutar en paralelo el análisis temporal (red) y la búsqueda semántica (local)
+_ejecutor_consultas = ThreadPoolExecutor(max_workers=4, thread_name_prefix="consulta")
+
+# Candidatos semánticos extra que se piden para que sobrevivan al filtro de ventana
+FACTOR_SOBREMUESTREO_VENTANA = 4
+
 #estructuras de datos
 conversaciones_metadata = {}
 fragmentos_metadata = {}
@@ -33,6 +73,13 @@ fragmentos_metadata = {}
 # Umbral mínimo para crear relaciones
 UMBRAL_SIMILITUD = 0.5
 
+def _indexar_nodo_nuevo(nodo_nuevo: str, agregado: AgregadoConversaciones):
+    """Suma el nodo nuevo (y sus aristas, si tiene) al índice de 2 saltos, al agregado y al índice temporal."""
+    # Propagar las nuevas aristas al índice de 2 saltos (solo vecinos afectados)
+    obtener_indice_dos_saltos().actualizar_nodo_nuevo(nodo_nuevo)
+    agregado.actualizar_nodo_nuevo(nodo_nuevo)
+    indice_temporal.agregar(nodo_nuevo, metadatos_contextos.get(nodo_nuevo, {}).get("timestamp"))
+
 def _actualizar_relaciones_incremental(nodo_nuevo: str) -> Dict:
     """
     Actualiza relaciones usando batch de similitudes.
@@ -45,7 +92,13 @@ def _actualizar_relaciones_incremental(nodo_nuevo: str) -> Dict:
     # Obtener todos los nodos excepto el nuevo
     nodos_existentes = [n for n in grafo_contextos.nodes() if n != nodo_nuevo]
     
+    # Obtenerlo antes de crear aristas: si recién se construye, no debe incluir las del nodo nuevo
+    agregado = obtener_agregado_conversaciones()
+    
     if not nodos_existentes:
+        # Primer nodo del grafo: sin aristas, pero tiene que quedar en los índices y en el log de cambios
+        _indexar_nodo_nuevo(nodo_nuevo, agregado)
+        registrar_cambio_grafo(nodos=[nodo_nuevo])
         return {
             "tipo_actualizacion": "incremental",
             "nodo_procesado": nodo_nuevo,
@@ -64,6 +117,7 @@ def _actualizar_relaciones_incremental(nodo_nuevo: str) -> Dict:
     texto_nuevo = metadatos_nuevo.get("texto", "")
     
     conexiones_creadas = 0
+    pares_conectados = []
     
     # Calcular TODAS las similitudes semánticas en UN SOLO BATCH
     similitudes_semanticas = calcular_similitudes_batch(texto_nuevo, nodos_existentes)
@@ -108,6 +162,10 @@ def _actualizar_relaciones_incremental(nodo_nuevo: str) -> Dict:
             grafo_contextos.add_edge(nodo_nuevo, nodo_existente, **datos_arista)
             grafo_contextos.add_edge(nodo_existente, nodo_nuevo, **datos_arista)
             conexiones_creadas += 1
+            pares_conectados.append((nodo_nuevo, nodo_existente))
+    
+    _indexar_nodo_nuevo(nodo_nuevo, agregado)
+    registrar_cambio_grafo(nodos=[nodo_nuevo], aristas=pares_conectados)
     
     tiempo_transcurrido = time.time() - inicio_tiempo
     relaciones_unicas = len(grafo_contextos.edges()) // 2
@@ -346,6 +404,9 @@ def agregar_conversacion(titulo: str, contenido: str, fecha: str = None,
     # Actualizar IDs de conversación con PDFs
     conversaciones_metadata[conversacion_id]['fragmentos_ids'].extend(fragmentos_pdf_ids)
     conversaciones_metadata[conversacion_id]['total_fragmentos'] += len(fragmentos_pdf_ids)
+    # La conversación y sus PDFs se completan después de actualizar las aristas
+    cache_visualizacion.invalidar()
+    cache_lod.invalidar()
     
     # Guardar todo (una sola vez al final)
     guardar_conversaciones_en_disco()
@@ -375,6 +436,9 @@ def agregar_conversacion(titulo: str, contenido: str, fecha: str = None,
     from agent.semantica import verificar_y_reparar_indice
     verificar_y_reparar_indice()
 
+    # Resúmenes extractivos en segundo plano (no demoran la ingesta)
+    servicio_resumenes.encolar(resultado['fragmentos_ids'])
+
     return resultado
 
 def _guardar_conversaciones():
@@ -432,6 +496,9 @@ grafo_contextos = nx.DiGraph()
 metadatos_contextos = {}
 _lock = threading.Lock()
 
+# La matriz de embeddings en memoria toma los timestamps de los metadatos del grafo
+matriz_embeddings.fuente_timestamps = lambda nodo_id: metadatos_contextos.get(nodo_id, {}).get("timestamp")
+
 def usar_parametros_configurables():
     """Función para usar parámetros desde main.py si están disponibles."""
     try:
@@ -522,7 +589,7 @@ def _calcular_similitud_estructural(claves_a: Set[str], claves_b: Set[str], text
         
         # Limpiar temporal
         try:
-            coleccion.delete(ids=[temp_id])
+            eliminar_documentos([temp_id])
         except:
             pass
             
@@ -680,6 +747,11 @@ def _recalcular_relaciones():
     print(f"Total aristas direccionales: {grafo_contextos.number_of_edges()}")
     print(f"Comparaciones procesadas: {comparaciones_realizadas:,}")
     
+    # Todas las aristas cambiaron: reconstruir el vecindario a 2 saltos
+    obtener_indice_dos_saltos().reconstruir()
+    obtener_agregado_conversaciones().reconstruir()
+    registrar_cambio_grafo(reinicio=True)
+    
     return {
         "pares_creados": pares_unicos_creados,
         "tiempo_segundos": round(tiempo_total, 2),
@@ -734,8 +806,16 @@ def cargar_desde_disco():
     # Cargar también conversaciones y fragmentos
     cargar_conversaciones_desde_disco()
 
+    # Construir índice de 2 saltos sobre el grafo recién cargado
+    obtener_indice_dos_saltos()
+    indice_temporal.reconstruir(metadatos_contextos)
+
     #Inicializar propagador después de cargar
     actualizar_propagador()
+    registrar_cambio_grafo(reinicio=True)
+
+    # Completar resúmenes de contextos guardados antes de existir esa etapa
+    servicio_resumenes.encolar_pendientes()
 
 def agregar_contexto(titulo: str, texto: str, es_temporal: bool = None, referencia_temporal: str = None) -> str:
     """Agrega un nuevo contexto con prevención de duplicados y actualización incremental."""
@@ -796,13 +876,14 @@ def agregar_contexto(titulo: str, texto: str, es_temporal: bool = None, referenc
     
     metadatos_contextos[id_contexto] = metadatos
     
-    # Indexar para búsqueda semántica
-    indexar_documento(id_contexto, texto)
+    # Indexar para búsqueda semántica (con timestamp para la recuperación temporal)
+    indexar_documento(id_contexto, texto, {"titulo": titulo, "timestamp": metadatos.get("timestamp")})
     
     # ACTUALIZACIÓN INCREMENTAL en lugar de recálculo completo
     stats_actualizacion = _actualizar_relaciones_incremental(id_contexto)
     
     _guardar_grafo()
+    servicio_resumenes.encolar([id_contexto])
     
     # Mostrar estadísticas de la actualización
     print(f"Contexto agregado: {titulo[:50]}...")
@@ -864,107 +945,171 @@ def obtener_estadisticas() -> Dict:
 
 def exportar_grafo_para_visualizacion() -> Dict:
     """Exporta el grafo para visualización con información de aristas."""
-    nodos = []
-    edges = []
-    
-    for nodo_id in grafo_contextos.nodes():
-        if nodo_id in metadatos_contextos:
-            metadatos = metadatos_contextos[nodo_id]
-            es_temporal = metadatos.get("es_temporal", False)
-            tipo_contexto = metadatos.get("tipo_contexto", "general")
-            es_pdf = metadatos.get("es_pdf", False)
-            
-            # Emoji por tipo de contexto
-            if es_pdf:
-                # 📄 NODO DE PDF con información de fragmento
-                source_doc = metadatos.get('source_document', 'documento.pdf')
-                posicion = metadatos.get('position_in_doc', 0)
-                total_frags = metadatos.get('total_fragmentos_pdf', 1)
-                
-                icono = "📄"
-                titulo_con_icono = f"{icono} {source_doc} ({posicion+1}/{total_frags})"
-                
-                tooltip = f"Documento: {source_doc}\n"
-                tooltip += f"Fragmento: {posicion+1} de {total_frags}\n"
-                tooltip += f"{metadatos.get('texto', '')[:150]}...\n"
-                tooltip += f"Tipo: documento PDF"
-                
-                # Color especial para PDFs
-                group = "pdf"
-            else:
-                # Nodo de conversación normal
-                iconos_tipo = {
-                    "reunion": "👥",
-                    "tarea": "📋", 
-                    "evento": "🎯",
-                    "proyecto": "🚀",
-                    "conocimiento": "📚",
-                    "general": "📄"
-                }
-                
-                icono = iconos_tipo.get(tipo_contexto, "📄")
-                titulo_con_icono = f"{icono} {metadatos.get('titulo', 'Sin título')}"
-                
-                tooltip = f"{metadatos.get('titulo', '')}\n{metadatos.get('texto', '')[:100]}...\nTipo: {tipo_contexto}"
-                
-                group = "temporal" if es_temporal else "atemporal"
-            
-            nodos.append({
-                "id": nodo_id,
-                "label": titulo_con_icono,
-                "title": tooltip,
-                "group": group,
-                "es_temporal": es_temporal,
-                "tipo_contexto": tipo_contexto,
-                "es_pdf": es_pdf
-            })
-    
-    # Extraer datos de aristas
-    for origen, destino, datos in grafo_contextos.edges(data=True):
-        peso_estructural = None
-        relevancia_temporal = None  
-        peso_efectivo = None
-        
-        # Intentar múltiples claves posibles
-        for key in ["peso_estructural", "similitud_estructural", "weight_estructural"]:
-            if key in datos and datos[key] is not None:
-                peso_estructural = float(datos[key])
-                break
-        
-        for key in ["relevancia_temporal", "temporal_relevance", "weight_temporal"]:
-            if key in datos and datos[key] is not None:
-                relevancia_temporal = float(datos[key])
-                break
-                
-        for key in ["peso_efectivo", "weight", "effective_weight"]:
-            if key in datos and datos[key] is not None:
-                peso_efectivo = float(datos[key])
-                break
-        
-        # Valores por defecto
-        peso_estructural = peso_estructural if peso_estructural is not None else 0.0
-        relevancia_temporal = relevancia_temporal if relevancia_temporal is not None else 0.0
-        peso_efectivo = peso_efectivo if peso_efectivo is not None else 0.0
+    centralidad, _ = servicio_centralidad.obtener()
+    ubicar = obtener_ubicador_nodos()
+    nodos = [
+        _nodo_para_visualizacion(nodo_id, centralidad, ubicar)
+        for nodo_id in grafo_contextos.nodes() if nodo_id in metadatos_contextos
+    ]
+    edges = [
+        _arista_para_visualizacion(origen, destino, datos)
+        for origen, destino, datos in grafo_contextos.edges(data=True)
+    ]
+    return {"nodes": nodos, "edges": edges}
+
+def _nodo_para_visualizacion(nodo_id: str, centralidad: Optional[Dict], ubicar=None) -> Dict:
+    """Nodo en formato vis.js (label, tooltip, grupo, centralidad normalizada y posición si hay layout)."""
+    scores_centralidad = centralidad["scores"] if centralidad else {}
+    score_maximo = centralidad["score_maximo"] if centralidad else 0.0
+    
+    metadatos = metadatos_contextos[nodo_id]
+    es_temporal = metadatos.get("es_temporal", False)
+    tipo_contexto = metadatos.get("tipo_contexto", "general")
+    es_pdf = metadatos.get("es_pdf", False)
+    
+    # Emoji por tipo de contexto
+    if es_pdf:
+        # 📄 NODO DE PDF con información de fragmento
+        source_doc = metadatos.get('source_document', 'documento.pdf')
+        posicion = metadatos.get('position_in_doc', 0)
+        total_frags = metadatos.get('total_fragmentos_pdf', 1)
+        
+        icono = "📄"
+        titulo_con_icono = f"{icono} {source_doc} ({posicion+1}/{total_frags})"
+        
+        tooltip = f"Documento: {source_doc}\n"
+        tooltip += f"Fragmento: {posicion+1} de {total_frags}\n"
+        tooltip += f"{metadatos.get('resumen') or metadatos.get('texto', '')[:150] + '...'}\n"
+        tooltip += f"Tipo: documento PDF"
+        
+        # Color especial para PDFs
+        group = "pdf"
+    else:
+        # Nodo de conversación normal
+        iconos_tipo = {
+            "reunion": "👥",
+            "tarea": "📋", 
+            "evento": "🎯",
+            "proyecto": "🚀",
+            "conocimiento": "📚",
+            "general": "📄"
+        }
         
-        tipos_contexto = datos.get("tipos_contexto", "desconocido")
+        icono = iconos_tipo.get(tipo_contexto, "📄")
+        titulo_con_icono = f"{icono} {metadatos.get('titulo', 'Sin título')}"
         
-        # Etiqueta de arista
-        label = f"E:{peso_estructural:.2f}|T:{relevancia_temporal:.2f}|W:{peso_efectivo:.2f}"
-        title = f"Peso Estructural: {peso_estructural:.2f}\nRelevancia Temporal: {relevancia_temporal:.2f}\nPeso Efectivo: {peso_efectivo:.2f}\nTipos: {tipos_contexto}"
+        tooltip = f"{metadatos.get('titulo', '')}\n{metadatos.get('resumen') or metadatos.get('texto', '')[:100] + '...'}\nTipo: {tipo_contexto}"
         
-        edges.append({
-            "from": origen,
-            "to": destino,
-            "weight": peso_efectivo,
-            "label": label,
-            "title": title,
-            "font": {"size": 10, "align": "top"},
-            "peso_estructural": peso_estructural,
-            "relevancia_temporal": relevancia_temporal,
-            "peso_efectivo": peso_efectivo
-        })
+        group = "temporal" if es_temporal else "atemporal"
     
-    return {"nodes": nodos, "edges": edges}
+    nodo = {
+        "id": nodo_id,
+        "label": titulo_con_icono,
+        "title": tooltip,
+        "group": group,
+        "es_temporal": es_temporal,
+        "tipo_contexto": tipo_contexto,
+        "es_pdf": es_pdf,
+        "centralidad": round(scores_centralidad.get(nodo_id, 0.0) / score_maximo, 4) if score_maximo > 0 else 0.0
+    }
+    posicion = ubicar(nodo_id) if ubicar else None
+    if posicion:
+        nodo["x"], nodo["y"] = posicion
+    return nodo
+
+def _arista_para_visualizacion(origen: str, destino: str, datos: Dict) -> Dict:
+    """Arista dirigida en formato vis.js con sus pesos (estructural, temporal y efectivo)."""
+    peso_estructural = None
+    relevancia_temporal = None  
+    peso_efectivo = None
+    
+    # Intentar múltiples claves posibles
+    for key in ["peso_estructural", "similitud_estructural", "weight_estructural"]:
+        if key in datos and datos[key] is not None:
+            peso_estructural = float(datos[key])
+            break
+    
+    for key in ["relevancia_temporal", "temporal_relevance", "weight_temporal"]:
+        if key in datos and datos[key] is not None:
+            relevancia_temporal = float(datos[key])
+            break
+            
+    for key in ["peso_efectivo", "weight", "effective_weight"]:
+        if key in datos and datos[key] is not None:
+            peso_efectivo = float(datos[key])
+            break
+    
+    # Valores por defecto
+    peso_estructural = peso_estructural if peso_estructural is not None else 0.0
+    relevancia_temporal = relevancia_temporal if relevancia_temporal is not None else 0.0
+    peso_efectivo = peso_efectivo if peso_efectivo is not None else 0.0
+    
+    tipos_contexto = datos.get("tipos_contexto", "desconocido")
+    
+    # Etiqueta de arista
+    label = f"E:{peso_estructural:.2f}|T:{relevancia_temporal:.2f}|W:{peso_efectivo:.2f}"
+    title = f"Peso Estructural: {peso_estructural:.2f}\nRelevancia Temporal: {relevancia_temporal:.2f}\nPeso Efectivo: {peso_efectivo:.2f}\nTipos: {tipos_contexto}"
+    
+    return {
+        "from": origen,
+        "to": destino,
+        "weight": peso_efectivo,
+        "label": label,
+        "title": title,
+        "font": {"size": 10, "align": "top"},
+        "peso_estructural": peso_estructural,
+        "relevancia_temporal": relevancia_temporal,
+        "peso_efectivo": peso_efectivo
+    }
+
+def exportar_cambios_grafo(desde: int) -> Dict:
+    """
+    Delta de la vista micro desde la versión `desde`: nodos y aristas agregados o
+    modificados (mismo formato que /grafo/micro/fragmentos/) y los IDs eliminados.
+    Con completo=True el cliente tiene que recargar la vista entera.
+    """
+    version = version_grafo
+    cambios = registro_cambios.cambios_desde(desde, version)
+    if cambios["completo"]:
+        return {"desde": desde, "version": version, "completo": True}
+    
+    centralidad, _ = servicio_centralidad.obtener()
+    ubicar = obtener_ubicador_nodos()
+    nodos, nodos_eliminados = [], []
+    for nodo_id in sorted(cambios["nodos"]):
+        if nodo_id in grafo_contextos and nodo_id in metadatos_contextos:
+            nodos.append(_nodo_para_visualizacion(nodo_id, centralidad, ubicar))
+        else:
+            nodos_eliminados.append(nodo_id)
+    
+    aristas, aristas_eliminadas = [], []
+    for nodo_a, nodo_b in sorted(cambios["aristas"]):
+        direcciones = [
+            _arista_para_visualizacion(origen, destino, grafo_contextos[origen][destino])
+            for origen, destino in ((nodo_a, nodo_b), (nodo_b, nodo_a))
+            if grafo_contextos.has_edge(origen, destino)
+        ]
+        if direcciones:
+            aristas.extend(direcciones)
+        else:
+            aristas_eliminadas.append(f"{nodo_a}|{nodo_b}")
+    
+    visualizador = VisualizadorDobleNivel(
+        grafo_contextos, 
+        metadatos_contextos, 
+        conversaciones_metadata, 
+        fragmentos_metadata
+    )
+    delta = visualizador.adaptar_a_vista_micro({"nodes": nodos, "edges": aristas})
+    return {
+        "desde": desde,
+        "version": version,
+        "completo": False,
+        "nodos": delta["nodes"],
+        "aristas": delta["edges"],
+        "nodos_eliminados": nodos_eliminados,
+        "aristas_eliminadas": aristas_eliminadas
+    }
 
 def construir_arbol_consulta(pregunta: str, contextos_ids: List[str], referencia_temporal: Optional[str] = None, 
                            factor_refuerzo: float = 1.0, momento_consulta: Optional[datetime] = None) -> Dict:
@@ -1012,7 +1157,7 @@ def construir_arbol_consulta(pregunta: str, contextos_ids: List[str], referencia
         titulo_con_icono = f"{icono} {titulo[:25]}{'...' if len(titulo) > 25 else ''}"
         
         # Información temporal en tooltip
-        tooltip_info = f"{titulo}\n{meta.get('texto', '')[:100]}...\nTipo: {tipo_contexto}"
+        tooltip_info = f"{titulo}\n{meta.get('resumen') or meta.get('texto', '')[:100] + '...'}\nTipo: {tipo_contexto}"
         if meta.get("timestamp"):
             fecha_contexto = datetime.fromisoformat(meta["timestamp"])
             tooltip_info += f"\nFecha contexto: {fecha_contexto.strftime('%d/%m %H:%M')}"
@@ -1098,149 +1243,148 @@ def analizar_consulta_completa(pregunta: str, momento_consulta: Optional[datetim
     # Obtener factor base configurado
     parametros = usar_parametros_configurables()
     factor_base = parametros.get('factor_refuerzo_temporal', 1.5)
+    k_busqueda = parametros.get('k_resultados', 5)
     
-    # Analizar intención temporal con contexto 
-    analisis_intencion = analizar_temporalidad_con_llm(
-        pregunta, 
-        momento_consulta,
-        factor_base=factor_base
-    )
+    # El análisis temporal (posible llamada al LLM) corre en paralelo con la búsqueda
+    # semántica local, que no depende de él: latencia = max(LLM, búsqueda)
+    def _analizar_con_tiempo():
+        inicio = time.time()
+        analisis = analizar_temporalidad_hibrida(pregunta, momento_consulta, factor_base=factor_base)
+        return analisis, (time.time() - inicio) * 1000
     
-    referencia_temporal = analisis_intencion.get('timestamp_referencia')
-    parametros = usar_parametros_configurables()
-    factor_refuerzo = parametros.get('factor_refuerzo_temporal', 1.5)
-    ventana_temporal = analisis_intencion.get('ventana_temporal')
+    futuro_analisis = _ejecutor_consultas.submit(_analizar_con_tiempo)
+    busqueda = _recuperar_candidatos_semanticos(pregunta, k_busqueda)
+    analisis_intencion, tiempo_analisis_ms = futuro_analisis.result()
+    
+    return _completar_analisis_consulta(pregunta, momento_consulta, analisis_intencion, tiempo_analisis_ms,
+                                        busqueda, k_busqueda, factor_base)
+
+async def analizar_consulta_completa_async(pregunta: str, momento_consulta: Optional[datetime] = None,
+                                           plazo: Optional[PlazoConsulta] = None) -> Dict:
+    """
+    Versión asíncrona de analizar_consulta_completa: el análisis temporal espera al
+    LLM sin ocupar un hilo y el trabajo local (embeddings, árbol) corre en hilos.
+    Con `plazo`, el análisis temporal cae al parser local si no alcanza el tiempo.
+    """
+    if momento_consulta is None:
+        momento_consulta = datetime.now()
+    plazo = plazo or PlazoConsulta.sin_limite()
     
-    # Obtener contextos relevantes usando parámetros configurables
     parametros = usar_parametros_configurables()
+    factor_base = parametros.get('factor_refuerzo_temporal', 1.5)
     k_busqueda = parametros.get('k_resultados', 5)
     
-    from agent.semantica import buscar_similares
+    async def _analizar_con_tiempo():
+        inicio = time.time()
+        with plazo.medir("analisis_temporal"):
+            analisis = await analizar_temporalidad_hibrida_async(pregunta, momento_consulta, factor_base=factor_base,
+                                                                 plazo=plazo)
+        plazo.resolver("analisis_temporal_llm")
+        return analisis, (time.time() - inicio) * 1000
+    
+    tarea_analisis = asyncio.create_task(_analizar_con_tiempo())
+    with plazo.medir("busqueda_semantica"):
+        busqueda = await asyncio.to_thread(_recuperar_candidatos_semanticos, pregunta, k_busqueda)
+    analisis_intencion, tiempo_analisis_ms = await tarea_analisis
+    
+    with plazo.medir("arbol_consulta"):
+        return await asyncio.to_thread(_completar_analisis_consulta, pregunta, momento_consulta, analisis_intencion,
+                                       tiempo_analisis_ms, busqueda, k_busqueda, factor_base)
+
+def _recuperar_candidatos_semanticos(pregunta: str, k_busqueda: int) -> Dict:
+    """Embedding de la consulta + candidatos semánticos sobremuestreados (no depende del análisis temporal)."""
+    inicio_busqueda = time.time()
+    embedding_consulta = None
     try:
-        # BUSCAR MÁS CONTEXTOS INICIALMENTE para mayor diversidad
-        ids_candidatos = buscar_similares(pregunta, k=k_busqueda * 3)  # 3x más candidatos
+        embedding_consulta = modelo_embeddings.encode(pregunta)
+        # Sobremuestrear candidatos para que alcancen después del filtro de ventana
+        ids_candidatos = buscar_similares(pregunta, k=k_busqueda * FACTOR_SOBREMUESTREO_VENTANA,
+                                          embedding_consulta=embedding_consulta)
     except Exception as e:
         print(f"❌ Error en búsqueda semántica: {e}")
         ids_candidatos = []
-    
-    #  LOGGING: Mostrar contextos candidatos
-    print(f"\nCONTEXTOS CANDIDATOS (top {min(10, len(ids_candidatos))}):")
-    for i, ctx_id in enumerate(ids_candidatos[:10]):
-        if ctx_id in metadatos_contextos:
-            titulo = metadatos_contextos[ctx_id].get('titulo', 'Sin título')[:60]
-            es_temp = metadatos_contextos[ctx_id].get('es_temporal', False)
-            print(f"   {i+1}. {'⏰' if es_temp else '📄'} {titulo}")
+    return {
+        "embedding": embedding_consulta,
+        "ids_candidatos": ids_candidatos,
+        "tiempo_ms": (time.time() - inicio_busqueda) * 1000
+    }
 
-    # Filtrar por ventana temporal si existe
-    ids_similares = ids_candidatos
+def _recuperar_candidatos_semanticos_batch(preguntas: List[str], k_busqueda: int) -> List[Dict]:
+    """
+    Como _recuperar_candidatos_semanticos para varias preguntas: un solo encode y una
+    sola consulta al índice. El tiempo informado es el del batch completo (compartido).
+    """
+    inicio_busqueda = time.time()
+    embeddings = [None] * len(preguntas)
+    ids_por_pregunta = [[] for _ in preguntas]
+    try:
+        embeddings = modelo_embeddings.encode(preguntas, show_progress_bar=False)
+        ids_por_pregunta = buscar_similares_batch(preguntas, k=k_busqueda * FACTOR_SOBREMUESTREO_VENTANA,
+                                                  embeddings_consulta=embeddings)
+    except Exception as e:
+        print(f"❌ Error en búsqueda semántica batch: {e}")
+    tiempo_ms = (time.time() - inicio_busqueda) * 1000
+    return [
+        {"embedding": embeddings[i], "ids_candidatos": ids_por_pregunta[i], "tiempo_ms": tiempo_ms}
+        for i in range(len(preguntas))
+    ]
+
+def _completar_analisis_consulta(pregunta: str, momento_consulta: datetime, analisis_intencion: Dict,
+                                 tiempo_analisis_ms: float, busqueda: Dict, k_busqueda: int,
+                                 factor_refuerzo: float) -> Dict:
+    """Aplica la ventana temporal a los candidatos y construye el árbol de consulta."""
+    embedding_consulta = busqueda["embedding"]
+    ids_candidatos = busqueda["ids_candidatos"]
+    tiempo_busqueda_ms = busqueda["tiempo_ms"]
+    
+    referencia_temporal = analisis_intencion.get('timestamp_referencia')
+    ventana_temporal = analisis_intencion.get('ventana_temporal')
+    
     contextos_filtrados_temporalmente = 0
     
     if ventana_temporal and ventana_temporal.get('inicio') and ventana_temporal.get('fin'):
         ventana_inicio = ventana_temporal['inicio']
         ventana_fin = ventana_temporal['fin']
         
-        print(f"\nAPLICANDO FILTRO TEMPORAL:")
+        print(f"\nAPLICANDO VENTANA TEMPORAL:")
         print(f"   Ventana: {ventana_inicio} → {ventana_fin}")
         
-        # Filtrar contextos por ventana temporal
-        ids_en_ventana = []
+        # Primero: intersección barata de los candidatos ya recuperados con la ventana
+        ids_filtrados = indice_temporal.filtrar(ids_candidatos, ventana_inicio, ventana_fin)
         
-        for ctx_id in ids_candidatos:
-            meta = metadatos_contextos.get(ctx_id, {})
-            timestamp = meta.get("timestamp")
-            
-            if timestamp:
-                try:
-                    # USAR EL PARSER MEJORADO
-                    from agent.utils import parse_iso_datetime_safe
-                    
-                    fecha_contexto = parse_iso_datetime_safe(timestamp)
-                    fecha_inicio = parse_iso_datetime_safe(ventana_inicio)  
-                    fecha_fin = parse_iso_datetime_safe(ventana_fin)
-
-                    # VERIFICACIÓN ADICIONAL: Asegurar que todas las fechas son naive
-                    if fecha_contexto and fecha_contexto.tzinfo is not None:
-                        fecha_contexto = fecha_contexto.replace(tzinfo=None)
-                    if fecha_inicio and fecha_inicio.tzinfo is not None:
-                        fecha_inicio = fecha_inicio.replace(tzinfo=None)
-                    if fecha_fin and fecha_fin.tzinfo is not None:
-                        fecha_fin = fecha_fin.replace(tzinfo=None)
-                    
-                    if not fecha_contexto or not fecha_inicio or not fecha_fin:
-                        continue
-                    
-                    # Verificar si está en ventana
-                    if fecha_inicio <= fecha_contexto <= fecha_fin:
-                        ids_en_ventana.append(ctx_id)
-                        contexto_titulo = meta.get("titulo", "Sin título")[:30]
-                        print(f"   ✓ {ctx_id[:8]}... '{contexto_titulo}' INCLUIDO")
-                        
-                except Exception as e:
-                    print(f"   ⚠️ Error procesando {ctx_id[:8]}...: {e}")
-                    continue
-            else:
-                print(f"   ⚠️ Contexto {ctx_id[:8]}... sin timestamp - EXCLUIDO")
-        
-        if ids_en_ventana:
-            ids_similares = ids_en_ventana[:k_busqueda]
-            contextos_filtrados_temporalmente = len(ids_candidatos) - len(ids_en_ventana)
-            print(f"\n  {len(ids_en_ventana)} contextos en ventana → seleccionando {len(ids_similares)}")
+        if len(ids_filtrados) >= k_busqueda:
+            ids_similares = ids_filtrados[:k_busqueda]
+            contextos_filtrados_temporalmente = len(ids_candidatos) - len(ids_filtrados)
+            print(f"   {len(ids_filtrados)} candidatos en ventana → top {len(ids_similares)}")
         else:
-            print(f"\n   ⚠️ NINGÚN CONTEXTO en ventana temporal. Aplicando fallback...")
-            
-            # FALLBACK MEJORADO: Buscar en TODOS los contextos
-            contextos_con_fechas = []
-            
-            # PASO 1: Buscar DENTRO de la ventana en TODOS los contextos
-            contextos_en_ventana_completa = []
-            for ctx_id, meta in metadatos_contextos.items():
-                timestamp = meta.get('timestamp')
-                if timestamp:
-                    from agent.utils import parse_iso_datetime_safe
-                    fecha_ctx = parse_iso_datetime_safe(timestamp)
-                    if fecha_ctx:
-                        # Asegurar que fecha_ctx es naive
-                        if fecha_ctx.tzinfo is not None:
-                            fecha_ctx = fecha_ctx.replace(tzinfo=None)
-                        
-                        # Verificar si está en ventana
-                        if fecha_inicio <= fecha_ctx <= fecha_fin:
-                            contextos_en_ventana_completa.append(ctx_id)
-                            titulo = meta.get('titulo', 'Sin título')
-                            print(f"      ✓ Encontrado: {titulo[:40]}")
-            
-            if contextos_en_ventana_completa:
-                # Éxito: encontramos contextos en ventana
-                ids_similares = contextos_en_ventana_completa[:k_busqueda]
-                print(f"\n   📅 Fallback exitoso: {len(contextos_en_ventana_completa)} contextos en ventana")
-                contextos_filtrados_temporalmente = 0
-            else:
-                # Usar candidatos semánticos originales
-                print(f"      ⚠️ Sin contextos en ventana temporal")
-                print(f"ESTRATEGIA 2: Recuperar candidatos semánticos originales")
+            # No alcanzan: pasada vectorizada exacta sobre los nodos de la ventana (reusa el embedding)
+            try:
+                ids_en_ventana = indice_temporal.en_ventana(ventana_inicio, ventana_fin)
+                resultado_temporal = buscar_similares_en_ventana(pregunta, k_busqueda, ventana_inicio, ventana_fin,
+                                                                 ids_en_ventana=ids_en_ventana,
+                                                                 embedding_consulta=embedding_consulta)
+                ids_similares = resultado_temporal["ids"]
+                contextos_filtrados_temporalmente = resultado_temporal["total_indexados"] - resultado_temporal["en_ventana"]
                 
-                # Usar ids_candidatos que ya están ordenados por similitud
-                ids_similares = ids_candidatos[:k_busqueda]
-                contextos_filtrados_temporalmente = 0
-                
-                print(f"       Usando {len(ids_similares)} contextos semánticamente más relevantes")
-                print(f"      📝 Nota: Filtro temporal RELAJADO - priorizando relevancia semántica")
-                
-                # Mostrar qué contextos se van a usar
-                print(f"\n       Contextos seleccionados (por similitud semántica):")
-                for i, ctx_id in enumerate(ids_similares[:5]):
-                    if ctx_id in metadatos_contextos:
-                        meta = metadatos_contextos[ctx_id]
-                        titulo = meta.get('titulo', 'Sin título')
-                        timestamp = meta.get('timestamp', 'Sin fecha')
-                        print(f"         {i+1}. {titulo[:50]}")
-                        print(f"            Fecha: {timestamp}")
+                if resultado_temporal["modo"] == "ventana":
+                    print(f"   {resultado_temporal['en_ventana']} contextos en ventana → top {len(ids_similares)}")
+                else:
+                    # Ventana vacía: mismo cálculo relajado con decaimiento por distancia a la ventana
+                    print(f"   ⚠️ NINGÚN CONTEXTO en ventana temporal. Usando decaimiento temporal")
+                    contextos_filtrados_temporalmente = 0
+            except Exception as e:
+                print(f"❌ Error en recuperación temporal vectorizada: {e}")
+                ids_similares = ids_filtrados or ids_candidatos[:k_busqueda]
+        
+        for i, ctx_id in enumerate(ids_similares[:5]):
+            if ctx_id in metadatos_contextos:
+                meta = metadatos_contextos[ctx_id]
+                print(f"   {i+1}. ⏰ {meta.get('titulo', 'Sin título')[:50]} ({meta.get('timestamp', 'Sin fecha')})")
     else:
         #  CASO SEMÁNTICO/ESTRUCTURAL (SIN FILTRO TEMPORAL)
         print(f"\n📚 CONSULTA SEMÁNTICA/ESTRUCTURAL (sin filtro temporal)")
         ids_similares = ids_candidatos[:k_busqueda]
-        contextos_filtrados_temporalmente = 0
-        print(f"   Usando top {len(ids_similares)} resultados semánticos de {len(ids_candidatos)} candidatos")
+        print(f"   Usando top {len(ids_similares)} resultados semánticos")
     
     # Construir árbol CON INTENCIÓN
     if ids_similares:
@@ -1261,73 +1405,41 @@ def analizar_consulta_completa(pregunta: str, momento_consulta: Optional[datetim
         "arbol_consulta": arbol,
         "estrategia_aplicada": {
             "intencion_temporal": analisis_intencion['intencion_temporal'],
+            "fuente_analisis": analisis_intencion.get('fuente_analisis'),
             "factor_refuerzo": factor_refuerzo,
             "referencia_temporal": referencia_temporal,
             "momento_consulta": momento_consulta.isoformat(),
             "ventana_temporal_aplicada": ventana_temporal is not None,
-            "contextos_filtrados_temporalmente": contextos_filtrados_temporalmente
+            "contextos_filtrados_temporalmente": contextos_filtrados_temporalmente,
+            "tiempos_ms": {
+                "analisis_temporal": round(tiempo_analisis_ms, 2),
+                "busqueda_semantica": round(tiempo_busqueda_ms, 2)
+            }
         }
     }
 
 def _contexto_en_ventana_temporal(contexto_id: str, ventana_inicio: str, ventana_fin: str) -> bool:
-    """Verifica contexto en ventana temporal con logging mínimo."""
+    """Verifica contexto en ventana temporal usando el índice temporal (sin re-parsear fechas)."""
+    if indice_temporal.epoch(contexto_id) is not None:
+        return indice_temporal.contiene(contexto_id, ventana_inicio, ventana_fin)
+    
+    # Sin timestamp: intentar con referencias temporales en el texto
     meta = metadatos_contextos.get(contexto_id, {})
-    timestamp = meta.get("timestamp")
+    texto_completo = f"{meta.get('titulo', '')} {meta.get('texto', '')}"
+    referencias = extraer_referencias_del_texto(texto_completo)
     
-    if not timestamp:
-        # Si no tiene timestamp pero tiene referencias temporales en el texto,
-        # intentar extraerlas
-        texto = meta.get("texto", "")
-        titulo = meta.get("titulo", "")
-        texto_completo = f"{titulo} {texto}"
-        
-        referencias = extraer_referencias_del_texto(texto_completo)
-        
-        if referencias:
-            # Usar la primera referencia encontrada
-            timestamp = referencias[0][1]
-        else:
-            print(f"Contexto {contexto_id[:8]} sin timestamp - EXCLUIDO")
-            return False
+    if not referencias:
+        print(f"Contexto {contexto_id[:8]} sin timestamp - EXCLUIDO")
+        return False
     
-    try:
-        # USAR EL PARSER SEGURO 
-        from agent.utils import parse_iso_datetime_safe
-        
-        fecha_contexto = parse_iso_datetime_safe(timestamp)
-        fecha_inicio = parse_iso_datetime_safe(ventana_inicio)  
-        fecha_fin = parse_iso_datetime_safe(ventana_fin)
-
-        # VERIFICACIÓN ADICIONAL: Asegurar que todas las fechas son naive
-        if fecha_contexto and fecha_contexto.tzinfo is not None:
-            fecha_contexto = fecha_contexto.replace(tzinfo=None)
-        if fecha_inicio and fecha_inicio.tzinfo is not None:
-            fecha_inicio = fecha_inicio.replace(tzinfo=None)
-        if fecha_fin and fecha_fin.tzinfo is not None:
-            fecha_fin = fecha_fin.replace(tzinfo=None)
-        
-        if not fecha_contexto or not fecha_inicio or not fecha_fin:
-            print(f"⚠️ Error parseando fechas para contexto {contexto_id[:8]}")
-            print(f"   - Contexto: {timestamp} -> {fecha_contexto}")
-            print(f"   - Ventana: {ventana_inicio} -> {fecha_inicio}")
-            print(f"   - Ventana: {ventana_fin} -> {fecha_fin}")
-            return False
-        
-        # Logging para debugging con más info
-        contexto_titulo = meta.get("titulo", "Sin título")[:30]
-        
-        resultado = fecha_inicio <= fecha_contexto <= fecha_fin
-    
-        # LOGGING MÍNIMO - solo cuenta total
-        if resultado:
-            contexto_titulo = meta.get("titulo", "Sin título")[:20]
-            print(f"✓ {contexto_id[:8]} '{contexto_titulo}' en ventana")
-        
-        return resultado
-            
-    except Exception as e:
-        print(f"⚠️ Error procesando timestamp para contexto {contexto_id[:8]}: {timestamp} - {e}")
+    # Usar la primera referencia encontrada
+    epoch_contexto = timestamp_a_epoch(referencias[0][1])
+    inicio = timestamp_a_epoch(ventana_inicio)
+    fin = timestamp_a_epoch(ventana_fin)
+    if epoch_contexto is None or inicio is None or fin is None:
+        print(f"⚠️ Error parseando fechas para contexto {contexto_id[:8]}")
         return False
+    return inicio <= epoch_contexto <= fin
     
 # FUNCIONES DE VISUALIZACIÓN DOBLE NIVEL
 def exportar_grafo_macro_conversaciones() -> Dict:
@@ -1336,7 +1448,9 @@ def exportar_grafo_macro_conversaciones() -> Dict:
         grafo_contextos, 
         metadatos_contextos, 
         conversaciones_metadata, 
-        fragmentos_metadata
+        fragmentos_metadata,
+        agregado=obtener_agregado_conversaciones(),
+        ubicar=obtener_ubicador_nodos()
     )
     
     return visualizador.generar_vista_macro_conversaciones()
@@ -1347,33 +1461,356 @@ def exportar_grafo_micro_fragmentos(filtro_conversacion: str = None) -> Dict:
         grafo_contextos, 
         metadatos_contextos, 
         conversaciones_metadata, 
-        fragmentos_metadata
+        fragmentos_metadata,
+        agregado=obtener_agregado_conversaciones(),
+        ubicar=obtener_ubicador_nodos()
     )
     
     return visualizador.generar_vista_micro_fragmentos(filtro_conversacion)
 
+def exportar_vista_serializada(vista: str, filtro_conversacion: str = None):
+    """
+    (cuerpo JSON, ETag) de la vista 'macro' o 'micro' (opcionalmente filtrada por conversación),
+    reutilizando la serialización mientras no cambie el grafo.
+    """
+    if vista == "macro":
+        construir = exportar_grafo_macro_conversaciones
+    else:
+        construir = lambda: exportar_grafo_micro_fragmentos(filtro_conversacion)
+    clave = f"{vista}:{filtro_conversacion}" if filtro_conversacion else vista
+    version = version_grafo
+    _, version_layout = servicio_layout.obtener()
+    
+    def construir_con_version():
+        # La versión se lee antes de construir: un cambio concurrente solo hace que el delta se repita
+        datos = construir()
+        datos.setdefault("meta", {})["version_grafo"] = version
+        return datos
+    
+    # Cuando termina el layout de fondo la vista se rearma con las coordenadas nuevas
+    return cache_visualizacion.obtener(clave, (version, version_layout), construir_con_version)
+
+NIVELES_LOD = ("clusters", "conversaciones", "fragmentos")
+LIMITE_NODOS_LOD = 500
+
+def exportar_vista_lod_serializada(nivel: str, cluster: str = None, conversacion: str = None,
+                                   ventana: tuple = None, limite: int = LIMITE_NODOS_LOD):
+    """(cuerpo JSON, ETag) de exportar_vista_lod, cacheado por versión del grafo, del layout y de las comunidades."""
+    _, version_layout = servicio_layout.obtener()
+    _, version_comunidades = servicio_comunidades.obtener()
+    version = version_grafo
+    clave = f"lod:{nivel}:{cluster}:{conversacion}:{ventana}:{limite}"
+    
+    def construir_con_version():
+        datos = exportar_vista_lod(nivel, cluster, conversacion, ventana, limite)
+        datos.setdefault("meta", {})["version_grafo"] = version
+        return datos
+    
+    return cache_lod.obtener(clave, (version, version_layout, version_comunidades), construir_con_version)
+
+def exportar_vista_lod(nivel: str, cluster: str = None, conversacion: str = None,
+                       ventana: tuple = None, limite: int = LIMITE_NODOS_LOD) -> Dict:
+    """
+    Vista por nivel de detalle: clusters (comunidades de fragmentos) -> conversaciones
+    de un cluster -> fragmentos de un cluster o conversación.
+    Todos los niveles usan las coordenadas del layout del servidor, así
+    ventana=(x_min, y_min, x_max, y_max) deja solo lo que está en pantalla;
+    además se envían a lo sumo `limite` nodos (los más grandes o centrales).
+    """
+    if nivel not in NIVELES_LOD:
+        return {"status": "error", "mensaje": f"Nivel inválido: {nivel}. Opciones: {', '.join(NIVELES_LOD)}"}
+    
+    comunidades, _ = servicio_comunidades.obtener()
+    if nivel != "fragmentos" or cluster:
+        if not comunidades:
+            return {"nodes": [], "edges": [], "meta": {"tipo_vista": f"lod_{nivel}", **servicio_comunidades.estado()}}
+        if cluster and cluster not in comunidades["clusters"]:
+            return {"status": "error", "mensaje": f"Cluster {cluster} no encontrado"}
+    if nivel == "conversaciones" and not cluster:
+        return {"status": "error", "mensaje": "El nivel conversaciones requiere un cluster"}
+    if nivel == "fragmentos" and not cluster and not conversacion:
+        return {"status": "error", "mensaje": "El nivel fragmentos requiere un cluster o una conversación"}
+    
+    ubicar = obtener_ubicador_nodos()
+    if nivel == "clusters":
+        nodos, aristas = _nodos_lod_clusters(comunidades, ubicar)
+        importancia = lambda nodo: nodo["total_fragmentos"]
+    else:
+        miembros = set(comunidades["clusters"][cluster]["miembros"]) if cluster else None
+        if nivel == "conversaciones":
+            nodos, aristas = _nodos_lod_conversaciones(miembros, ubicar)
+            importancia = lambda nodo: nodo["total_fragmentos"]
+        else:
+            nodos, aristas = _nodos_lod_fragmentos(miembros, conversacion, ubicar)
+            importancia = lambda nodo: nodo["centralidad"]
+    
+    total_disponibles = len(nodos)
+    if ventana:
+        x_min, y_min, x_max, y_max = ventana
+        # Los nodos sin coordenadas (layout todavía sin calcular) se envían igual
+        nodos = [n for n in nodos if "x" not in n or (x_min <= n["x"] <= x_max and y_min <= n["y"] <= y_max)]
+    nodos = sorted(nodos, key=importancia, reverse=True)[:max(1, limite)]
+    ids_enviados = {n["id"] for n in nodos}
+    aristas = [a for a in aristas if a["from"] in ids_enviados and a["to"] in ids_enviados]
+    
+    return {
+        "nodes": nodos,
+        "edges": aristas,
+        "meta": {
+            "tipo_vista": f"lod_{nivel}",
+            "cluster": cluster,
+            "conversacion": conversacion,
+            "total_disponibles": total_disponibles,
+            "total_enviados": len(nodos),
+            "truncado": len(nodos) < total_disponibles,
+            "generado_en": datetime.now().isoformat()
+        }
+    }
+
+def _centroide(nodos_ids, ubicar) -> Optional[tuple]:
+    posiciones = [p for p in map(ubicar, nodos_ids) if p] if ubicar else []
+    if not posiciones:
+        return None
+    return (round(sum(p[0] for p in posiciones) / len(posiciones), 1),
+            round(sum(p[1] for p in posiciones) / len(posiciones), 1))
+
+def _nodos_lod_clusters(comunidades: Dict, ubicar):
+    """Un nodo por comunidad (tamaño, títulos representativos) y aristas con los pesos agregados entre ellas."""
+    nodos = []
+    for cluster_id, datos in comunidades["clusters"].items():
+        miembros = datos["miembros"]
+        titulos = [metadatos_contextos.get(n, {}).get("titulo", "Sin título") for n in datos["representantes"]]
+        conversaciones = {metadatos_contextos.get(n, {}).get("conversacion_id") for n in miembros} - {None}
+        titulo_principal = titulos[0] if titulos else "Sin título"
+        nodo = {
+            "id": cluster_id,
+            "label": f"🗂️ {titulo_principal[:30]}{'...' if len(titulo_principal) > 30 else ''} ({len(miembros)})",
+            "title": f"Cluster de {len(miembros)} fragmentos\nConversaciones: {len(conversaciones)}\n"
+                     + "\n".join(f"• {t}" for t in titulos),
+            "group": "cluster",
+            "shape": "box",
+            "size": max(15, min(60, 10 * math.sqrt(len(miembros)))),
+            "total_fragmentos": len(miembros),
+            "total_conversaciones": len(conversaciones),
+            "titulos_representativos": titulos,
+            "peso_interno": round(datos["peso_interno"], 4)
+        }
+        centroide = _centroide(miembros, ubicar)
+        if centroide:
+            nodo["x"], nodo["y"] = centroide
+        nodos.append(nodo)
+    
+    peso_maximo = max((a["peso_total"] for a in comunidades["aristas"].values()), default=0.0)
+    aristas = [
+        {
+            "id": f"{cluster_a}|{cluster_b}",
+            "from": cluster_a,
+            "to": cluster_b,
+            "weight": round(datos["peso_total"] / peso_maximo, 4) if peso_maximo > 0 else 0.0,
+            "label": f"C:{datos['conexiones']}",
+            "title": f"Conexiones entre clusters: {datos['conexiones']}\nPeso total: {datos['peso_total']:.2f}",
+            "peso_total": round(datos["peso_total"], 4),
+            "conexiones_fragmentos": datos["conexiones"]
+        }
+        for (cluster_a, cluster_b), datos in comunidades["aristas"].items()
+    ]
+    return nodos, aristas
+
+def _nodos_lod_conversaciones(miembros: Set[str], ubicar):
+    """Conversaciones con fragmentos en el cluster, ubicadas en el centroide de esos fragmentos."""
+    conversaciones = {}
+    for nodo_id in miembros:
+        conv_id = metadatos_contextos.get(nodo_id, {}).get("conversacion_id")
+        if conv_id in conversaciones_metadata:
+            conversaciones.setdefault(conv_id, []).append(nodo_id)
+    
+    visualizador = VisualizadorDobleNivel(
+        grafo_contextos, 
+        metadatos_contextos, 
+        conversaciones_metadata, 
+        fragmentos_metadata,
+        agregado=obtener_agregado_conversaciones()
+    )
+    vista = visualizador.generar_vista_macro_conversaciones(set(conversaciones))
+    for nodo in vista["nodes"]:
+        nodo["fragmentos_en_cluster"] = len(conversaciones[nodo["id"]])
+        centroide = _centroide(conversaciones[nodo["id"]], ubicar)
+        if centroide:
+            nodo["x"], nodo["y"] = centroide
+    return vista["nodes"], vista["edges"]
+
+def _nodos_lod_fragmentos(miembros: Optional[Set[str]], conversacion: Optional[str], ubicar):
+    """Fragmentos del cluster y/o de la conversación, en formato de la vista micro."""
+    if conversacion:
+        fragmentos = set(conversaciones_metadata.get(conversacion, {}).get("fragmentos_ids", []))
+        if miembros is not None:
+            fragmentos &= miembros
+    else:
+        fragmentos = miembros
+    
+    centralidad, _ = servicio_centralidad.obtener()
+    nodos = [
+        _nodo_para_visualizacion(nodo_id, centralidad, ubicar)
+        for nodo_id in fragmentos if nodo_id in grafo_contextos and nodo_id in metadatos_contextos
+    ]
+    aristas = [
+        _arista_para_visualizacion(origen, destino, datos)
+        for nodo_id in fragmentos if nodo_id in grafo_contextos
+        for origen, destino, datos in grafo_contextos.out_edges(nodo_id, data=True) if destino in fragmentos
+    ]
+    visualizador = VisualizadorDobleNivel(
+        grafo_contextos, 
+        metadatos_contextos, 
+        conversaciones_metadata, 
+        fragmentos_metadata
+    )
+    vista = visualizador.adaptar_a_vista_micro({"nodes": nodos, "edges": aristas})
+    return vista["nodes"], vista["edges"]
+
 def obtener_estadisticas_doble_nivel() -> Dict:
     """Estadísticas comparativas de ambos niveles de visualización."""
     visualizador = VisualizadorDobleNivel(
         grafo_contextos, 
         metadatos_contextos, 
         conversaciones_metadata, 
-        fragmentos_metadata
+        fragmentos_metadata,
+        agregado=obtener_agregado_conversaciones()
     )
     
     return visualizador.obtener_estadisticas_doble_nivel()
 
+def registrar_cambio_grafo(nodos=(), aristas=(), reinicio: bool = False):
+    """
+    Incrementa la versión del grafo, anota qué nodos/aristas cambiaron (reinicio=True
+    si cambió todo) y avisa a los oyentes (recálculos en segundo plano, clientes en vivo).
+    """
+    global version_grafo
+    with _lock_version:
+        version_grafo += 1
+        version = version_grafo
+        registro_cambios.registrar(version, nodos, aristas, reinicio)
+    for oyente in list(_oyentes_cambio_grafo):
+        try:
+            oyente(version)
+        except Exception as e:
+            print(f" Error notificando cambio del grafo: {e}")
+
+def suscribir_cambios_grafo(oyente):
+    """Registra una función oyente(version) que se llama en cada cambio del grafo."""
+    if oyente not in _oyentes_cambio_grafo:
+        _oyentes_cambio_grafo.append(oyente)
+
+def obtener_version_grafo() -> int:
+    return version_grafo
+
+# Centralidad por iteración de potencias, recalculada en segundo plano por versión
+servicio_centralidad = ServicioCentralidad(lambda: grafo_contextos, obtener_version_grafo)
+suscribir_cambios_grafo(servicio_centralidad.notificar_cambio)
+
+# Coordenadas de los nodos para la visualización, recalculadas en segundo plano
+servicio_layout = ServicioLayout(lambda: grafo_contextos, obtener_version_grafo)
+suscribir_cambios_grafo(servicio_layout.notificar_cambio)
+
+def obtener_ubicador_nodos():
+    """Función nodo_id -> (x, y) o None sobre el layout vigente (provisoria para nodos recién agregados)."""
+    layout, _ = servicio_layout.obtener()
+    if not layout:
+        return None
+    return lambda nodo_id: servicio_layout.ubicar(nodo_id, grafo_contextos, layout)
+
+# Comunidades de fragmentos (nivel más grueso de la vista por nivel de detalle), en segundo plano
+servicio_comunidades = ServicioComunidades(lambda: grafo_contextos, obtener_version_grafo)
+suscribir_cambios_grafo(servicio_comunidades.notificar_cambio)
+
+# Vistas de visualización pre-serializadas por versión del grafo (servidas con ETag)
+cache_visualizacion = CacheVisualizacion()
+suscribir_cambios_grafo(cache_visualizacion.invalidar)
+# Las vistas por nivel de detalle varían con la ventana: caché aparte para no desalojar las otras
+cache_lod = CacheVisualizacion(max_entradas=128)
+suscribir_cambios_grafo(cache_lod.invalidar)
+
+def _guardar_resumenes(ctx_ids: List[str]):
+    """
+    Persiste los resúmenes calculados por el hilo de fondo. La ingesta puede estar
+    escribiendo a la vez: primero se serializa todo (reintentando si algo cambia
+    en el medio) y recién después se escribe a disco.
+    """
+    grafo_serializado = reintentar_si_cambia(lambda: pickle.dumps(grafo_contextos))
+    archivos_json = {
+        ARCHIVO_METADATOS: metadatos_contextos,
+        "data/conversaciones.json": conversaciones_metadata,
+        "data/fragmentos.json": fragmentos_metadata
+    }
+    serializados = {
+        ruta: reintentar_si_cambia(lambda datos=datos: json.dumps(datos, ensure_ascii=False, indent=2), ruta)
+        for ruta, datos in archivos_json.items()
+    }
+    with _lock:
+        os.makedirs("data", exist_ok=True)
+        with open(ARCHIVO_GRAFO, 'wb') as f:
+            f.write(grafo_serializado)
+        for ruta, texto in serializados.items():
+            with open(ruta, 'w', encoding='utf-8') as f:
+                f.write(texto)
+    # Los tooltips muestran el resumen: nueva versión para los cachés de la vista y los clientes en vivo
+    registrar_cambio_grafo(nodos=ctx_ids)
+
+# Resúmenes extractivos por fragmento, calculados en segundo plano al ingerir
+servicio_resumenes = ServicioResumenes(
+    lambda: metadatos_contextos, lambda: fragmentos_metadata, _guardar_resumenes,
+    codificar=modelo_embeddings.encode
+)
+
+def obtener_centralidad(top_k: int = None, pagina: int = 1, por_pagina: int = 20) -> Dict:
+    """Ranking de centralidad desde caché (nunca bloquea por el cálculo)."""
+    resultado = servicio_centralidad.obtener_pagina(top_k, pagina, por_pagina)
+    for item in resultado["resultados"]:
+        item["titulo"] = metadatos_contextos.get(item["id"], {}).get("titulo", "Sin título")
+    return resultado
+
+def obtener_indice_dos_saltos(umbral: float = None) -> IndiceDosSaltos:
+    """
+    Obtiene el índice de 2 saltos del grafo actual.
+    Lo (re)construye si no existe, si el grafo global fue reemplazado
+    (carga desde disco, borrado de datos) o si se pide otro umbral.
+    """
+    global indice_dos_saltos
+    if indice_dos_saltos is None or indice_dos_saltos.grafo is not grafo_contextos:
+        umbral_inicial = umbral if umbral is not None else (
+            propagador_global.umbral_activacion if propagador_global else 0.1
+        )
+        indice_dos_saltos = IndiceDosSaltos(grafo_contextos, umbral_inicial)
+    elif umbral is not None and indice_dos_saltos.umbral != umbral:
+        indice_dos_saltos.reconstruir(umbral)
+    return indice_dos_saltos
+
+def obtener_agregado_conversaciones() -> AgregadoConversaciones:
+    """Agregado de relaciones entre conversaciones; se reconstruye si se reemplazó el grafo o los metadatos."""
+    global agregado_conversaciones
+    if (agregado_conversaciones is None or agregado_conversaciones.grafo is not grafo_contextos
+            or agregado_conversaciones.metadatos_contextos is not metadatos_contextos):
+        agregado_conversaciones = AgregadoConversaciones(grafo_contextos, metadatos_contextos)
+    return agregado_conversaciones
+
 def obtener_propagador():
     """Obtiene o crea la instancia global del propagador."""
     global propagador_global
     if propagador_global is None:
-        propagador_global = crear_propagador(grafo_contextos, metadatos_contextos)
+        propagador_global = crear_propagador(grafo_contextos, metadatos_contextos, obtener_indice_dos_saltos())
     return propagador_global
 
 def actualizar_propagador():
     """Actualiza el propagador cuando cambia el grafo."""
     global propagador_global
+    anterior = propagador_global
     propagador_global = crear_propagador(grafo_contextos, metadatos_contextos)
+    if anterior is not None:
+        # Conservar lo configurado en /configurar-propagacion/; con el mismo umbral
+        # el índice de 2 saltos (ya actualizado en la ingesta) no se reconstruye
+        propagador_global.factor_decaimiento = anterior.factor_decaimiento
+        propagador_global.umbral_activacion = anterior.umbral_activacion
+    # El índice debe usar el mismo umbral que el propagador recién creado
+    propagador_global.indice_dos_saltos = obtener_indice_dos_saltos(propagador_global.umbral_activacion)
 
 def configurar_parametros_propagacion(factor_decaimiento: float = None, umbral_activacion: float = None):
     """Configura parámetros del algoritmo de propagación."""
@@ -1405,24 +1842,53 @@ def obtener_estado_propagacion():
             "total_nodos": total_nodos,
             "total_aristas": total_aristas,
             "aristas_bidireccionales": _calcular_aristas_bidireccionales(),
-            "grafo_disponible": total_nodos > 0
+            "grafo_disponible": total_nodos > 0,
+            "indice_dos_saltos": obtener_indice_dos_saltos().estadisticas()
         }
     except Exception as e:
         return {"error": f"Error: {str(e)}"}
 
+def _propagar_con_cache(propagador, contexto_inicial: str, activacion_inicial: float, max_pasos: int,
+                        cache_propagacion: Dict = None) -> Dict:
+    """
+    propagar_desde_nodo memorizado en `cache_propagacion` (si se pasa). La clave incluye
+    los parámetros del propagador, así que un cambio de configuración no reutiliza resultados.
+    """
+    if cache_propagacion is None:
+        return propagador.propagar_desde_nodo(contexto_inicial, activacion_inicial, max_pasos)
+    
+    clave = (contexto_inicial, round(activacion_inicial, 4), max_pasos,
+             propagador.factor_decaimiento, propagador.umbral_activacion)
+    resultados = cache_propagacion.setdefault("resultados", {})
+    if clave in resultados:
+        cache_propagacion["compartidas"] = cache_propagacion.get("compartidas", 0) + 1
+        return resultados[clave]
+    
+    resultado = propagador.propagar_desde_nodo(contexto_inicial, activacion_inicial, max_pasos)
+    resultados[clave] = resultado
+    cache_propagacion["calculadas"] = cache_propagacion.get("calculadas", 0) + 1
+    return resultado
+
 def analizar_consulta_con_propagacion(pregunta: str, momento_consulta: Optional[datetime] = None, 
                                                usar_propagacion: bool = True, max_pasos: int = 2,
                                                factor_decaimiento: float = None, 
                                                umbral_activacion: float = None,
                                                k_inicial: int = None,
-                                               factor_refuerzo_temporal_custom: float = None) -> Dict:
+                                               factor_refuerzo_temporal_custom: float = None,
+                                               analisis_basico: Dict = None,
+                                               plazo: Optional[PlazoConsulta] = None,
+                                               cache_propagacion: Dict = None) -> Dict:
     """
     Análisis  de consulta INCLUYENDO propagación dinámica desde contextos relevantes.
         pregunta: Consulta del usuario
         momento_consulta: Momento de la consulta
         usar_propagacion: Si usar propagación además de búsqueda directa
         max_pasos: Pasos de propagación
+        analisis_basico: Resultado ya calculado de analizar_consulta_completa (opcional)
+        plazo: Presupuesto de tiempo; sin tiempo se acotan los saltos y se omite el árbol enriquecido
+        cache_propagacion: Propagaciones ya calculadas por otras consultas del mismo batch (se comparte)
     """
+    plazo = plazo or PlazoConsulta.sin_limite()
     # Obtener parámetros configurables si no se especifican
     parametros = usar_parametros_configurables()
     
@@ -1435,8 +1901,9 @@ def analizar_consulta_con_propagacion(pregunta: str, momento_consulta: Optional[
     if momento_consulta is None:
         momento_consulta = datetime.now()
     
-    # Análisis básico (método existente)
-    analisis_basico = analizar_consulta_completa(pregunta, momento_consulta)
+    # Análisis básico (método existente), salvo que ya venga calculado (endpoints async)
+    if analisis_basico is None:
+        analisis_basico = analizar_consulta_completa(pregunta, momento_consulta)
     
     if not usar_propagacion:
         return analisis_basico
@@ -1469,6 +1936,23 @@ def analizar_consulta_con_propagacion(pregunta: str, momento_consulta: Optional[
             }
             return analisis_basico
         
+        # Acotar los saltos al tiempo disponible (o no propagar si no alcanza ni uno)
+        pasos_pedidos = max_pasos
+        while max_pasos > 0 and not plazo.alcanza("pasos_propagacion", unidades=max_pasos * len(contextos_directos)):
+            max_pasos -= 1
+        if max_pasos == 0:
+            plazo.omitir("pasos_propagacion", "sin tiempo para propagar")
+            analisis_basico['propagacion'] = {
+                'contextos_directos': list(contextos_directos),
+                'contextos_indirectos': [],
+                'solo_por_propagacion': [],
+                'total_nodos_alcanzados': 0,
+                'mensaje': 'Propagación omitida por plazo'
+            }
+            return analisis_basico
+        if max_pasos < pasos_pedidos:
+            plazo.omitir("pasos_propagacion", f"saltos acotados de {pasos_pedidos} a {max_pasos}")
+        
         # PROPAGACIÓN DESDE MÚLTIPLES SEMILLAS
         from agent.extractor import extraer_palabras_clave
         palabras_clave = extraer_palabras_clave(pregunta)
@@ -1477,9 +1961,13 @@ def analizar_consulta_con_propagacion(pregunta: str, momento_consulta: Optional[
         todos_contextos_propagados = {}
         caminos_propagacion = {}
         
+        inicio_propagacion = time.time()
         for contexto_inicial in contextos_directos:
             if contexto_inicial not in metadatos_contextos:
                 continue
+            if not plazo.alcanza("pasos_propagacion", unidades=max_pasos):
+                plazo.omitir("pasos_propagacion", "se agotó el plazo antes de recorrer todas las semillas")
+                break
                 
             # Calcular activación inicial basada en relevancia para esta pregunta
             meta_inicial = metadatos_contextos[contexto_inicial]
@@ -1493,9 +1981,9 @@ def analizar_consulta_con_propagacion(pregunta: str, momento_consulta: Optional[
             activacion_inicial = max(0.3, min(1.0, activacion_inicial))
             print(f" PROPAGANDO desde {contexto_inicial[:8]}... con activación {activacion_inicial:.3f}")
 
-            # Propagar desde este contexto
-            resultado_propagacion = propagador.propagar_desde_nodo(
-                contexto_inicial, activacion_inicial, max_pasos
+            # Propagar desde este contexto (o reutilizar la misma propagación de otra consulta del batch)
+            resultado_propagacion = _propagar_con_cache(
+                propagador, contexto_inicial, activacion_inicial, max_pasos, cache_propagacion
             )
 
             # Extraer activaciones y profundidades 
@@ -1536,8 +2024,15 @@ def analizar_consulta_con_propagacion(pregunta: str, momento_consulta: Optional[
         # Combinar todos los contextos (directos + propagados)
         todos_contextos = list(contextos_directos_set | contextos_indirectos_set)
         
+        plazo.tiempos_etapas_ms["propagacion"] = round((time.time() - inicio_propagacion) * 1000, 2)
+        plazo.resolver("pasos_propagacion")
+        
         # Construir árbol enriquecido con información de propagación
-        if todos_contextos:
+        if todos_contextos and not plazo.alcanza("arbol_propagacion"):
+            # Sin tiempo: se mantiene el árbol de la búsqueda directa, sin explicar caminos
+            plazo.omitir("arbol_propagacion", "se mantuvo el árbol de la búsqueda directa")
+            arbol_enriquecido = analisis_basico['arbol_consulta']
+        elif todos_contextos:
             referencia_temporal = analisis_basico['analisis_intencion'].get('timestamp_referencia')
             factor_refuerzo = factor_refuerzo_temporal_custom
             
@@ -1597,4 +2092,85 @@ def analizar_consulta_con_propagacion(pregunta: str, momento_consulta: Optional[
         print(f"Error en propagación dinámica: {e}")
         # Fallback al análisis básico
         analisis_basico['propagacion'] = {'error': str(e)}
-        return analisis_basico
\ No newline at end of file
+        return analisis_basico
+
+async def analizar_consultas_batch_async(preguntas: List[str], momento_consulta: Optional[datetime] = None,
+                                         usar_propagacion: bool = True, max_pasos: int = 2,
+                                         k_inicial: int = None, factor_refuerzo: float = None,
+                                         plazos: List[PlazoConsulta] = None,
+                                         max_concurrencia_llm: int = 4) -> Dict:
+    """
+    Análisis de varias preguntas compartiendo el trabajo común:
+    - embeddings de todas las preguntas en una llamada al modelo y una sola consulta al índice
+    - análisis temporal (posible LLM) en paralelo, con a lo sumo `max_concurrencia_llm` a la vez
+    - propagación memorizada por semilla: preguntas con semillas en común no la repiten
+    Returns:
+        {"analisis": [un resultado de analizar_consulta_con_propagacion por pregunta], "tiempos_ms", "propagacion"}
+    """
+    if momento_consulta is None:
+        momento_consulta = datetime.now()
+    plazos = plazos or [PlazoConsulta.sin_limite() for _ in preguntas]
+    
+    parametros = usar_parametros_configurables()
+    factor_base = factor_refuerzo if factor_refuerzo is not None else parametros.get('factor_refuerzo_temporal', 1.5)
+    k_busqueda = k_inicial if k_inicial is not None else parametros.get('k_resultados', 5)
+    
+    semaforo = asyncio.Semaphore(max(1, max_concurrencia_llm))
+    
+    async def _analizar_con_tiempo(pregunta: str, plazo: PlazoConsulta):
+        async with semaforo:
+            inicio = time.time()
+            with plazo.medir("analisis_temporal"):
+                analisis = await analizar_temporalidad_hibrida_async(pregunta, momento_consulta,
+                                                                     factor_base=factor_base, plazo=plazo)
+            plazo.resolver("analisis_temporal_llm")
+            return analisis, (time.time() - inicio) * 1000
+    
+    inicio_batch = time.time()
+    tarea_analisis = asyncio.gather(*[
+        _analizar_con_tiempo(pregunta, plazo) for pregunta, plazo in zip(preguntas, plazos)
+    ])
+    busquedas = await asyncio.to_thread(_recuperar_candidatos_semanticos_batch, preguntas, k_busqueda)
+    tiempo_busqueda_ms = busquedas[0]["tiempo_ms"] if busquedas else 0.0
+    analisis_temporales = await tarea_analisis
+    tiempo_analisis_ms = (time.time() - inicio_batch) * 1000
+    
+    # Árboles y propagación en un único hilo: construir_arbol_consulta guarda la intención
+    # en un atributo de la función y no admite llamadas concurrentes
+    cache_propagacion = {"resultados": {}, "calculadas": 0, "compartidas": 0}
+    
+    def _completar_todas():
+        resultados = []
+        for pregunta, plazo, busqueda, (analisis_intencion, tiempo_ms) in zip(
+                preguntas, plazos, busquedas, analisis_temporales):
+            with plazo.medir("arbol_consulta"):
+                analisis_basico = _completar_analisis_consulta(pregunta, momento_consulta, analisis_intencion,
+                                                               tiempo_ms, busqueda, k_busqueda, factor_base)
+            resultados.append(analizar_consulta_con_propagacion(
+                pregunta, momento_consulta, usar_propagacion, max_pasos,
+                k_inicial=k_busqueda,
+                factor_refuerzo_temporal_custom=factor_base,
+                analisis_basico=analisis_basico,
+                plazo=plazo,
+                cache_propagacion=cache_propagacion
+            ))
+        return resultados
+    
+    inicio_arboles = time.time()
+    analisis = await asyncio.to_thread(_completar_todas)
+    tiempo_arboles_ms = (time.time() - inicio_arboles) * 1000
+    
+    print(f"Batch de {len(preguntas)} preguntas: {cache_propagacion['calculadas']} propagaciones calculadas, "
+          f"{cache_propagacion['compartidas']} compartidas")
+    return {
+        "analisis": analisis,
+        "tiempos_ms": {
+            "busqueda_semantica": round(tiempo_busqueda_ms, 2),
+            "analisis_temporal": round(tiempo_analisis_ms, 2),
+            "arboles_y_propagacion": round(tiempo_arboles_ms, 2)
+        },
+        "propagacion": {
+            "semillas_calculadas": cache_propagacion["calculadas"],
+            "semillas_compartidas": cache_propagacion["compartidas"]
+        }
+    }
@@ -0,0 +1,151 @@
+# agent/indice_dos_saltos.py
+import threading
+from typing import Dict, List, Optional, Tuple
+import networkx as nx
+
+
+class IndiceDosSaltos:
+    """
+    Vecindario materializado a 2 saltos para cada nodo del grafo.
+    Para cada par (origen, destino) alcanzable en dos saltos guarda el frente
+    de Pareto de caminos origen→intermedio→destino como tuplas
+    (peso_primer_salto, producto_pesos), ordenadas por peso_primer_salto
+    descendente y producto ascendente. Con eso la propagación de 2 pasos
+    resuelve, para cualquier activación inicial, el mejor camino válido
+    sin recorrer el grafo.
+    Solo se indexan aristas con peso_efectivo >= umbral (el umbral de
+    activación del propagador); si el umbral cambia hay que reconstruir.
+    """
+
+    def __init__(self, grafo: nx.DiGraph, umbral: float = 0.1):
+        self.grafo = grafo
+        self.umbral = umbral
+        self._indice: Dict[str, Dict[str, Tuple[Tuple[float, float], ...]]] = {}
+        self._lock = threading.Lock()
+        self.reconstruir(umbral)
+
+    def reconstruir(self, umbral: Optional[float] = None) -> Dict:
+        """Recalcula el índice completo (carga inicial, recálculo de relaciones o cambio de umbral)."""
+        if umbral is not None:
+            self.umbral = umbral
+
+        indice = {}
+        for origen in list(self.grafo.nodes()):
+            indice[origen] = self._calcular_desde(origen)
+
+        with self._lock:
+            self._indice = indice
+
+        return self.estadisticas()
+
+    def actualizar_nodo_nuevo(self, nodo_nuevo: str):
+        """
+        Actualiza el índice después de que _actualizar_relaciones_incremental
+        conectó `nodo_nuevo`. Solo toca los caminos que pasan por él:
+        nuevo→u→x, s→nuevo→x y s→u→nuevo.
+        """
+        if nodo_nuevo not in self.grafo:
+            return
+
+        salidas = self._vecinos_validos(nodo_nuevo)
+        # Las aristas pueden tener distinto peso en cada dirección: los caminos que llegan
+        # al nodo nuevo se buscan por sus aristas de entrada, no por las de salida
+        entradas = self._predecesores_validos(nodo_nuevo)
+
+        with self._lock:
+            # Caminos que parten del nodo nuevo
+            self._indice[nodo_nuevo] = self._calcular_desde(nodo_nuevo)
+
+            for vecino, peso_hacia_nuevo in entradas:
+                # s → nuevo → x (el nodo nuevo como intermedio)
+                for destino, peso_2 in salidas:
+                    if destino == vecino:
+                        continue
+                    self._agregar_camino(vecino, destino, peso_hacia_nuevo, peso_hacia_nuevo * peso_2)
+
+                # s → u → nuevo (el nodo nuevo como destino)
+                for origen in self.grafo.predecessors(vecino):
+                    if origen == nodo_nuevo or origen == vecino:
+                        continue
+                    peso_origen = self._peso(origen, vecino)
+                    if peso_origen is None:
+                        continue
+                    self._agregar_camino(origen, nodo_nuevo, peso_origen, peso_origen * peso_hacia_nuevo)
+
+    def obtener(self, origen: str) -> Dict[str, Tuple[Tuple[float, float], ...]]:
+        """Devuelve una copia del vecindario a 2 saltos de `origen`."""
+        with self._lock:
+            return dict(self._indice.get(origen, {}))
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            total_pares = sum(len(destinos) for destinos in self._indice.values())
+            total_caminos = sum(len(frente) for destinos in self._indice.values() for frente in destinos.values())
+        return {
+            "nodos_indexados": len(self._indice),
+            "pares_dos_saltos": total_pares,
+            "caminos_pareto": total_caminos,
+            "umbral": self.umbral
+        }
+
+    @staticmethod
+    def mejor_producto(frente: Tuple[Tuple[float, float], ...], peso_minimo_primer_salto: float) -> float:
+        """Mayor producto de pesos entre los caminos cuyo primer salto supera el mínimo."""
+        mejor = 0.0
+        for peso_1, producto in frente:
+            if peso_1 < peso_minimo_primer_salto:
+                break
+            mejor = producto
+        return mejor
+
+    def _calcular_desde(self, origen: str) -> Dict[str, Tuple[Tuple[float, float], ...]]:
+        destinos: Dict[str, List[Tuple[float, float]]] = {}
+        for intermedio, peso_1 in self._vecinos_validos(origen):
+            for destino, peso_2 in self._vecinos_validos(intermedio):
+                if destino == origen:
+                    continue
+                destinos.setdefault(destino, []).append((peso_1, peso_1 * peso_2))
+
+        return {destino: self._frente_pareto(caminos) for destino, caminos in destinos.items()}
+
+    def _agregar_camino(self, origen: str, destino: str, peso_1: float, producto: float):
+        destinos = self._indice.setdefault(origen, {})
+        caminos = list(destinos.get(destino, ()))
+        caminos.append((peso_1, producto))
+        destinos[destino] = self._frente_pareto(caminos)
+
+    @staticmethod
+    def _frente_pareto(caminos: List[Tuple[float, float]]) -> Tuple[Tuple[float, float], ...]:
+        """Conserva solo caminos no dominados: al bajar el primer salto el producto debe subir."""
+        frente = []
+        for peso_1, producto in sorted(caminos, key=lambda c: (-c[0], -c[1])):
+            if not frente or producto > frente[-1][1]:
+                frente.append((peso_1, producto))
+        return tuple(frente)
+
+    def _peso(self, origen: str, destino: str) -> Optional[float]:
+        datos = self.grafo.get_edge_data(origen, destino)
+        if not datos:
+            return None
+        peso = datos.get('peso_efectivo', 0)
+        return peso if peso >= self.umbral else None
+
+    def _predecesores_validos(self, nodo: str) -> List[Tuple[str, float]]:
+        predecesores = []
+        for origen in self.grafo.predecessors(nodo):
+            if origen == nodo:
+                continue
+            peso = self._peso(origen, nodo)
+            if peso is not None:
+                predecesores.append((origen, peso))
+        return predecesores
+
+    def _vecinos_validos(self, nodo: str) -> List[Tuple[str, float]]:
+        vecinos = []
+        for vecino, datos in self.grafo[nodo].items():
+            if vecino == nodo:
+                continue
+            peso = datos.get('peso_efectivo', 0)
+            if peso >= self.umbral:
+                vecinos.append((vecino, peso))
+        return vecinos
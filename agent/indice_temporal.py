@@ -0,0 +1,126 @@
+# agent/indice_temporal.py
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Union
+from agent.utils import timestamp_a_epoch
+
+
+class IndiceTemporal:
+    """
+    Índice ordenado (por epoch) de los nodos con timestamp.
+    Responde "todos los nodos en [inicio, fin]" con dos bisecciones,
+    O(log N + resultados), sin re-parsear fechas ISO en cada consulta.
+    Se mantiene incrementalmente al insertar nodos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._epochs: List[float] = []
+        self._ids: List[str] = []
+        self._epoch_por_id: Dict[str, float] = {}
+
+    def reconstruir(self, metadatos: Dict[str, Dict]) -> int:
+        """Reconstruye el índice completo desde metadatos_contextos."""
+        pares = []
+        for nodo_id, meta in metadatos.items():
+            epoch = timestamp_a_epoch(meta.get("timestamp"))
+            if epoch is not None:
+                pares.append((epoch, nodo_id))
+        pares.sort()
+
+        with self._lock:
+            self._epochs = [epoch for epoch, _ in pares]
+            self._ids = [nodo_id for _, nodo_id in pares]
+            self._epoch_por_id = {nodo_id: epoch for epoch, nodo_id in pares}
+        return len(pares)
+
+    def agregar(self, nodo_id: str, timestamp: Optional[str]):
+        """Inserta (o reubica) un nodo manteniendo el orden."""
+        epoch = timestamp_a_epoch(timestamp)
+        with self._lock:
+            self._eliminar_sin_lock(nodo_id)
+            if epoch is None:
+                return
+            posicion = bisect_right(self._epochs, epoch)
+            self._epochs.insert(posicion, epoch)
+            self._ids.insert(posicion, nodo_id)
+            self._epoch_por_id[nodo_id] = epoch
+
+    def eliminar(self, nodo_id: str):
+        with self._lock:
+            self._eliminar_sin_lock(nodo_id)
+
+    def epoch(self, nodo_id: str) -> Optional[float]:
+        return self._epoch_por_id.get(nodo_id)
+
+    def en_ventana(self, inicio: Union[str, float], fin: Union[str, float]) -> List[str]:
+        """IDs con timestamp en [inicio, fin], en orden cronológico."""
+        inicio_epoch, fin_epoch = self._a_epoch(inicio), self._a_epoch(fin)
+        if inicio_epoch is None or fin_epoch is None:
+            return []
+        with self._lock:
+            desde = bisect_left(self._epochs, inicio_epoch)
+            hasta = bisect_right(self._epochs, fin_epoch)
+            return self._ids[desde:hasta]
+
+    def contar_en_ventana(self, inicio: Union[str, float], fin: Union[str, float]) -> int:
+        inicio_epoch, fin_epoch = self._a_epoch(inicio), self._a_epoch(fin)
+        if inicio_epoch is None or fin_epoch is None:
+            return 0
+        with self._lock:
+            return max(0, bisect_right(self._epochs, fin_epoch) - bisect_left(self._epochs, inicio_epoch))
+
+    def contiene(self, nodo_id: str, inicio: Union[str, float], fin: Union[str, float]) -> bool:
+        epoch = self._epoch_por_id.get(nodo_id)
+        inicio_epoch, fin_epoch = self._a_epoch(inicio), self._a_epoch(fin)
+        if epoch is None or inicio_epoch is None or fin_epoch is None:
+            return False
+        return inicio_epoch <= epoch <= fin_epoch
+
+    def filtrar(self, candidatos: Iterable[str], inicio: Union[str, float], fin: Union[str, float]) -> List[str]:
+        """
+        Intersección de un conjunto de candidatos con la ventana, conservando el
+        orden de los candidatos. Se recorre el lado más chico: los candidatos
+        (búsqueda O(1) por ID) o los nodos de la ventana.
+        """
+        candidatos = list(candidatos)
+        inicio_epoch, fin_epoch = self._a_epoch(inicio), self._a_epoch(fin)
+        if inicio_epoch is None or fin_epoch is None:
+            return []
+
+        if len(candidatos) <= self.contar_en_ventana(inicio_epoch, fin_epoch):
+            return [
+                c for c in candidatos
+                if c in self._epoch_por_id and inicio_epoch <= self._epoch_por_id[c] <= fin_epoch
+            ]
+        en_ventana = set(self.en_ventana(inicio_epoch, fin_epoch))
+        return [c for c in candidatos if c in en_ventana]
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            return {
+                "nodos_con_timestamp": len(self._ids),
+                "desde": self._epochs[0] if self._epochs else None,
+                "hasta": self._epochs[-1] if self._epochs else None
+            }
+
+    def __len__(self):
+        return len(self._ids)
+
+    @staticmethod
+    def _a_epoch(valor: Union[str, float, None]) -> Optional[float]:
+        if isinstance(valor, (int, float)):
+            return float(valor)
+        return timestamp_a_epoch(valor)
+
+    def _eliminar_sin_lock(self, nodo_id: str):
+        epoch = self._epoch_por_id.pop(nodo_id, None)
+        if epoch is None:
+            return
+        posicion = bisect_left(self._epochs, epoch)
+        while posicion < len(self._ids) and self._epochs[posicion] == epoch:
+            if self._ids[posicion] == nodo_id:
+                del self._epochs[posicion]
+                del self._ids[posicion]
+                return
+            posicion += 1
@@ -0,0 +1,138 @@
+# agent/layout_grafo.py
+import math
+import random
+from typing import Dict, Iterable, Optional, Tuple
+import networkx as nx
+from agent.tareas_fondo import RefrescoEnSegundoPlano, copiar_grafo_seguro
+
+ESCALA_POR_NODO = 60.0  # Píxeles de vis.js: el lienzo crece con la raíz de la cantidad de nodos
+ESCALA_MINIMA = 500.0
+FRACCION_RECALCULO_COMPLETO = 0.1  # Nodos ubicados incrementalmente tolerados antes de rehacer el layout
+DISPERSION_NODO_NUEVO = 0.03  # Ruido (en coordenadas normalizadas) para no apilar nodos con los mismos vecinos
+
+
+def escala_layout(total_nodos: int) -> float:
+    return max(ESCALA_MINIMA, ESCALA_POR_NODO * math.sqrt(total_nodos))
+
+
+def calcular_layout_completo(grafo: nx.Graph, posiciones_iniciales: Dict[str, Tuple[float, float]] = None
+                             ) -> Dict[str, Tuple[float, float]]:
+    """
+    Layout force-directed (Fruchterman-Reingold de networkx, que usa matrices
+    dispersas a partir de 500 nodos) ponderado por peso_efectivo.
+    Parte de las posiciones anteriores para que el dibujo no salte entre versiones.
+    Devuelve coordenadas normalizadas en [-1, 1].
+    """
+    total_nodos = grafo.number_of_nodes()
+    if total_nodos == 0:
+        return {}
+    iniciales = {nodo: pos for nodo, pos in (posiciones_iniciales or {}).items() if nodo in grafo}
+    posiciones = nx.spring_layout(
+        grafo,
+        pos=iniciales or None,
+        iterations=50 if total_nodos <= 1000 else 30,
+        weight="peso_efectivo",
+        seed=42
+    )
+    return {nodo: (float(x), float(y)) for nodo, (x, y) in posiciones.items()}
+
+
+def ubicar_cerca_de_vecinos(grafo: nx.Graph, nodo: str, posiciones: Dict[str, Tuple[float, float]]
+                            ) -> Optional[Tuple[float, float]]:
+    """Promedio de las posiciones de los vecinos ya ubicados (ponderado por peso) con un poco de ruido."""
+    suma_x = suma_y = suma_pesos = 0.0
+    for vecino in _vecinos(grafo, nodo):
+        if vecino not in posiciones:
+            continue
+        peso = max(0.05, _peso(grafo, nodo, vecino))
+        x, y = posiciones[vecino]
+        suma_x += x * peso
+        suma_y += y * peso
+        suma_pesos += peso
+    if suma_pesos == 0:
+        return None
+    azar = random.Random(nodo)  # Determinístico: el mismo nodo cae siempre en el mismo lugar
+    return (suma_x / suma_pesos + azar.uniform(-DISPERSION_NODO_NUEVO, DISPERSION_NODO_NUEVO),
+            suma_y / suma_pesos + azar.uniform(-DISPERSION_NODO_NUEVO, DISPERSION_NODO_NUEVO))
+
+
+def ubicar_en_borde(nodo: str) -> Tuple[float, float]:
+    """Nodo sin vecinos ubicados: en un anillo alrededor del dibujo."""
+    angulo = random.Random(nodo).uniform(0, 2 * math.pi)
+    return (1.1 * math.cos(angulo), 1.1 * math.sin(angulo))
+
+
+def _vecinos(grafo: nx.Graph, nodo: str) -> Iterable[str]:
+    if grafo.is_directed():
+        return set(grafo.successors(nodo)) | set(grafo.predecessors(nodo))
+    return grafo.neighbors(nodo)
+
+
+def _peso(grafo: nx.Graph, nodo: str, vecino: str) -> float:
+    datos = grafo.get_edge_data(nodo, vecino) or grafo.get_edge_data(vecino, nodo) or {}
+    return datos.get("peso_efectivo", 0.0)
+
+
+class ServicioLayout(RefrescoEnSegundoPlano):
+    """
+    Posiciones de los nodos para la visualización, recalculadas en segundo plano
+    por versión del grafo. Los nodos nuevos se ubican cerca de sus vecinos sin
+    mover al resto; cuando se acumulan muchos se rehace el layout completo.
+    """
+    nombre = "layout"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ubicados_incrementalmente = 0
+
+    def calcular(self, grafo: nx.DiGraph) -> Dict:
+        copia = copiar_grafo_seguro(grafo).to_undirected()
+        previo, _ = self.obtener()
+        vigentes = {nodo: pos for nodo, pos in (previo["posiciones"] if previo else {}).items() if nodo in copia}
+        nuevos = [nodo for nodo in copia.nodes() if nodo not in vigentes]
+        total_nodos = copia.number_of_nodes()
+
+        if not vigentes or self._ubicados_incrementalmente + len(nuevos) > FRACCION_RECALCULO_COMPLETO * total_nodos:
+            posiciones = calcular_layout_completo(copia, vigentes)
+            self._ubicados_incrementalmente = 0
+            modo = "completo"
+        else:
+            posiciones = dict(vigentes)
+            # Varias pasadas: un nodo nuevo puede tener como único vecino a otro nodo nuevo
+            pendientes = nuevos
+            for _ in range(3):
+                sin_ubicar = []
+                for nodo in pendientes:
+                    posicion = ubicar_cerca_de_vecinos(copia, nodo, posiciones)
+                    if posicion is None:
+                        sin_ubicar.append(nodo)
+                    else:
+                        posiciones[nodo] = posicion
+                pendientes = sin_ubicar
+            for nodo in pendientes:
+                posiciones[nodo] = ubicar_en_borde(nodo)
+            self._ubicados_incrementalmente += len(nuevos)
+            modo = "incremental"
+
+        return {
+            "posiciones": posiciones,
+            "escala": escala_layout(total_nodos),
+            "modo": modo,
+            "nodos_nuevos": len(nuevos)
+        }
+
+    def ubicar(self, nodo_id: str, grafo: nx.DiGraph = None, layout: Dict = None) -> Optional[Tuple[float, float]]:
+        """
+        Coordenadas en píxeles del nodo. Si todavía no está en el layout calculado
+        (recién ingerido), se devuelve una posición provisoria junto a sus vecinos.
+        """
+        if layout is None:
+            layout, _ = self.obtener()
+        if not layout:
+            return None
+        posicion = layout["posiciones"].get(nodo_id)
+        if posicion is None and grafo is not None and nodo_id in grafo:
+            posicion = ubicar_cerca_de_vecinos(grafo, nodo_id, layout["posiciones"])
+        if posicion is None:
+            return None
+        return (round(posicion[0] * layout["escala"], 1), round(posicion[1] * layout["escala"], 1))
@@ -53,13 +53,14 @@ class MetricasPerformance:
         return metrica
     
     def registrar_consulta(self, pregunta: str, tiempo_ms: float, 
-                          contextos_utilizados: int, usa_propagacion: bool):
+                          contextos_utilizados: int, usa_propagacion: bool, cache_hit: bool = False):
         """
         Registra métricas de consulta del usuario
             pregunta: texto de la consulta
             tiempo_ms: duración total de procesamiento
             contextos_utilizados: número de contextos recuperados
             usa_propagacion: si se usó propagación
+            cache_hit: si la respuesta salió del caché de respuestas
         """
         metrica = {
             "tipo_operacion": "consulta",
@@ -68,6 +69,7 @@ class MetricasPerformance:
             "tiempo_segundos": round(tiempo_ms / 1000, 2),
             "contextos_utilizados": contextos_utilizados,
             "usa_propagacion": usa_propagacion,
+            "cache_hit": cache_hit,
             "timestamp": datetime.now().isoformat()
         }
         
@@ -87,6 +89,8 @@ class MetricasPerformance:
         # Separar por tipo
         cargas = [m for m in self.historial if m["tipo_operacion"] == "carga_dataset"]
         consultas = [m for m in self.historial if m["tipo_operacion"] == "consulta"]
+        consultas_cache = [c for c in consultas if c.get("cache_hit")]
+        consultas_llm = [c for c in consultas if not c.get("cache_hit")]
         
         stats = {
             "total_operaciones": len(self.historial),
@@ -100,7 +104,11 @@ class MetricasPerformance:
                 "tiempo_promedio_ms": round(sum(c["tiempo_ms"] for c in consultas) / len(consultas), 2) if consultas else 0,
                 "tiempo_min_ms": min((c["tiempo_ms"] for c in consultas), default=0),
                 "tiempo_max_ms": max((c["tiempo_ms"] for c in consultas), default=0),
-                "contextos_promedio": round(sum(c["contextos_utilizados"] for c in consultas) / len(consultas), 2) if consultas else 0
+                "contextos_promedio": round(sum(c["contextos_utilizados"] for c in consultas) / len(consultas), 2) if consultas else 0,
+                "desde_cache": len(consultas_cache),
+                "tasa_cache": round(len(consultas_cache) / len(consultas), 3) if consultas else 0,
+                "tiempo_promedio_cache_ms": round(sum(c["tiempo_ms"] for c in consultas_cache) / len(consultas_cache), 2) if consultas_cache else 0,
+                "tiempo_promedio_llm_ms": round(sum(c["tiempo_ms"] for c in consultas_llm) / len(consultas_llm), 2) if consultas_llm else 0
             }
         }
         
@@ -0,0 +1,103 @@
+# agent/plazo.py
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Plazo por defecto de una consulta (se puede pisar por request con plazo_ms)
+PLAZO_CONSULTA_MS = int(os.getenv("PLAZO_CONSULTA_MS", "30000"))
+
+# Costo estimado de cada etapa degradable (ms). Los pasos de propagación se
+# cuentan por semilla y por salto.
+COSTO_ESTIMADO_MS = {
+    "arbol_propagacion": 300,
+    "pasos_propagacion": 40,
+    "analisis_temporal_llm": 2000,
+    "respuesta_llm": 4000,
+}
+
+# Orden de degradación: las primeras se sacrifican antes. Cada etapa solo corre
+# si después le queda tiempo a las más importantes que todavía no se resolvieron.
+PRIORIDAD_ETAPAS = ["arbol_propagacion", "pasos_propagacion", "analisis_temporal_llm", "respuesta_llm"]
+
+DESCRIPCION_ETAPAS = {
+    "arbol_propagacion": "árbol de consulta y explicaciones de caminos de propagación",
+    "pasos_propagacion": "saltos de propagación",
+    "analisis_temporal_llm": "análisis temporal con LLM (se usó el parser local)",
+    "respuesta_llm": "respuesta del LLM (se devolvieron solo los contextos recuperados)",
+}
+
+
+class PlazoConsulta:
+    """
+    Presupuesto de tiempo de una consulta. Cada etapa pregunta si le alcanza el
+    tiempo restante (alcanza) y, si no, se degrada y lo registra (omitir).
+    """
+
+    def __init__(self, plazo_ms: Optional[float] = None):
+        self.plazo_ms = plazo_ms
+        self._inicio = time.monotonic()
+        self._resueltas = set()
+        self.etapas_omitidas: List[Dict] = []
+        self.tiempos_etapas_ms: Dict[str, float] = {}
+
+    @classmethod
+    def sin_limite(cls) -> "PlazoConsulta":
+        return cls(None)
+
+    def transcurrido_ms(self) -> float:
+        return (time.monotonic() - self._inicio) * 1000
+
+    def restante_ms(self) -> float:
+        if self.plazo_ms is None:
+            return float("inf")
+        return max(0.0, self.plazo_ms - self.transcurrido_ms())
+
+    def reserva_ms(self, etapa: str) -> float:
+        """Tiempo a guardar para las etapas más importantes que `etapa` aún pendientes."""
+        posterior = PRIORIDAD_ETAPAS[PRIORIDAD_ETAPAS.index(etapa) + 1:]
+        return sum(COSTO_ESTIMADO_MS[e] for e in posterior if e not in self._resueltas)
+
+    def alcanza(self, etapa: str, unidades: int = 1) -> bool:
+        return self.restante_ms() >= COSTO_ESTIMADO_MS[etapa] * unidades + self.reserva_ms(etapa)
+
+    def timeout_s(self, etapa: str) -> Optional[float]:
+        """Timeout para una etapa sin invadir la reserva de las más importantes (None = sin límite)."""
+        if self.plazo_ms is None:
+            return None
+        return max(0.0, self.restante_ms() - self.reserva_ms(etapa)) / 1000
+
+    def omitir(self, etapa: str, detalle: str = ""):
+        self._resueltas.add(etapa)
+        self.etapas_omitidas.append({
+            "etapa": etapa,
+            "descripcion": DESCRIPCION_ETAPAS.get(etapa, etapa),
+            "detalle": detalle,
+            "restante_ms": round(self.restante_ms(), 2) if self.plazo_ms is not None else None
+        })
+        print(f"⏱️ Plazo: se omite '{etapa}' ({detalle}), quedan {self.restante_ms():.0f} ms")
+
+    def resolver(self, etapa: str):
+        """Marca una etapa como ya resuelta: deja de reservarse tiempo para ella."""
+        self._resueltas.add(etapa)
+
+    def fue_omitida(self, etapa: str) -> bool:
+        return any(o["etapa"] == etapa for o in self.etapas_omitidas)
+
+    @contextmanager
+    def medir(self, etapa: str):
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self.tiempos_etapas_ms[etapa] = round((time.monotonic() - inicio) * 1000, 2)
+
+    def informe(self) -> Dict:
+        transcurrido = self.transcurrido_ms()
+        return {
+            "plazo_ms": self.plazo_ms,
+            "transcurrido_ms": round(transcurrido, 2),
+            "plazo_excedido": self.plazo_ms is not None and transcurrido > self.plazo_ms,
+            "etapas_omitidas": self.etapas_omitidas,
+            "tiempos_etapas_ms": self.tiempos_etapas_ms
+        }
@@ -0,0 +1,151 @@
+# agent/presupuesto_prompt.py
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple
+from agent.cache_temporal import normalizar_pregunta
+
+# Presupuesto de tokens para los contextos del prompt (estimado, sin tokenizer)
+PRESUPUESTO_TOKENS_PROMPT = int(os.getenv("PRESUPUESTO_TOKENS_PROMPT", "3000"))
+CARACTERES_POR_TOKEN = 4  # Aproximación habitual para español con tokenizers tipo SentencePiece
+TOKENS_MINIMOS_POR_CONTEXTO = 60
+UMBRAL_CASI_DUPLICADO = 0.8  # Jaccard de palabras a partir del cual un fragmento se considera repetido
+
+# Modo del prompt: 'completo' (texto recortado de todos) o 'resumenes' (los mejor rankeados
+# con texto, el resto con su resumen extractivo precalculado en la ingesta)
+MODO_PROMPT = os.getenv("MODO_PROMPT", "resumenes")
+CONTEXTOS_CON_TEXTO_COMPLETO = 3
+
+_SEPARADOR_ORACIONES = re.compile(r'(?<=[.!?…])\s+|\n+')
+
+
+def estimar_tokens(texto: str) -> int:
+    return (len(texto) + CARACTERES_POR_TOKEN - 1) // CARACTERES_POR_TOKEN
+
+
+def raices_palabras(texto: str) -> Set[str]:
+    """Raíces de 5 letras de las palabras significativas (sin tildes ni stopwords cortas)."""
+    return {palabra[:5] for palabra in normalizar_pregunta(texto).split() if len(palabra) > 3}
+
+
+def dividir_oraciones(texto: str) -> List[str]:
+    """Oraciones del texto sin repetir (las transcripciones suelen repetir muletillas)."""
+    oraciones, vistas = [], set()
+    for oracion in _SEPARADOR_ORACIONES.split(texto):
+        oracion = oracion.strip()
+        clave = normalizar_pregunta(oracion)
+        if oracion and clave not in vistas:
+            vistas.add(clave)
+            oraciones.append(oracion)
+    return oraciones
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def recortar_a_oraciones_relevantes(texto: str, raices_pregunta: Set[str], max_tokens: int) -> str:
+    """
+    Conserva las oraciones más relacionadas con la pregunta hasta `max_tokens`,
+    en su orden original. Si el texto ya entra, se devuelve completo.
+    """
+    if estimar_tokens(texto) <= max_tokens:
+        return texto
+
+    oraciones = dividir_oraciones(texto)
+    # Puntaje: coincidencias con la pregunta; a igualdad, las primeras oraciones
+    ranking = sorted(
+        range(len(oraciones)),
+        key=lambda i: (-len(raices_palabras(oraciones[i]) & raices_pregunta), i)
+    )
+
+    elegidas, tokens = [], 0
+    for i in ranking:
+        tokens_oracion = estimar_tokens(oraciones[i]) + 2  # + separador
+        if tokens + tokens_oracion > max_tokens:
+            continue
+        elegidas.append(i)
+        tokens += tokens_oracion
+
+    if not elegidas:
+        # Ninguna oración entra entera: cortar la mejor
+        return oraciones[ranking[0]][:max_tokens * CARACTERES_POR_TOKEN].rstrip() + "…"
+    return " […] ".join(oraciones[i] for i in sorted(elegidas))
+
+
+def seleccionar_contextos(pregunta: str, contextos: Dict[str, Dict], pesos: Optional[Dict[str, float]] = None,
+                          presupuesto_tokens: int = PRESUPUESTO_TOKENS_PROMPT,
+                          modo: str = MODO_PROMPT) -> Tuple[Dict[str, Dict], Dict]:
+    """
+    Etapa de armado del prompt con presupuesto de tokens:
+    1. Ordena los contextos por peso_efectivo del árbol de consulta (desc).
+    2. Descarta fragmentos casi duplicados de otro mejor rankeado.
+    3. Recorta cada contexto a sus oraciones más relevantes para la pregunta
+       (en modo 'resumenes', los de menor ranking usan su resumen precalculado).
+    4. Agrega contextos mientras quede presupuesto.
+    Returns:
+        (contextos_seleccionados en orden de ranking, informe)
+    """
+    pesos = pesos or {}
+    orden_original = {ctx_id: i for i, ctx_id in enumerate(contextos)}
+    ranking = sorted(contextos, key=lambda c: (-pesos.get(c, 0.0), orden_original[c]))
+    raices_pregunta = raices_palabras(pregunta)
+
+    # Sin duplicados: cada fragmento se compara con los ya aceptados
+    unicos: List[str] = []
+    raices_aceptados: List[Set[str]] = []
+    duplicados = []
+    for ctx_id in ranking:
+        raices = raices_palabras(contextos[ctx_id].get("texto", ""))
+        if any(_jaccard(raices, otras) >= UMBRAL_CASI_DUPLICADO for otras in raices_aceptados):
+            duplicados.append(ctx_id)
+            continue
+        unicos.append(ctx_id)
+        raices_aceptados.append(raices)
+
+    # Reparto del presupuesto: cuota pareja entre los pendientes (lo que no usa
+    # un contexto corto queda para los siguientes), con un mínimo por contexto
+    seleccionados: Dict[str, Dict] = {}
+    recortados, excluidos, resumidos = [], [], []
+    tokens_usados = 0
+    for posicion, ctx_id in enumerate(unicos):
+        restante = presupuesto_tokens - tokens_usados
+        if restante < TOKENS_MINIMOS_POR_CONTEXTO:
+            excluidos.append(ctx_id)
+            continue
+        cuota = max(TOKENS_MINIMOS_POR_CONTEXTO, restante // (len(unicos) - posicion))
+        texto = contextos[ctx_id].get("texto", "")
+        if modo == "resumenes" and posicion >= CONTEXTOS_CON_TEXTO_COMPLETO and contextos[ctx_id].get("resumen"):
+            texto = contextos[ctx_id]["resumen"]
+            resumidos.append(ctx_id)
+        texto_final = recortar_a_oraciones_relevantes(texto, raices_pregunta, cuota)
+        if texto_final != texto:
+            recortados.append(ctx_id)
+        seleccionados[ctx_id] = {**contextos[ctx_id], "texto": texto_final}
+        tokens_usados += estimar_tokens(texto_final)
+
+    informe = {
+        "presupuesto_tokens": presupuesto_tokens,
+        "modo": modo,
+        "tokens_contextos": tokens_usados,
+        "contextos_recibidos": len(contextos),
+        "contextos_incluidos": len(seleccionados),
+        "duplicados_descartados": duplicados,
+        "recortados": recortados,
+        "resumidos": resumidos,
+        "excluidos_por_presupuesto": excluidos,
+        "tokens_originales": sum(estimar_tokens(c.get("texto", "")) for c in contextos.values())
+    }
+    return seleccionados, informe
+
+
+def pesos_desde_arbol(arbol: Dict) -> Dict[str, float]:
+    """peso_efectivo máximo de las aristas que llegan a cada contexto del árbol de consulta."""
+    pesos: Dict[str, float] = {}
+    for arista in arbol.get("edges", []) if arbol else []:
+        destino = arista.get("to")
+        peso = arista.get("peso_efectivo")
+        if destino is not None and isinstance(peso, (int, float)):
+            pesos[destino] = max(pesos.get(destino, 0.0), float(peso))
+    return pesos
@@ -4,6 +4,8 @@ from collections import defaultdict, deque
 import math
 from agent.semantica import buscar_similares
 from agent.extractor import extraer_palabras_clave
+from agent.centralidad import calcular_centralidad_sparse
+from agent.tareas_fondo import copiar_grafo_seguro
 
 class PropagadorActivacion:
     """
@@ -13,11 +15,12 @@ class PropagadorActivacion:
     relacionados que no están directamente conectados.
     """
     
-    def __init__(self, grafo: nx.DiGraph, metadatos_contextos: Dict):
+    def __init__(self, grafo: nx.DiGraph, metadatos_contextos: Dict, indice_dos_saltos=None):
         self.grafo = grafo
         self.metadatos_contextos = metadatos_contextos
         self.factor_decaimiento = 0.8  # Factor de decaimiento por salto
         self.umbral_activacion = 0.1   # Umbral mínimo de activación
+        self.indice_dos_saltos = indice_dos_saltos  # Vecindario precalculado (opcional)
         
     def propagar_desde_nodo(self, nodo_inicial: str, activacion_inicial: float = 1.0, 
                            max_pasos: int = 3, incluir_temporales: bool = True) -> Dict[str, float]:
@@ -35,6 +38,10 @@ class PropagadorActivacion:
         if nodo_inicial not in self.grafo:
             return {}
         
+        # Atajo: 2 pasos se resuelven con el índice precalculado en vez de recorrer el grafo
+        if max_pasos == 2 and incluir_temporales and self._indice_dos_saltos_vigente():
+            return self._propagar_dos_pasos_indexado(nodo_inicial, activacion_inicial)
+        
         # Inicializar activaciones
         activaciones = {nodo_inicial: activacion_inicial}
         activaciones_por_paso = [activaciones.copy()]
@@ -105,6 +112,67 @@ class PropagadorActivacion:
             'profundidades': profundidades
         }
     
+    def _indice_dos_saltos_vigente(self) -> bool:
+        """El índice sirve solo si fue construido sobre este grafo y con el umbral actual."""
+        indice = self.indice_dos_saltos
+        return (indice is not None and indice.grafo is self.grafo
+                and indice.umbral == self.umbral_activacion)
+    
+    def _propagar_dos_pasos_indexado(self, nodo_inicial: str, activacion_inicial: float) -> Dict:
+        """
+        Equivalente a propagar_desde_nodo(max_pasos=2) usando el vecindario materializado:
+        vecinos directos desde el grafo + un lookup de caminos de 2 saltos.
+        """
+        if activacion_inicial < self.umbral_activacion:
+            return {'activaciones': {}, 'profundidades': {}}
+        
+        # Paso 1: vecinos directos de la semilla
+        vecinos_directos = {}
+        for vecino, datos_arista in self.grafo[nodo_inicial].items():
+            if vecino == nodo_inicial:
+                continue
+            peso_conexion = datos_arista.get('peso_efectivo', 0)
+            if peso_conexion >= self.umbral_activacion:
+                vecinos_directos[vecino] = peso_conexion
+        
+        activaciones_paso_1 = {}
+        for vecino, peso_conexion in vecinos_directos.items():
+            activacion = self._calcular_activacion_propagada(activacion_inicial, peso_conexion, 0)
+            if activacion >= self.umbral_activacion:
+                activaciones_paso_1[vecino] = activacion
+        
+        # Paso 2: la semilla vuelve a emitir hacia sus vecinos...
+        nuevas_activaciones = {}
+        for vecino, peso_conexion in vecinos_directos.items():
+            nuevas_activaciones[vecino] = self._calcular_activacion_propagada(activacion_inicial, peso_conexion, 1)
+        
+        # ...y los nodos del paso 1 emiten hacia los suyos (mejor camino de 2 saltos indexado).
+        # Un intermedio solo emite si su activación del paso 1 superó el umbral.
+        activacion_por_salto = activacion_inicial * self.factor_decaimiento
+        peso_minimo_primer_salto = self.umbral_activacion / activacion_por_salto if activacion_por_salto > 0 else float('inf')
+        
+        for destino, frente in self.indice_dos_saltos.obtener(nodo_inicial).items():
+            producto = self.indice_dos_saltos.mejor_producto(frente, peso_minimo_primer_salto)
+            if producto <= 0:
+                continue
+            activacion = self._calcular_activacion_propagada(activacion_por_salto, producto, 1)
+            nuevas_activaciones[destino] = max(nuevas_activaciones.get(destino, 0.0), activacion)
+        
+        resultado = dict(activaciones_paso_1)
+        resultado.update({
+            nodo: act for nodo, act in nuevas_activaciones.items()
+            if act >= self.umbral_activacion
+        })
+        resultado.pop(nodo_inicial, None)
+        
+        profundidades = {nodo_id: 1 if nodo_id in activaciones_paso_1 else 2 for nodo_id in resultado}
+        print(f"Nodo {nodo_inicial[:8]}: propagación indexada -> {len(resultado)} nodos alcanzados")
+        
+        return {
+            'activaciones': resultado,
+            'profundidades': profundidades
+        }
+    
     def propagar_desde_consulta(self, palabras_clave: List[str], texto_consulta: str,
                                nodos_iniciales: List[str] = None, 
                                max_pasos: int = 2) -> Dict[str, Dict]:
@@ -199,26 +267,16 @@ class PropagadorActivacion:
     
     def analizar_centralidad_propagacion(self, max_pasos: int = 2) -> Dict[str, float]:
         """
-        Analiza qué nodos son más centrales usando propagación de activación.
+        Analiza qué nodos son más centrales.
+        Usa iteración de potencias sobre la matriz dispersa de relaciones en lugar
+        de propagar desde cada nodo (O(N × propagación)). max_pasos se conserva
+        por compatibilidad. Para servir rankings usar grafo.obtener_centralidad(),
+        que lee la versión recalculada en segundo plano.
         Returns:
             Dict[nodo_id, score_centralidad] ordenado por centralidad
         """
-        scores_centralidad = {}
-        
-        for nodo in self.grafo.nodes():
-            if nodo not in self.metadatos_contextos:
-                continue
-            
-            # Propagar desde este nodo
-            activaciones = self.propagar_desde_nodo(nodo, 1.0, max_pasos)
-            
-            # Score = suma de activaciones alcanzadas
-            score = sum(activaciones.values())
-            scores_centralidad[nodo] = score
-        
-        # Ordenar por score descendente
-        return dict(sorted(scores_centralidad.items(), 
-                          key=lambda x: x[1], reverse=True))
+        scores = calcular_centralidad_sparse(copiar_grafo_seguro(self.grafo))
+        return {nodo: score for nodo, score in scores.items() if nodo in self.metadatos_contextos}
     
     def _obtener_vecinos_validos(self, nodo: str, incluir_temporales: bool = True) -> List[Tuple[str, float]]:
         """Obtiene vecinos válidos con sus pesos de conexión."""
@@ -294,12 +352,17 @@ class PropagadorActivacion:
         
         if umbral_activacion is not None:
             self.umbral_activacion = max(0.01, min(0.5, umbral_activacion))
+            
+            # El índice de 2 saltos solo guarda aristas sobre el umbral: reconstruir si cambió
+            indice = self.indice_dos_saltos
+            if indice is not None and indice.grafo is self.grafo and indice.umbral != self.umbral_activacion:
+                indice.reconstruir(self.umbral_activacion)
 
 
 # Funciones de integración con el sistema existente
-def crear_propagador(grafo, metadatos_contextos):
+def crear_propagador(grafo, metadatos_contextos, indice_dos_saltos=None):
     """Factory para crear instancia del propagador."""
-    return PropagadorActivacion(grafo, metadatos_contextos)
+    return PropagadorActivacion(grafo, metadatos_contextos, indice_dos_saltos)
 
 
 def propagar_desde_consulta_integrado(pregunta: str, grafo, metadatos_contextos, 
@@ -0,0 +1,566 @@
+# agent/proveedor_llm.py
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional
+import google.generativeai as genai
+from agent.cliente_llm import cliente_llm, ErrorLLM, GEMINI_API_KEY, GEMINI_MODELO
+from agent.cache_disco import GuardadoDiferido
+from agent.single_flight import SingleFlight
+from agent.resiliencia_llm import (CircuitoLLM, HistorialLatencias, TiempoAgotadoLLM, LLM_TIMEOUT_LLAMADA_S,
+                                   LLM_HEDGING, LLM_HEDGE_PERCENTIL, MUESTRAS_MINIMAS_HEDGE)
+
+# Proveedor activo: gemini | stub | grabar | reproducir
+LLM_PROVEEDOR = os.getenv("LLM_PROVEEDOR", "gemini").strip().lower()
+
+# Latencia del stub: "fija:ms", "uniforme:min_ms:max_ms", "normal:media_ms:desvio_ms" o "lognormal:mediana_ms:sigma"
+LLM_STUB_LATENCIA = os.getenv("LLM_STUB_LATENCIA", "lognormal:800:0.5")
+LLM_STUB_SEMILLA = os.getenv("LLM_STUB_SEMILLA")
+
+# Inyección de fallas del stub (para probar timeouts, circuit breaker y hedging)
+LLM_STUB_TASA_ERRORES = float(os.getenv("LLM_STUB_TASA_ERRORES", "0"))
+LLM_STUB_TASA_LENTAS = float(os.getenv("LLM_STUB_TASA_LENTAS", "0"))
+LLM_STUB_LATENCIA_LENTA_MS = float(os.getenv("LLM_STUB_LATENCIA_LENTA_MS", "30000"))
+
+# Grabaciones para el modo grabar/reproducir
+ARCHIVO_GRABACIONES_LLM = os.getenv("LLM_ARCHIVO_GRABACIONES", "data/grabaciones_llm.json")
+LLM_REPRODUCIR_LATENCIA = os.getenv("LLM_REPRODUCIR_LATENCIA", "1") == "1"
+
+# Prompts idénticos concurrentes comparten una sola llamada al LLM (LLM_SINGLE_FLIGHT=0 para desactivar)
+LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "1") == "1"
+
+# Fechas/horas que cambian en cada consulta (p. ej. "MOMENTO ACTUAL" del prompt temporal)
+_PATRON_FECHAS = re.compile(r'\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2})?)?')
+
+
+def _trocear(texto: str) -> List[str]:
+    """Divide un texto en fragmentos tipo token (palabra + espacio) para simular streaming."""
+    return re.findall(r'\S+\s*|\s+', texto)
+
+
+class ProveedorLLM:
+    """
+    Interfaz común para generar texto con un LLM (síncrono y asíncrono).
+    Las subclases implementan _generar y _generar_async; acá se miden
+    llamadas, errores y tiempo para separar la latencia del LLM del resto,
+    se deduplican prompts idénticos en vuelo (single-flight) y se aplica la
+    capa de resiliencia: circuit breaker, timeout por llamada y hedging opcional.
+    """
+    nombre = "base"
+    requiere_api_key = False
+
+    def __init__(self, single_flight: bool = LLM_SINGLE_FLIGHT, timeout_s: float = LLM_TIMEOUT_LLAMADA_S,
+                 hedging: bool = LLM_HEDGING, hedge_percentil: float = LLM_HEDGE_PERCENTIL):
+        self._lock_estadisticas = threading.Lock()
+        self.llamadas = 0
+        self.errores = 0
+        self.timeouts = 0
+        self.tiempo_total_ms = 0.0
+        self.tiempo_maximo_ms = 0.0
+        self.single_flight = SingleFlight("llm") if single_flight else None
+
+        self.circuito = CircuitoLLM()
+        self.latencias = HistorialLatencias()
+        self.timeout_s = timeout_s
+        self.hedging = hedging
+        self.hedge_percentil = hedge_percentil
+        self.hedges_lanzados = 0
+        self.hedges_ganadores = 0
+
+    @staticmethod
+    def _clave_single_flight(prompt: str, generation_config: Dict = None) -> str:
+        contenido = prompt + json.dumps(generation_config or {}, sort_keys=True)
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def generar(self, prompt: str, generation_config: Dict = None) -> str:
+        if self.single_flight is None:
+            return self._generar_medido(prompt, generation_config)
+        return self.single_flight.ejecutar(
+            self._clave_single_flight(prompt, generation_config),
+            lambda: self._generar_medido(prompt, generation_config)
+        )
+
+    async def generar_async(self, prompt: str, generation_config: Dict = None) -> str:
+        if self.single_flight is None:
+            return await self._generar_async_medido(prompt, generation_config)
+        return await self.single_flight.ejecutar_async(
+            self._clave_single_flight(prompt, generation_config),
+            lambda: self._generar_async_medido(prompt, generation_config)
+        )
+
+    def _generar_medido(self, prompt: str, generation_config: Dict = None) -> str:
+        # Con el circuito abierto falla al instante (CircuitoAbiertoError) sin llamar al LLM
+        self.circuito.verificar()
+        inicio = time.time()
+        try:
+            texto = self._generar(prompt, generation_config)
+        except Exception as e:
+            self._registrar_fallo(e)
+            raise
+        finally:
+            self._registrar_llamada((time.time() - inicio) * 1000)
+        self._registrar_exito((time.time() - inicio) * 1000)
+        return texto
+
+    async def _generar_async_medido(self, prompt: str, generation_config: Dict = None) -> str:
+        self.circuito.verificar()
+        inicio = time.time()
+        try:
+            texto = await self._generar_async_con_cobertura(prompt, generation_config)
+        except asyncio.CancelledError:
+            self.circuito.liberar_prueba()
+            raise
+        except Exception as e:
+            self._registrar_fallo(e)
+            raise
+        finally:
+            self._registrar_llamada((time.time() - inicio) * 1000)
+        self._registrar_exito((time.time() - inicio) * 1000)
+        return texto
+
+    async def _intento_async(self, prompt: str, generation_config: Dict = None) -> str:
+        """Una llamada con timeout total (el del cliente HTTP es por operación, no por llamada)."""
+        try:
+            return await asyncio.wait_for(self._generar_async(prompt, generation_config), self.timeout_s)
+        except asyncio.TimeoutError:
+            raise TiempoAgotadoLLM(f"El LLM no respondió en {self.timeout_s:g} s") from None
+
+    async def _generar_async_con_cobertura(self, prompt: str, generation_config: Dict = None) -> str:
+        """
+        Hedging: si la primera llamada supera el percentil configurado de las latencias
+        recientes, se lanza una segunda igual y gana la primera que responda bien.
+        """
+        umbral_ms = self.latencias.percentil(self.hedge_percentil, MUESTRAS_MINIMAS_HEDGE) if self.hedging else None
+        if umbral_ms is None:
+            return await self._intento_async(prompt, generation_config)
+
+        tareas = [asyncio.ensure_future(self._intento_async(prompt, generation_config))]
+        try:
+            hechas, _ = await asyncio.wait(tareas, timeout=umbral_ms / 1000)
+            if not hechas:
+                with self._lock_estadisticas:
+                    self.hedges_lanzados += 1
+                tareas.append(asyncio.ensure_future(self._intento_async(prompt, generation_config)))
+
+            pendientes, error = set(tareas), None
+            while pendientes:
+                hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in hechas:
+                    if tarea.exception() is None:
+                        if tarea is not tareas[0]:
+                            with self._lock_estadisticas:
+                                self.hedges_ganadores += 1
+                        return tarea.result()
+                    error = tarea.exception()
+            raise error
+        finally:
+            for tarea in tareas:
+                if not tarea.done():
+                    tarea.cancel()
+
+    async def generar_stream_async(self, prompt: str, generation_config: Dict = None) -> AsyncIterator[str]:
+        """
+        Genera la respuesta por fragmentos a medida que el proveedor los entrega.
+        La espera del primer fragmento y la de cada uno de los siguientes están
+        acotadas por timeout_s: un stream trabado falla con TiempoAgotadoLLM.
+        """
+        self.circuito.verificar()
+        inicio = time.time()
+        terminado = False
+        fragmentos = self._generar_stream_async(prompt, generation_config).__aiter__()
+        try:
+            while True:
+                try:
+                    fragmento = await asyncio.wait_for(fragmentos.__anext__(), self.timeout_s)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise TiempoAgotadoLLM(f"El stream del LLM no envió datos en {self.timeout_s:g} s") from None
+                yield fragmento
+            terminado = True
+        except Exception as e:
+            terminado = True
+            self._registrar_fallo(e)
+            raise
+        finally:
+            await fragmentos.aclose()
+            self._registrar_llamada((time.time() - inicio) * 1000)
+            if not terminado:
+                # Cliente desconectado a mitad del stream: sin resultado para el circuito
+                self.circuito.liberar_prueba()
+        # Sin registrar latencia: la duración del stream no sirve como umbral de hedging
+        self.circuito.registrar_exito()
+
+    def _generar(self, prompt: str, generation_config: Dict = None) -> str:
+        raise NotImplementedError
+
+    async def _generar_async(self, prompt: str, generation_config: Dict = None) -> str:
+        return await asyncio.to_thread(self._generar, prompt, generation_config)
+
+    async def _generar_stream_async(self, prompt: str, generation_config: Dict = None) -> AsyncIterator[str]:
+        # Por defecto un único fragmento con la respuesta completa
+        yield await self._generar_async(prompt, generation_config)
+
+    def _registrar_llamada(self, duracion_ms: float):
+        with self._lock_estadisticas:
+            self.llamadas += 1
+            self.tiempo_total_ms += duracion_ms
+            self.tiempo_maximo_ms = max(self.tiempo_maximo_ms, duracion_ms)
+
+    def _registrar_error(self):
+        with self._lock_estadisticas:
+            self.errores += 1
+
+    def _registrar_fallo(self, error: Exception):
+        self._registrar_error()
+        if isinstance(error, TiempoAgotadoLLM):
+            with self._lock_estadisticas:
+                self.timeouts += 1
+        if self._cuenta_para_circuito(error):
+            self.circuito.registrar_fallo(error)
+
+    def _registrar_exito(self, duracion_ms: float):
+        self.circuito.registrar_exito()
+        self.latencias.registrar(duracion_ms)
+
+    def _cuenta_para_circuito(self, error: Exception) -> bool:
+        """Si el error indica un problema del proveedor (abre el circuito)."""
+        return True
+
+    def guardar_ahora(self):
+        """Escribe a disco lo pendiente (solo los proveedores que persisten algo)."""
+
+    def estado_resiliencia(self) -> Dict:
+        with self._lock_estadisticas:
+            hedges_lanzados, hedges_ganadores, timeouts = self.hedges_lanzados, self.hedges_ganadores, self.timeouts
+        umbral_hedge = self.latencias.percentil(self.hedge_percentil, MUESTRAS_MINIMAS_HEDGE)
+        return {
+            "circuito": self.circuito.estado(),
+            "timeout_llamada_s": self.timeout_s,
+            "timeouts": timeouts,
+            "hedging": {
+                "activo": self.hedging,
+                "percentil": self.hedge_percentil,
+                "umbral_ms": round(umbral_hedge, 2) if umbral_hedge is not None else None,
+                "lanzados": hedges_lanzados,
+                "ganadores": hedges_ganadores
+            },
+            "latencias": self.latencias.resumen()
+        }
+
+    def estadisticas(self) -> Dict:
+        with self._lock_estadisticas:
+            estadisticas = {
+                "proveedor": self.nombre,
+                "llamadas": self.llamadas,
+                "errores": self.errores,
+                "timeouts": self.timeouts,
+                "tiempo_promedio_ms": round(self.tiempo_total_ms / self.llamadas, 2) if self.llamadas else 0,
+                "tiempo_maximo_ms": round(self.tiempo_maximo_ms, 2)
+            }
+        estadisticas["single_flight"] = self.single_flight.estadisticas() if self.single_flight else None
+        estadisticas["circuito"] = self.circuito.estado()["estado"]
+        return estadisticas
+
+
+class ProveedorGemini(ProveedorLLM):
+    """Google Gemini: SDK para llamadas síncronas y cliente HTTP compartido para las asíncronas."""
+    nombre = "gemini"
+    requiere_api_key = True
+
+    def __init__(self, modelo: str = GEMINI_MODELO):
+        super().__init__()
+        self.modelo = modelo
+        self._modelo_gemini = None  # Reutilizado entre llamadas
+        if GEMINI_API_KEY:
+            genai.configure(api_key=GEMINI_API_KEY)
+
+    def _generar(self, prompt: str, generation_config: Dict = None) -> str:
+        if self._modelo_gemini is None:
+            self._modelo_gemini = genai.GenerativeModel(self.modelo)
+        try:
+            return self._modelo_gemini.generate_content(
+                prompt, generation_config=generation_config, request_options={"timeout": self.timeout_s}
+            ).text
+        except Exception as e:
+            raise ErrorLLM(f"Error llamando a Gemini: {str(e)}") from e
+
+    async def _generar_async(self, prompt: str, generation_config: Dict = None) -> str:
+        return await cliente_llm.generar(prompt, generation_config)
+
+    async def _generar_stream_async(self, prompt: str, generation_config: Dict = None) -> AsyncIterator[str]:
+        async for fragmento in cliente_llm.generar_stream(prompt, generation_config):
+            yield fragmento
+
+
+class ProveedorStub(ProveedorLLM):
+    """
+    LLM local determinístico para pruebas de carga sin red.
+    La respuesta depende solo del prompt; la latencia se sortea de la distribución configurada.
+    Puede inyectar fallas: errores y llamadas lentas con las tasas configuradas.
+    """
+    nombre = "stub"
+
+    def __init__(self, latencia: str = LLM_STUB_LATENCIA, semilla: Optional[str] = LLM_STUB_SEMILLA,
+                 tasa_errores: float = LLM_STUB_TASA_ERRORES, tasa_lentas: float = LLM_STUB_TASA_LENTAS,
+                 latencia_lenta_ms: float = LLM_STUB_LATENCIA_LENTA_MS):
+        super().__init__()
+        self.latencia = latencia
+        self._distribucion, self._parametros = self._parsear_latencia(latencia)
+        self._aleatorio = random.Random(semilla)
+        self._lock_aleatorio = threading.Lock()
+        self.configurar_fallas(tasa_errores, tasa_lentas, latencia_lenta_ms)
+        self.fallas_inyectadas = {"errores": 0, "lentas": 0}
+
+    def configurar_fallas(self, tasa_errores: float = None, tasa_lentas: float = None,
+                          latencia_lenta_ms: float = None):
+        """Cambia la inyección de fallas en caliente (simular un incidente del proveedor)."""
+        if tasa_errores is not None:
+            self.tasa_errores = min(1.0, max(0.0, tasa_errores))
+        if tasa_lentas is not None:
+            self.tasa_lentas = min(1.0, max(0.0, tasa_lentas))
+        if latencia_lenta_ms is not None:
+            self.latencia_lenta_ms = max(0.0, latencia_lenta_ms)
+
+    def _sortear_llamada(self) -> float:
+        """Latencia de la llamada en ms; lanza ErrorLLM si toca una falla inyectada."""
+        with self._lock_aleatorio:
+            sorteo = self._aleatorio.random()
+        if sorteo < self.tasa_errores:
+            self.fallas_inyectadas["errores"] += 1
+            raise ErrorLLM("Falla simulada del stub")
+        if sorteo < self.tasa_errores + self.tasa_lentas:
+            self.fallas_inyectadas["lentas"] += 1
+            return self.latencia_lenta_ms
+        return self.sortear_latencia_ms()
+
+    @staticmethod
+    def _parsear_latencia(especificacion: str):
+        partes = especificacion.split(':')
+        distribucion = partes[0].strip().lower()
+        parametros = [float(p) for p in partes[1:]]
+        requeridos = {'fija': 1, 'uniforme': 2, 'normal': 2, 'lognormal': 2}
+        if distribucion not in requeridos or len(parametros) != requeridos[distribucion]:
+            raise ValueError(f"Latencia de stub inválida: '{especificacion}'")
+        return distribucion, parametros
+
+    def sortear_latencia_ms(self) -> float:
+        with self._lock_aleatorio:
+            if self._distribucion == 'fija':
+                valor = self._parametros[0]
+            elif self._distribucion == 'uniforme':
+                valor = self._aleatorio.uniform(*self._parametros)
+            elif self._distribucion == 'normal':
+                valor = self._aleatorio.gauss(*self._parametros)
+            else:
+                mediana, sigma = self._parametros
+                valor = self._aleatorio.lognormvariate(0.0, sigma) * mediana
+        return max(0.0, valor)
+
+    @staticmethod
+    def _respuesta(prompt: str) -> str:
+        huella = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+        # El prompt del parser temporal pide un JSON con "es_temporal"
+        if '"es_temporal"' in prompt:
+            return json.dumps({
+                "es_temporal": False,
+                "confianza": 0.5,
+                "ventana_inicio": None,
+                "ventana_fin": None,
+                "explicacion": f"Respuesta simulada del stub ({huella})"
+            })
+        return f"Respuesta simulada del stub ({huella}) para un prompt de {len(prompt)} caracteres."
+
+    def _generar(self, prompt: str, generation_config: Dict = None) -> str:
+        latencia_ms = self._sortear_llamada()
+        # Igual que el timeout del SDK: no se espera más que timeout_s
+        if latencia_ms > self.timeout_s * 1000:
+            time.sleep(self.timeout_s)
+            raise TiempoAgotadoLLM(f"El LLM no respondió en {self.timeout_s:g} s")
+        time.sleep(latencia_ms / 1000)
+        return self._respuesta(prompt)
+
+    async def _generar_async(self, prompt: str, generation_config: Dict = None) -> str:
+        await asyncio.sleep(self._sortear_llamada() / 1000)
+        return self._respuesta(prompt)
+
+    async def _generar_stream_async(self, prompt: str, generation_config: Dict = None) -> AsyncIterator[str]:
+        latencia_ms = self._sortear_llamada()
+        # Una llamada lenta inyectada se traba antes del primer fragmento (como un proveedor colgado)
+        fraccion_primer_fragmento = 1.0 if latencia_ms >= self.latencia_lenta_ms else 0.3
+        async for fragmento in _emitir_con_latencia(self._respuesta(prompt), latencia_ms, fraccion_primer_fragmento):
+            yield fragmento
+
+    def estadisticas(self) -> Dict:
+        return {
+            **super().estadisticas(),
+            "latencia": self.latencia,
+            "fallas": {
+                "tasa_errores": self.tasa_errores,
+                "tasa_lentas": self.tasa_lentas,
+                "latencia_lenta_ms": self.latencia_lenta_ms,
+                "inyectadas": dict(self.fallas_inyectadas)
+            }
+        }
+
+
+class ProveedorGrabacion(ProveedorLLM):
+    """
+    Grabación/reproducción de respuestas en disco.
+    - grabar: delega en otro proveedor y guarda respuesta + latencia por prompt.
+    - reproducir: sirve lo grabado (con la latencia original si se pide) sin red.
+    La clave ignora fechas/horas del prompt para que las grabaciones sigan sirviendo otro día.
+    """
+    requiere_api_key = False
+
+    def __init__(self, modo: str, proveedor_real: ProveedorLLM = None,
+                 archivo: str = ARCHIVO_GRABACIONES_LLM, reproducir_latencia: bool = LLM_REPRODUCIR_LATENCIA):
+        super().__init__()
+        if modo not in ('grabar', 'reproducir'):
+            raise ValueError(f"Modo de grabación inválido: '{modo}'")
+        if modo == 'grabar' and proveedor_real is None:
+            raise ValueError("El modo grabar necesita un proveedor real")
+        self.nombre = modo
+        self.requiere_api_key = modo == 'grabar' and proveedor_real.requiere_api_key
+        self.modo = modo
+        self.proveedor_real = proveedor_real
+        self.archivo = archivo
+        self.reproducir_latencia = reproducir_latencia
+        self._lock = threading.Lock()
+        self._grabaciones: Dict[str, Dict] = self._cargar()
+        self._guardado = GuardadoDiferido(archivo, self._copiar_grabaciones, "las grabaciones del LLM")
+        self.sin_grabacion = 0
+
+    @staticmethod
+    def construir_clave(prompt: str, generation_config: Dict = None) -> str:
+        contenido = _PATRON_FECHAS.sub('<fecha>', prompt) + json.dumps(generation_config or {}, sort_keys=True)
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def _generar(self, prompt: str, generation_config: Dict = None) -> str:
+        # Al grabar se llama a la implementación del proveedor real, no a generar():
+        # single-flight, circuito, timeouts y cobertura ya los aplica este proveedor
+        if self.modo == 'grabar':
+            inicio = time.time()
+            texto = self.proveedor_real._generar(prompt, generation_config)
+            self._grabar(prompt, generation_config, texto, (time.time() - inicio) * 1000)
+            return texto
+
+        grabacion = self._buscar(prompt, generation_config)
+        if self.reproducir_latencia:
+            time.sleep(grabacion["latencia_ms"] / 1000)
+        return grabacion["texto"]
+
+    async def _generar_async(self, prompt: str, generation_config: Dict = None) -> str:
+        if self.modo == 'grabar':
+            inicio = time.time()
+            texto = await self.proveedor_real._generar_async(prompt, generation_config)
+            self._grabar(prompt, generation_config, texto, (time.time() - inicio) * 1000)
+            return texto
+
+        grabacion = self._buscar(prompt, generation_config)
+        if self.reproducir_latencia:
+            await asyncio.sleep(grabacion["latencia_ms"] / 1000)
+        return grabacion["texto"]
+
+    async def _generar_stream_async(self, prompt: str, generation_config: Dict = None) -> AsyncIterator[str]:
+        if self.modo == 'grabar':
+            inicio = time.time()
+            partes = []
+            async for fragmento in self.proveedor_real._generar_stream_async(prompt, generation_config):
+                partes.append(fragmento)
+                yield fragmento
+            self._grabar(prompt, generation_config, ''.join(partes), (time.time() - inicio) * 1000)
+            return
+
+        grabacion = self._buscar(prompt, generation_config)
+        latencia_ms = grabacion["latencia_ms"] if self.reproducir_latencia else 0.0
+        async for fragmento in _emitir_con_latencia(grabacion["texto"], latencia_ms):
+            yield fragmento
+
+    def _cuenta_para_circuito(self, error: Exception) -> bool:
+        # Un prompt sin grabación no es una falla del proveedor
+        return self.modo == 'grabar'
+
+    def _buscar(self, prompt: str, generation_config: Dict = None) -> Dict:
+        with self._lock:
+            grabacion = self._grabaciones.get(self.construir_clave(prompt, generation_config))
+            if grabacion is None:
+                self.sin_grabacion += 1
+        if grabacion is None:
+            raise ErrorLLM("No hay respuesta grabada para este prompt")
+        return grabacion
+
+    def _grabar(self, prompt: str, generation_config: Dict, texto: str, latencia_ms: float):
+        with self._lock:
+            self._grabaciones[self.construir_clave(prompt, generation_config)] = {
+                "texto": texto,
+                "latencia_ms": round(latencia_ms, 2),
+                "prompt_inicio": prompt[:120]
+            }
+        self._guardado.programar()
+
+    def _cargar(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.archivo):
+            return {}
+        try:
+            with open(self.archivo, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠️ No se pudieron cargar las grabaciones del LLM: {e}")
+            return {}
+
+    def _copiar_grabaciones(self) -> Dict[str, Dict]:
+        with self._lock:
+            return dict(self._grabaciones)
+
+    def guardar_ahora(self):
+        self._guardado.guardar_ahora()
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            grabaciones = len(self._grabaciones)
+        return {
+            **super().estadisticas(),
+            "archivo": self.archivo,
+            "grabaciones": grabaciones,
+            "sin_grabacion": self.sin_grabacion,
+            "reproducir_latencia": self.reproducir_latencia
+        }
+
+
+async def _emitir_con_latencia(texto: str, latencia_ms: float,
+                               fraccion_primer_fragmento: float = 0.3) -> AsyncIterator[str]:
+    """
+    Emite `texto` por fragmentos repartiendo `latencia_ms`: una parte antes del
+    primer fragmento (tiempo hasta el primer token) y el resto entre los demás.
+    """
+    fragmentos = _trocear(texto) or [texto]
+    await asyncio.sleep(latencia_ms * fraccion_primer_fragmento / 1000)
+    pausa_s = latencia_ms * (1 - fraccion_primer_fragmento) / max(1, len(fragmentos) - 1) / 1000
+    for i, fragmento in enumerate(fragmentos):
+        if i > 0:
+            await asyncio.sleep(pausa_s)
+        yield fragmento
+
+
+def crear_proveedor(nombre: str = LLM_PROVEEDOR) -> ProveedorLLM:
+    """Crea el proveedor indicado por nombre (variable de entorno LLM_PROVEEDOR)."""
+    if nombre == 'gemini':
+        return ProveedorGemini()
+    if nombre == 'stub':
+        return ProveedorStub()
+    if nombre == 'grabar':
+        return ProveedorGrabacion('grabar', proveedor_real=ProveedorGemini())
+    if nombre == 'reproducir':
+        return ProveedorGrabacion('reproducir')
+    raise ValueError(f"LLM_PROVEEDOR desconocido: '{nombre}' (usar gemini, stub, grabar o reproducir)")
+
+
+# Instancia global usada por responder y temporal_llm_parser
+proveedor_llm = crear_proveedor()
+print(f"🤖 Proveedor LLM: {proveedor_llm.nombre}")
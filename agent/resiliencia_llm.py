@@ -0,0 +1,145 @@
+# agent/resiliencia_llm.py
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+from agent.cliente_llm import ErrorLLM
+
+# Circuit breaker: tras N fallos seguidos deja de llamar al LLM durante un tiempo
+LLM_CB_UMBRAL_FALLOS = int(os.getenv("LLM_CB_UMBRAL_FALLOS", "5"))
+LLM_CB_ESPERA_S = float(os.getenv("LLM_CB_ESPERA_S", "30"))
+
+# Timeout total por llamada (sin streaming) y llamada de cobertura (hedging) opcional
+LLM_TIMEOUT_LLAMADA_S = float(os.getenv("LLM_TIMEOUT_LLAMADA_S", "20"))
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0") == "1"
+LLM_HEDGE_PERCENTIL = float(os.getenv("LLM_HEDGE_PERCENTIL", "95"))
+MUESTRAS_MINIMAS_HEDGE = 20
+
+
+class CircuitoAbiertoError(ErrorLLM):
+    """El circuito está abierto: no se llama al LLM hasta que pase la espera."""
+
+
+class TiempoAgotadoLLM(ErrorLLM):
+    """La llamada al LLM superó el timeout por llamada."""
+
+
+class CircuitoLLM:
+    """
+    Circuit breaker de tres estados:
+    - cerrado: las llamadas pasan; `umbral_fallos` fallos seguidos lo abren.
+    - abierto: se rechaza al instante (fail fast) durante `espera_s`.
+    - semiabierto: pasa una única llamada de prueba; si anda se cierra, si falla se vuelve a abrir.
+    """
+
+    def __init__(self, umbral_fallos: int = LLM_CB_UMBRAL_FALLOS, espera_s: float = LLM_CB_ESPERA_S):
+        self.umbral_fallos = umbral_fallos
+        self.espera_s = espera_s
+        self._lock = threading.Lock()
+        self._estado = "cerrado"
+        self._fallos_seguidos = 0
+        self._abierto_desde: Optional[float] = None
+        self._prueba_en_curso = False
+
+        self.aperturas = 0
+        self.rechazadas = 0
+        self.ultimo_error: Optional[str] = None
+
+    def disponible(self) -> bool:
+        """True si una llamada ahora pasaría (sin consumir la llamada de prueba)."""
+        with self._lock:
+            if self._estado == "cerrado":
+                return True
+            if self._estado == "abierto":
+                return time.monotonic() - self._abierto_desde >= self.espera_s
+            return not self._prueba_en_curso
+
+    def verificar(self):
+        """Deja pasar la llamada o lanza CircuitoAbiertoError."""
+        with self._lock:
+            if self._estado == "abierto" and time.monotonic() - self._abierto_desde >= self.espera_s:
+                self._estado = "semiabierto"
+                self._prueba_en_curso = False
+            if self._estado == "cerrado":
+                return
+            if self._estado == "semiabierto" and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return
+            self.rechazadas += 1
+        raise CircuitoAbiertoError("Circuito del LLM abierto por fallos repetidos")
+
+    def registrar_exito(self):
+        with self._lock:
+            self._fallos_seguidos = 0
+            if self._estado != "cerrado":
+                print("🟢 Circuito del LLM cerrado")
+            self._estado = "cerrado"
+            self._prueba_en_curso = False
+
+    def liberar_prueba(self):
+        """La llamada de prueba se canceló sin resultado: se permite otra."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self, error: Exception):
+        with self._lock:
+            self._fallos_seguidos += 1
+            self.ultimo_error = str(error)
+            if self._estado == "semiabierto" or self._fallos_seguidos >= self.umbral_fallos:
+                if self._estado != "abierto":
+                    self.aperturas += 1
+                    print(f"🔴 Circuito del LLM abierto ({self._fallos_seguidos} fallos seguidos): {error}")
+                self._estado = "abierto"
+                self._abierto_desde = time.monotonic()
+                self._prueba_en_curso = False
+
+    def estado(self) -> Dict:
+        with self._lock:
+            reapertura = None
+            if self._estado == "abierto":
+                reapertura = round(max(0.0, self.espera_s - (time.monotonic() - self._abierto_desde)), 2)
+            return {
+                "estado": self._estado,
+                "fallos_seguidos": self._fallos_seguidos,
+                "umbral_fallos": self.umbral_fallos,
+                "espera_s": self.espera_s,
+                "segundos_para_prueba": reapertura,
+                "aperturas": self.aperturas,
+                "rechazadas": self.rechazadas,
+                "ultimo_error": self.ultimo_error
+            }
+
+
+class HistorialLatencias:
+    """Últimas latencias exitosas del LLM, para percentiles (umbral del hedging)."""
+
+    def __init__(self, max_muestras: int = 200):
+        self._lock = threading.Lock()
+        self._muestras = deque(maxlen=max_muestras)
+
+    def registrar(self, duracion_ms: float):
+        with self._lock:
+            self._muestras.append(duracion_ms)
+
+    def percentil(self, p: float, minimo_muestras: int = 1) -> Optional[float]:
+        with self._lock:
+            ordenadas = sorted(self._muestras)
+        if len(ordenadas) < max(1, minimo_muestras):
+            return None
+        indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+        return ordenadas[indice]
+
+    def resumen(self) -> Dict:
+        with self._lock:
+            muestras = len(self._muestras)
+        return {
+            "muestras": muestras,
+            "p50_ms": self._redondear(self.percentil(50)),
+            "p95_ms": self._redondear(self.percentil(95)),
+            "p99_ms": self._redondear(self.percentil(99))
+        }
+
+    @staticmethod
+    def _redondear(valor: Optional[float]) -> Optional[float]:
+        return round(valor, 2) if valor is not None else None
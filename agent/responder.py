@@ -1,17 +1,40 @@
 # agent/responder.py 
 import requests
 import os
+import time
+import asyncio
 from datetime import datetime
-from typing import Dict
-import google.generativeai as genai
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from agent.proveedor_llm import proveedor_llm
+from agent.presupuesto_prompt import seleccionar_contextos, estimar_tokens, PRESUPUESTO_TOKENS_PROMPT
+from agent.plazo import PlazoConsulta
+from agent.resiliencia_llm import CircuitoAbiertoError
 
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") 
 
-if not GEMINI_API_KEY:
+if proveedor_llm.requiere_api_key and not GEMINI_API_KEY:
     raise ValueError("❌ ERROR: No se encontró GEMINI_API_KEY en el archivo .env")
 
-genai.configure(api_key=GEMINI_API_KEY)
+# Configuración  (igual que RAG estándar)
+CONFIGURACION_GENERACION = {
+    'temperature': 0.3,
+    'top_p': 0.95,
+    'top_k': 40,
+    'max_output_tokens': 2048
+}
+
+# Modo map-reduce: respuestas parciales por grupo de contextos (en paralelo) + síntesis
+MODO_RESPUESTA = os.getenv("MODO_RESPUESTA", "auto")  # 'directo', 'map_reduce' o 'auto'
+UMBRAL_MAP_REDUCE = int(os.getenv("UMBRAL_MAP_REDUCE", "12"))  # contextos a partir de los cuales 'auto' usa map-reduce
+MAP_REDUCE_MAX_CONCURRENCIA = int(os.getenv("MAP_REDUCE_MAX_CONCURRENCIA", "4"))
+MAX_CONTEXTOS_POR_GRUPO = 6
+SIN_INFORMACION = "SIN INFORMACIÓN"
+CONFIGURACION_PARCIAL = {**CONFIGURACION_GENERACION, 'max_output_tokens': 512}
+
+# Encabezados de las respuestas degradadas (sin LLM): no se cachean
+MOTIVO_PLAZO = "⏱️ No hubo tiempo para generar una respuesta dentro del plazo."
+MOTIVO_CIRCUITO = "⚠️ El servicio de IA no está disponible en este momento."
 
 def construir_prompt(pregunta: str, contextos: dict) -> str:
     """
@@ -189,64 +212,432 @@ Si la pregunta es "¿Qué casos se discutieron?" y tienes 8 contextos de "Amparo
     return prompt
 
 
-def responder_con_ia(pregunta: str, contextos: dict) -> str:
+async def responder_con_ia_async(pregunta: str, contextos: dict, plazo: Optional[PlazoConsulta] = None) -> str:
     """
-    Genera respuesta usando Google Gemini con prompt optimizado.
+    Genera respuesta con el proveedor LLM configurado y prompt optimizado (con Gemini
+    usa el cliente HTTP compartido: conexiones reutilizadas, concurrencia acotada y timeout).
+    Con `plazo`, si no alcanza el tiempo (o el LLM no termina a tiempo) se
+    devuelven solo los contextos recuperados.
     """
-    if not GEMINI_API_KEY:
+    if proveedor_llm.requiere_api_key and not GEMINI_API_KEY:
         return "[ERROR] No se configuró GEMINI_API_KEY"
     
     if not contextos:
         return "No se encontraron contextos relevantes para responder tu pregunta."
     
+    if not proveedor_llm.circuito.disponible():
+        return respuesta_solo_recuperacion(contextos, MOTIVO_CIRCUITO)
+    
+    plazo = plazo or PlazoConsulta.sin_limite()
+    if not plazo.alcanza("respuesta_llm"):
+        plazo.omitir("respuesta_llm", "sin tiempo para generar la respuesta")
+        return respuesta_solo_recuperacion(contextos)
+    
     prompt = construir_prompt(pregunta, contextos)
     
-    # Usar SDK de Google en lugar de requests
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Configuración  (igual que RAG estándar)
-        generation_config = {
-            'temperature': 0.3,
-            'top_p': 0.95,
-            'top_k': 40,
-            'max_output_tokens': 2048
-        }
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config
-        )
-        
-        respuesta = response.text.strip()
-        
-        # Post-procesamiento: remover frases problemáticas comunes
-        frases_problematicas = [
-            "la información provista no",
-            "los fragmentos no mencionan",
-            "no se proporciona información",
-            "no hay información sobre"
-        ]
+        with plazo.medir("respuesta_llm"):
+            respuesta = await asyncio.wait_for(proveedor_llm.generar_async(prompt, CONFIGURACION_GENERACION),
+                                               plazo.timeout_s("respuesta_llm"))
+        return postprocesar_respuesta(respuesta.strip(), contextos)
+    except asyncio.TimeoutError:
+        plazo.omitir("respuesta_llm", "el LLM no respondió dentro del plazo")
+        return respuesta_solo_recuperacion(contextos)
+    except CircuitoAbiertoError:
+        return respuesta_solo_recuperacion(contextos, MOTIVO_CIRCUITO)
+    except Exception as e:
+        return f"[ERROR] {str(e)}"
+
+
+def respuesta_solo_recuperacion(contextos: dict, motivo: str = MOTIVO_PLAZO, max_contextos: int = 5) -> str:
+    """Respuesta degradada sin LLM: los contextos recuperados con su resumen (o inicio del texto)."""
+    lineas = [f"{motivo} Contextos más relevantes:"]
+    for c in list(contextos.values())[:max_contextos]:
+        extracto = c.get('resumen') or c.get('texto', '')[:200] + '...'
+        lineas.append(f"- {c.get('titulo', 'Sin título')}: {extracto}")
+    return "\n".join(lineas)
+
+
+def es_solo_recuperacion(respuesta: str) -> bool:
+    return respuesta.startswith((MOTIVO_PLAZO, MOTIVO_CIRCUITO))
+
+
+async def _stream_con_plazo(prompt: str, plazo: PlazoConsulta) -> AsyncIterator[str]:
+    """
+    Fragmentos del LLM con la espera del primero acotada por el plazo (asyncio.TimeoutError
+    si no llega a tiempo). Una vez que empezó a llegar texto no se corta.
+    """
+    flujo = proveedor_llm.generar_stream_async(prompt, CONFIGURACION_GENERACION)
+    try:
+        try:
+            primero = await asyncio.wait_for(flujo.__anext__(), plazo.timeout_s("respuesta_llm"))
+        except StopAsyncIteration:
+            return
+        yield primero
+        async for fragmento in flujo:
+            yield fragmento
+    finally:
+        await flujo.aclose()
+
+
+async def responder_con_ia_stream(pregunta: str, contextos: dict, informe: Optional[Dict] = None,
+                                  plazo: Optional[PlazoConsulta] = None) -> AsyncIterator[str]:
+    """
+    Genera la respuesta por fragmentos a medida que llegan del LLM.
+    El texto completo se post-procesa al final con postprocesar_respuesta.
+    Si el LLM falla (aunque ya haya enviado texto) se anota en informe["error"]:
+    esa respuesta no debe cachearse. Con `plazo`, si no alcanza el tiempo o el
+    primer fragmento no llega a tiempo se envían solo los contextos recuperados.
+    """
+    informe = informe if informe is not None else {}
+    if proveedor_llm.requiere_api_key and not GEMINI_API_KEY:
+        informe["error"] = "No se configuró GEMINI_API_KEY"
+        yield "[ERROR] No se configuró GEMINI_API_KEY"
+        return
+    
+    if not contextos:
+        yield "No se encontraron contextos relevantes para responder tu pregunta."
+        return
+    
+    if not proveedor_llm.circuito.disponible():
+        yield respuesta_solo_recuperacion(contextos, MOTIVO_CIRCUITO)
+        return
+    
+    plazo = plazo or PlazoConsulta.sin_limite()
+    if not plazo.alcanza("respuesta_llm"):
+        plazo.omitir("respuesta_llm", "sin tiempo para generar la respuesta")
+        yield respuesta_solo_recuperacion(contextos)
+        return
+    
+    prompt = construir_prompt(pregunta, contextos)
+    
+    try:
+        with plazo.medir("respuesta_llm"):
+            async for fragmento in _stream_con_plazo(prompt, plazo):
+                yield fragmento
+    except asyncio.TimeoutError:
+        plazo.omitir("respuesta_llm", "el LLM no empezó a responder dentro del plazo")
+        yield respuesta_solo_recuperacion(contextos)
+    except CircuitoAbiertoError as e:
+        informe["error"] = str(e)
+        yield respuesta_solo_recuperacion(contextos, MOTIVO_CIRCUITO)
+    except Exception as e:
+        informe["error"] = str(e)
+        yield f"[ERROR] {str(e)}"
+
+
+def postprocesar_respuesta(respuesta: str, contextos: dict) -> str:
+    """Post-procesamiento: remover frases problemáticas comunes"""
+    frases_problematicas = [
+        "la información provista no",
+        "los fragmentos no mencionan",
+        "no se proporciona información",
+        "no hay información sobre"
+    ]
+    
+    if any(frase in respuesta.lower() for frase in frases_problematicas):
+        print(f"⚠️ Respuesta problemática detectada: {respuesta[:100]}")
         
-        if any(frase in respuesta.lower() for frase in frases_problematicas):
-            print(f"⚠️ Respuesta problemática detectada: {respuesta[:100]}")
+        if contextos:
+            primer_contexto = list(contextos.values())[0]
+            titulo = primer_contexto.get('titulo', 'contexto')
+            timestamp = primer_contexto.get('timestamp')
             
-            if contextos:
-                primer_contexto = list(contextos.values())[0]
-                titulo = primer_contexto.get('titulo', 'contexto')
-                timestamp = primer_contexto.get('timestamp')
-                
-                if timestamp:
-                    try:
-                        fecha = datetime.fromisoformat(timestamp.replace('Z', ''))
-                        fecha_str = fecha.strftime('%d/%m a las %H:%M')
-                        return f"Encontré información relacionada en '{titulo}' programado para el {fecha_str}."
-                    except:
-                        return f"Encontré información relacionada en '{titulo}'."
-                else:
+            if timestamp:
+                try:
+                    fecha = datetime.fromisoformat(timestamp.replace('Z', ''))
+                    fecha_str = fecha.strftime('%d/%m a las %H:%M')
+                    return f"Encontré información relacionada en '{titulo}' programado para el {fecha_str}."
+                except:
                     return f"Encontré información relacionada en '{titulo}'."
-        
-        return respuesta
-        
+            else:
+                return f"Encontré información relacionada en '{titulo}'."
+    
+    return respuesta
+
+
+def agrupar_contextos(contextos: dict) -> Dict[str, Dict[str, Dict]]:
+    """
+    Agrupa los contextos por conversación (o documento PDF) para el modo map-reduce.
+    Los contextos sueltos van juntos y los grupos grandes se parten en bloques
+    de MAX_CONTEXTOS_POR_GRUPO para que ningún prompt parcial sea muy largo.
+    """
+    grupos: Dict[str, Dict[str, Dict]] = {}
+    for ctx_id, c in contextos.items():
+        if c.get('es_pdf'):
+            clave = f"documento:{c.get('source_document', 'documento')}"
+        elif c.get('conversacion_id'):
+            clave = f"conversacion:{c['conversacion_id']}"
+        else:
+            clave = "sueltos"
+        grupos.setdefault(clave, {})[ctx_id] = c
+
+    resultado = {}
+    for clave, miembros in grupos.items():
+        ids = list(miembros)
+        if len(ids) <= MAX_CONTEXTOS_POR_GRUPO:
+            resultado[clave] = miembros
+            continue
+        for numero, inicio in enumerate(range(0, len(ids), MAX_CONTEXTOS_POR_GRUPO), 1):
+            resultado[f"{clave}#{numero}"] = {i: miembros[i] for i in ids[inicio:inicio + MAX_CONTEXTOS_POR_GRUPO]}
+    return resultado
+
+
+def debe_usar_map_reduce(contextos: dict, modo: str = MODO_RESPUESTA) -> bool:
+    """'map_reduce' siempre; 'auto' solo con muchos contextos repartidos en más de un grupo."""
+    if modo == "map_reduce":
+        return True
+    if modo == "auto":
+        return len(contextos) >= UMBRAL_MAP_REDUCE and len(agrupar_contextos(contextos)) > 1
+    return False
+
+
+def _titulo_grupo(contextos: dict) -> str:
+    primer_contexto = next(iter(contextos.values()))
+    if primer_contexto.get('es_pdf'):
+        return f"📄 {primer_contexto.get('source_document', 'documento')}"
+    return primer_contexto.get('titulo', 'Sin título').split(' - Fragmento')[0]
+
+
+def construir_prompt_parcial(pregunta: str, contextos: dict, numero: int, total: int) -> str:
+    """Prompt corto de la fase map: responder solo con los contextos de un grupo."""
+    bloques = []
+    for c in contextos.values():
+        titulo = c.get('titulo', 'Sin título')
+        timestamp = c.get('timestamp')
+        if timestamp:
+            try:
+                fecha = datetime.fromisoformat(timestamp.replace('Z', ''))
+                titulo = f"[{fecha.strftime('%d/%m/%Y %H:%M')}] {titulo}"
+            except:
+                pass
+        bloques.append(f"{titulo}:\n{c.get('texto', '')}")
+
+    return f"""Eres un asistente que extrae información de un grupo de contextos para responder una pregunta.
+
+**PREGUNTA:**
+"{pregunta}"
+
+**CONTEXTOS (grupo {numero} de {total}, {len(contextos)} contextos):**
+{chr(10).join(bloques)}
+
+**INSTRUCCIONES:**
+1. Responde la pregunta usando SOLO estos contextos, en pocas oraciones
+2. Incluye fechas, nombres, casos y cifras concretas que aparezcan
+3. Si la pregunta pide una enumeración, lista TODOS los elementos de este grupo
+4. Si ningún contexto sirve para responder, escribe exactamente: {SIN_INFORMACION}
+
+**RESPUESTA PARCIAL:**"""
+
+
+def construir_prompt_sintesis(pregunta: str, parciales: List[Dict]) -> str:
+    """Prompt de la fase reduce: integrar las respuestas parciales de cada grupo."""
+    bloques = [f"[{p['titulo']}]:\n{p['respuesta']}" for p in parciales]
+    return f"""Eres un asistente experto que integra información de varias fuentes en una sola respuesta.
+
+**PREGUNTA DEL USUARIO:**
+"{pregunta}"
+
+**RESPUESTAS PARCIALES ({len(parciales)} grupos de contextos):**
+{chr(10).join(bloques)}
+
+**INSTRUCCIONES:**
+1. Integra TODAS las respuestas parciales en una respuesta única y coherente
+2. No repitas la información que aparece en varios grupos
+3. Si la pregunta pide una enumeración, menciona todos los elementos e indica cuántos son
+4. Conserva fechas y horarios
+5. No menciones grupos ni respuestas parciales
+
+**RESPUESTA:**"""
+
+
+async def _fase_map(pregunta: str, contextos: dict, pesos: Optional[Dict[str, float]],
+                    presupuesto_tokens: int, max_concurrencia: int) -> Tuple[List[Dict], Dict]:
+    """
+    Respuestas parciales por grupo en paralelo (como mucho max_concurrencia a la vez).
+    Cada grupo pasa por su propio presupuesto de tokens.
+    """
+    grupos = agrupar_contextos(contextos)
+    semaforo = asyncio.Semaphore(max_concurrencia)
+    inicio = time.time()
+
+    async def responder_grupo(numero: int, clave: str, miembros: dict) -> Dict:
+        contextos_grupo, _ = seleccionar_contextos(pregunta, miembros, pesos, presupuesto_tokens)
+        prompt = construir_prompt_parcial(pregunta, contextos_grupo, numero, len(grupos))
+        info = {
+            "grupo": clave,
+            "titulo": _titulo_grupo(miembros),
+            "contextos": list(contextos_grupo),
+            "tokens_prompt": estimar_tokens(prompt)
+        }
+        async with semaforo:
+            inicio_grupo = time.time()
+            try:
+                respuesta = (await proveedor_llm.generar_async(prompt, CONFIGURACION_PARCIAL)).strip()
+                info["respuesta"] = respuesta
+                info["sin_informacion"] = not respuesta or respuesta.upper().startswith(SIN_INFORMACION)
+            except Exception as e:
+                info["error"] = str(e)
+            info["tiempo_ms"] = round((time.time() - inicio_grupo) * 1000, 2)
+        return info
+
+    resultados = await asyncio.gather(*[
+        responder_grupo(numero, clave, miembros)
+        for numero, (clave, miembros) in enumerate(grupos.items(), 1)
+    ])
+
+    informe = {
+        "grupos": [{k: v for k, v in r.items() if k != "respuesta"} for r in resultados],
+        "max_concurrencia": max_concurrencia,
+        "tiempo_map_ms": round((time.time() - inicio) * 1000, 2),
+        "contextos_en_prompt": [ctx_id for r in resultados for ctx_id in r["contextos"]]
+    }
+    utiles = [r for r in resultados if "respuesta" in r and not r["sin_informacion"]]
+    return utiles, informe
+
+
+async def _preparar_map_reduce(pregunta: str, contextos: dict, pesos: Optional[Dict[str, float]],
+                               presupuesto_tokens: int, max_concurrencia: int) -> Tuple[Optional[str], Dict]:
+    """
+    Ejecuta la fase map y devuelve (prompt de síntesis, informe). Sin prompt cuando
+    no hace falta sintetizar: el informe trae entonces 'respuesta' directamente.
+    Si algún grupo falló, informe["error"] lo indica: la respuesta sale de grupos
+    incompletos y no debe cachearse.
+    """
+    parciales, informe = await _fase_map(pregunta, contextos, pesos, presupuesto_tokens, max_concurrencia)
+    errores = [g for g in informe["grupos"] if "error" in g]
+    print(f"Map-reduce: {len(informe['grupos'])} grupos, {len(parciales)} con información, "
+          f"{len(errores)} con error ({informe['tiempo_map_ms']} ms)")
+    if errores:
+        informe["error"] = f"{len(errores)} de {len(informe['grupos'])} grupos fallaron en la fase map"
+
+    if not parciales:
+        if errores and len(errores) == len(informe["grupos"]):
+            informe["respuesta"] = (f"[ERROR] {errores[0]['error']}" if proveedor_llm.circuito.disponible()
+                                    else respuesta_solo_recuperacion(contextos, MOTIVO_CIRCUITO))
+        else:
+            informe["respuesta"] = "No se encontraron contextos relevantes para responder tu pregunta."
+        return None, informe
+    if len(parciales) == 1:
+        # Un solo grupo aporta información: su respuesta parcial ya es la final
+        informe["respuesta"] = parciales[0]["respuesta"]
+        return None, informe
+    return construir_prompt_sintesis(pregunta, parciales), informe
+
+
+async def responder_map_reduce_async(pregunta: str, contextos: dict, pesos: Optional[Dict[str, float]] = None,
+                                     presupuesto_tokens: int = PRESUPUESTO_TOKENS_PROMPT,
+                                     max_concurrencia: int = MAP_REDUCE_MAX_CONCURRENCIA,
+                                     plazo: Optional[PlazoConsulta] = None) -> Dict:
+    """
+    Respuesta en modo map-reduce para conjuntos grandes de contextos: una respuesta
+    parcial por grupo (conversación/documento) en paralelo y una síntesis corta.
+    La latencia queda acotada por el grupo más lento en lugar de un único prompt enorme.
+    Returns:
+        {"respuesta": str, "informe": tiempos por fase y detalle por grupo}
+    """
+    if proveedor_llm.requiere_api_key and not GEMINI_API_KEY:
+        return {"respuesta": "[ERROR] No se configuró GEMINI_API_KEY", "informe": {}}
+    
+    if not contextos:
+        return {"respuesta": "No se encontraron contextos relevantes para responder tu pregunta.", "informe": {}}
+
+    if not proveedor_llm.circuito.disponible():
+        return {"respuesta": respuesta_solo_recuperacion(contextos, MOTIVO_CIRCUITO), "informe": {}}
+
+    plazo = plazo or PlazoConsulta.sin_limite()
+    if not plazo.alcanza("respuesta_llm"):
+        plazo.omitir("respuesta_llm", "sin tiempo para generar la respuesta")
+        return {"respuesta": respuesta_solo_recuperacion(contextos), "informe": {}}
+
+    inicio = time.time()
+    try:
+        # Las dos fases comparten el tiempo restante del plazo
+        with plazo.medir("respuesta_llm"):
+            prompt_sintesis, informe = await asyncio.wait_for(
+                _preparar_map_reduce(pregunta, contextos, pesos, presupuesto_tokens, max_concurrencia),
+                plazo.timeout_s("respuesta_llm")
+            )
+            inicio_reduce = time.time()
+            if prompt_sintesis is None:
+                respuesta = informe.pop("respuesta")
+            else:
+                respuesta = (await asyncio.wait_for(
+                    proveedor_llm.generar_async(prompt_sintesis, CONFIGURACION_GENERACION),
+                    plazo.timeout_s("respuesta_llm")
+                )).strip()
+    except asyncio.TimeoutError:
+        plazo.omitir("respuesta_llm", "el map-reduce no terminó dentro del plazo")
+        return {"respuesta": respuesta_solo_recuperacion(contextos), "informe": {}}
+    except CircuitoAbiertoError:
+        return {"respuesta": respuesta_solo_recuperacion(contextos, MOTIVO_CIRCUITO), "informe": {}}
     except Exception as e:
-        return f"[ERROR] {str(e)}"
\ No newline at end of file
+        return {"respuesta": f"[ERROR] {str(e)}", "informe": {}}
+    informe["tiempo_reduce_ms"] = round((time.time() - inicio_reduce) * 1000, 2)
+    informe["tiempo_total_ms"] = round((time.time() - inicio) * 1000, 2)
+
+    if not respuesta.startswith("[ERROR]"):
+        respuesta = postprocesar_respuesta(respuesta, contextos)
+    return {"respuesta": respuesta, "informe": informe}
+
+
+async def responder_map_reduce_stream(pregunta: str, contextos: dict, pesos: Optional[Dict[str, float]] = None,
+                                      presupuesto_tokens: int = PRESUPUESTO_TOKENS_PROMPT,
+                                      max_concurrencia: int = MAP_REDUCE_MAX_CONCURRENCIA,
+                                      informe: Optional[Dict] = None,
+                                      plazo: Optional[PlazoConsulta] = None) -> AsyncIterator[str]:
+    """
+    Como responder_map_reduce_async, pero la síntesis se envía por fragmentos.
+    Los tiempos por fase se agregan al dict `informe` recibido; si falló algún
+    grupo de la fase map o la síntesis a mitad del stream queda en informe["error"].
+    La fase map y la espera del primer fragmento de la síntesis quedan acotadas por `plazo`.
+    """
+    informe = informe if informe is not None else {}
+    if proveedor_llm.requiere_api_key and not GEMINI_API_KEY:
+        informe["error"] = "No se configuró GEMINI_API_KEY"
+        yield "[ERROR] No se configuró GEMINI_API_KEY"
+        return
+    
+    if not contextos:
+        yield "No se encontraron contextos relevantes para responder tu pregunta."
+        return
+
+    if not proveedor_llm.circuito.disponible():
+        yield respuesta_solo_recuperacion(contextos, MOTIVO_CIRCUITO)
+        return
+
+    plazo = plazo or PlazoConsulta.sin_limite()
+    if not plazo.alcanza("respuesta_llm"):
+        plazo.omitir("respuesta_llm", "sin tiempo para generar la respuesta")
+        yield respuesta_solo_recuperacion(contextos)
+        return
+
+    inicio = time.time()
+    try:
+        prompt_sintesis, informe_map = await asyncio.wait_for(
+            _preparar_map_reduce(pregunta, contextos, pesos, presupuesto_tokens, max_concurrencia),
+            plazo.timeout_s("respuesta_llm")
+        )
+    except asyncio.TimeoutError:
+        plazo.omitir("respuesta_llm", "la fase map no terminó dentro del plazo")
+        yield respuesta_solo_recuperacion(contextos)
+        return
+    informe.update(informe_map)
+    inicio_reduce = time.time()
+    if prompt_sintesis is None:
+        yield informe.pop("respuesta")
+    else:
+        try:
+            async for fragmento in _stream_con_plazo(prompt_sintesis, plazo):
+                yield fragmento
+        except asyncio.TimeoutError:
+            plazo.omitir("respuesta_llm", "la síntesis no empezó dentro del plazo")
+            yield respuesta_solo_recuperacion(contextos)
+        except CircuitoAbiertoError as e:
+            informe["error"] = str(e)
+            yield respuesta_solo_recuperacion(contextos, MOTIVO_CIRCUITO)
+        except Exception as e:
+            informe["error"] = str(e)
+            yield f"[ERROR] {str(e)}"
+    informe["tiempo_reduce_ms"] = round((time.time() - inicio_reduce) * 1000, 2)
+    informe["tiempo_total_ms"] = round((time.time() - inicio) * 1000, 2)
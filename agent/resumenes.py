@@ -0,0 +1,150 @@
+# agent/resumenes.py
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Iterable, List
+import numpy as np
+from agent.presupuesto_prompt import dividir_oraciones, raices_palabras
+
+MAX_ORACIONES_RESUMEN = 2
+MAX_ORACIONES_CLAVE = 3
+PESO_PALABRAS_CLAVE = 0.5  # El resto del puntaje viene de la cercanía al centroide de embeddings
+
+
+def resumir_extractivo(texto: str, palabras_clave: Iterable[str], codificar: Callable = None,
+                       max_oraciones: int = MAX_ORACIONES_RESUMEN) -> Dict:
+    """
+    Resumen extractivo de un fragmento, sin llamar al LLM.
+    Cada oración se puntúa por:
+    - cobertura de las palabras_clave del fragmento (las mismas que usa el grafo)
+    - similitud coseno con el centroide de los embeddings de sus oraciones
+    El resumen son las mejores oraciones en su orden original.
+    """
+    oraciones = dividir_oraciones(texto)
+    if len(oraciones) <= max_oraciones:
+        return {"resumen": " ".join(oraciones), "oraciones_clave": oraciones[:MAX_ORACIONES_CLAVE]}
+
+    raices_clave = {palabra[:5] for palabra in palabras_clave if palabra}
+    cobertura = np.array([
+        len(raices_palabras(oracion) & raices_clave) for oracion in oraciones
+    ], dtype=np.float32)
+    if cobertura.max() > 0:
+        cobertura /= cobertura.max()
+
+    if codificar is not None:
+        vectores = np.asarray(codificar(oraciones), dtype=np.float32)
+        vectores /= np.linalg.norm(vectores, axis=1, keepdims=True) + 1e-9
+        centroide = vectores.mean(axis=0)
+        centroide /= np.linalg.norm(centroide) + 1e-9
+        centralidad = np.clip(vectores @ centroide, 0.0, 1.0)
+        puntajes = PESO_PALABRAS_CLAVE * cobertura + (1 - PESO_PALABRAS_CLAVE) * centralidad
+    else:
+        puntajes = cobertura
+
+    ranking = [int(i) for i in np.argsort(-puntajes, kind="stable")]
+    return {
+        "resumen": " ".join(oraciones[i] for i in sorted(ranking[:max_oraciones])),
+        "oraciones_clave": [oraciones[i] for i in ranking[:MAX_ORACIONES_CLAVE]]
+    }
+
+
+class ServicioResumenes:
+    """
+    Etapa de ingesta en segundo plano: calcula el resumen extractivo de cada
+    fragmento nuevo y lo guarda en sus metadatos ('resumen', 'oraciones_clave').
+    Al vaciarse la cola persiste los metadatos una sola vez.
+    """
+
+    def __init__(self, obtener_metadatos: Callable[[], Dict[str, Dict]],
+                 obtener_metadatos_fragmentos: Callable[[], Dict[str, Dict]],
+                 guardar: Callable[[List[str]], None], codificar: Callable = None):
+        self._obtener_metadatos = obtener_metadatos
+        self._obtener_metadatos_fragmentos = obtener_metadatos_fragmentos
+        self._guardar = guardar
+        self._codificar = codificar
+        self._cola: "queue.Queue[str]" = queue.Queue()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+        self.procesados = 0
+        self.errores = 0
+        self.ultimo_error = None
+        self.tiempo_total_ms = 0.0
+
+    def encolar(self, ids: Iterable[str]) -> int:
+        cantidad = 0
+        for ctx_id in ids:
+            self._cola.put(ctx_id)
+            cantidad += 1
+        if cantidad:
+            self._iniciar_hilo()
+        return cantidad
+
+    def encolar_pendientes(self) -> int:
+        """Encola los contextos que todavía no tienen resumen (p. ej. datos previos a esta etapa)."""
+        metadatos = self._obtener_metadatos()
+        return self.encolar([ctx_id for ctx_id, meta in list(metadatos.items()) if "resumen" not in meta])
+
+    def resumir(self, ctx_id: str) -> bool:
+        """Calcula y guarda el resumen de un contexto (síncrono)."""
+        metadatos = self._obtener_metadatos()
+        meta = metadatos.get(ctx_id)
+        if meta is None:
+            return False
+
+        inicio = time.time()
+        resultado = resumir_extractivo(meta.get("texto", ""), meta.get("palabras_clave", []), self._codificar)
+        # Reemplazar el dict completo (no agregar claves) para no romper a quien lo esté serializando
+        metadatos[ctx_id] = {**meta, **resultado}
+        fragmentos = self._obtener_metadatos_fragmentos()
+        if ctx_id in fragmentos:
+            fragmentos[ctx_id] = {**fragmentos[ctx_id], **resultado}
+
+        with self._lock:
+            self.procesados += 1
+            self.tiempo_total_ms += (time.time() - inicio) * 1000
+        return True
+
+    def estado(self) -> Dict:
+        with self._lock:
+            return {
+                "pendientes": self._cola.qsize(),
+                "procesados": self.procesados,
+                "errores": self.errores,
+                "ultimo_error": self.ultimo_error,
+                "tiempo_promedio_ms": round(self.tiempo_total_ms / self.procesados, 2) if self.procesados else 0,
+                "activo": self._hilo is not None and self._hilo.is_alive()
+            }
+
+    def _iniciar_hilo(self):
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._hilo = threading.Thread(target=self._bucle, name="resumenes", daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        resumidos = []
+        while True:
+            ctx_id = self._cola.get()
+            try:
+                if self.resumir(ctx_id):
+                    resumidos.append(ctx_id)
+            except Exception as e:
+                print(f" Error resumiendo contexto {ctx_id}: {e}")
+                traceback.print_exc()
+                with self._lock:
+                    self.errores += 1
+                    self.ultimo_error = str(e)
+            finally:
+                self._cola.task_done()
+
+            if resumidos and self._cola.empty():
+                try:
+                    self._guardar(resumidos)
+                    print(f" Resúmenes extractivos guardados ({len(resumidos)} contextos)")
+                except Exception as e:
+                    print(f" Error guardando resúmenes: {e}")
+                resumidos = []
+
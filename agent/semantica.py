@@ -1,8 +1,11 @@
 # agent/semantica.py 
 import chromadb
 from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
+import threading
 import traceback
+import numpy as np
+from agent.utils import timestamp_a_epoch
 
 # Cliente y colección únicos
 client = chromadb.PersistentClient(path="./chroma_db")
@@ -25,12 +28,177 @@ coleccion = client.get_or_create_collection(
 # CACHÉ PARA EVITAR RECÁLCULOS
 _embedding_cache = {}
 
-def indexar_documento(id: str, texto: str):
+
+class MatrizEmbeddings:
+    """
+    Copia en memoria de los embeddings indexados (normalizados) más una columna
+    de timestamps epoch. Permite puntuar TODOS los nodos en una sola pasada
+    vectorizada: coseno(consulta, nodo) × máscara/decaimiento temporal.
+    Se carga de forma perezosa desde ChromaDB y luego se mantiene al indexar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fuente_timestamps: Optional[Callable[[str], Optional[str]]] = None
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.ids: List[str] = []
+            self.posiciones: Dict[str, int] = {}
+            self.vectores = np.zeros((0, 0), dtype=np.float32)
+            self.epochs = np.zeros(0, dtype=np.float64)
+            self.cargada = False
+
+    def asegurar_cargada(self):
+        if self.cargada:
+            return
+        with self._lock:
+            if self.cargada:
+                return
+            datos = coleccion.get(include=['embeddings', 'metadatas'])
+            ids = list(datos.get('ids') or [])
+            embeddings = datos.get('embeddings')
+            metadatas = datos.get('metadatas') or [{}] * len(ids)
+
+            self.ids = []
+            self.posiciones = {}
+            self.vectores = np.zeros((0, 0), dtype=np.float32)
+            self.epochs = np.zeros(0, dtype=np.float64)
+            if ids and embeddings is not None and len(embeddings) == len(ids):
+                timestamps = [(meta or {}).get('timestamp') for meta in metadatas]
+                self._agregar_sin_lock(ids, np.asarray(embeddings, dtype=np.float32), timestamps)
+            self.cargada = True
+            print(f" Matriz de embeddings en memoria: {len(self.ids)} documentos")
+
+    def agregar(self, ids: List[str], embeddings, timestamps: List[Optional[str]] = None):
+        """Inserta o actualiza filas (solo si la matriz ya fue cargada)."""
+        if not self.cargada or not ids:
+            return
+        with self._lock:
+            self._agregar_sin_lock(ids, np.asarray(embeddings, dtype=np.float32), timestamps)
+
+    def eliminar(self, ids: List[str]):
+        if not self.cargada:
+            return
+        with self._lock:
+            filas = [self.posiciones[i] for i in ids if i in self.posiciones]
+            if not filas:
+                return
+            conservar = np.ones(len(self.ids), dtype=bool)
+            conservar[filas] = False
+            self.ids = [i for i, c in zip(self.ids, conservar) if c]
+            self.posiciones = {i: pos for pos, i in enumerate(self.ids)}
+            self.vectores = self.vectores[conservar]
+            self.epochs = self.epochs[conservar]
+
+    def buscar_top_k(self, embedding_consulta, k: int, inicio_epoch: float = None, fin_epoch: float = None,
+                     decaimiento_dias: float = None, factor_minimo: float = 0.1,
+                     ids_restringidos: List[str] = None) -> Dict:
+        """
+        Top-k por coseno × máscara temporal en una sola pasada.
+        Sin decaimiento_dias: solo cuentan los nodos dentro de [inicio, fin].
+        Con decaimiento_dias: los nodos fuera de la ventana se atenúan por
+        exp(-distancia/decaimiento) (los nodos sin fecha usan factor_minimo).
+        ids_restringidos limita el cálculo a esas filas (p. ej. los nodos de la
+        ventana resueltos por el índice temporal).
+        """
+        self.asegurar_cargada()
+        with self._lock:
+            vectores, epochs, ids = self.vectores, self.epochs, list(self.ids)
+            if ids_restringidos is not None:
+                filas = np.fromiter((self.posiciones[i] for i in ids_restringidos if i in self.posiciones),
+                                    dtype=np.int64)
+                vectores, epochs = vectores[filas], epochs[filas]
+                ids = [ids[f] for f in filas]
+
+        if not ids or k <= 0:
+            return {"resultados": [], "en_ventana": 0, "total": len(ids)}
+
+        consulta = np.asarray(embedding_consulta, dtype=np.float32)
+        norma = np.linalg.norm(consulta)
+        if norma > 0:
+            consulta = consulta / norma
+        similitudes = vectores @ consulta
+
+        if inicio_epoch is None or fin_epoch is None:
+            factor = np.ones(len(ids), dtype=np.float64)
+            en_ventana = len(ids)
+        else:
+            with np.errstate(invalid='ignore'):
+                mascara = (epochs >= inicio_epoch) & (epochs <= fin_epoch)
+            en_ventana = int(mascara.sum())
+            if decaimiento_dias:
+                distancia = np.where(epochs < inicio_epoch, inicio_epoch - epochs,
+                                     np.where(epochs > fin_epoch, epochs - fin_epoch, 0.0))
+                factor = np.exp(-distancia / (decaimiento_dias * 86400.0))
+                factor = np.where(np.isnan(epochs), factor_minimo, np.maximum(factor, factor_minimo))
+            else:
+                factor = mascara.astype(np.float64)
+
+        puntajes = np.where(factor > 0, similitudes * factor, -np.inf)
+        validos = int(np.isfinite(puntajes).sum())
+        k_efectivo = min(k, validos)
+        if k_efectivo == 0:
+            return {"resultados": [], "en_ventana": en_ventana, "total": len(ids)}
+
+        mejores = np.argpartition(-puntajes, k_efectivo - 1)[:k_efectivo]
+        mejores = mejores[np.argsort(-puntajes[mejores])]
+        return {
+            "resultados": [(ids[i], float(puntajes[i])) for i in mejores],
+            "en_ventana": en_ventana,
+            "total": len(ids)
+        }
+
+    def _agregar_sin_lock(self, ids: List[str], embeddings: np.ndarray, timestamps: List[Optional[str]] = None):
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        normas = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(normas > 0, normas, 1.0)
+
+        if timestamps is None:
+            timestamps = [None] * len(ids)
+        epochs = []
+        for id, timestamp in zip(ids, timestamps):
+            if self.fuente_timestamps:
+                timestamp = self.fuente_timestamps(id) or timestamp
+            epoch = timestamp_a_epoch(timestamp)
+            epochs.append(np.nan if epoch is None else epoch)
+
+        if self.vectores.size == 0:
+            self.vectores = np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+
+        nuevos_ids, nuevas_filas, nuevos_epochs = [], [], []
+        for id, vector, epoch in zip(ids, embeddings, epochs):
+            pos = self.posiciones.get(id)
+            if pos is None:
+                self.posiciones[id] = len(self.ids) + len(nuevos_ids)
+                nuevos_ids.append(id)
+                nuevas_filas.append(vector)
+                nuevos_epochs.append(epoch)
+            elif pos < len(self.ids):
+                self.vectores[pos] = vector
+                self.epochs[pos] = epoch
+            else:
+                # Repetido dentro del mismo lote: prevalece la última versión
+                nuevas_filas[pos - len(self.ids)] = vector
+                nuevos_epochs[pos - len(self.ids)] = epoch
+        if nuevos_ids:
+            self.ids.extend(nuevos_ids)
+            self.vectores = np.vstack([self.vectores, np.asarray(nuevas_filas, dtype=np.float32)])
+            self.epochs = np.concatenate([self.epochs, np.asarray(nuevos_epochs, dtype=np.float64)])
+
+matriz_embeddings = MatrizEmbeddings()
+
+def indexar_documento(id: str, texto: str, metadata: Dict = None):
     """Indexa un documento para búsqueda semántica."""
     try:
         # Generar embedding explícitamente
         embedding = modelo_embeddings.encode([texto])[0]
         
+        # ChromaDB no acepta valores None en metadatos
+        metadata = {clave: valor for clave, valor in (metadata or {}).items() if valor is not None} or None
+        
         # Verificar si el documento ya existe
         existing = coleccion.get(ids=[id])
         if existing['ids']:
@@ -38,18 +206,21 @@ def indexar_documento(id: str, texto: str):
             coleccion.update(
                 documents=[texto], 
                 ids=[id],
-                embeddings=[embedding.tolist()]  # PASAR EMBEDDING
+                embeddings=[embedding.tolist()],  # PASAR EMBEDDING
+                metadatas=[metadata] if metadata else None
             )
         else:
             # Si no existe, agregar
             coleccion.add(
                 documents=[texto], 
                 ids=[id],
-                embeddings=[embedding.tolist()]  # PASAR EMBEDDING
+                embeddings=[embedding.tolist()],  # PASAR EMBEDDING
+                metadatas=[metadata] if metadata else None
             )
         
         # Guardar en caché
         _embedding_cache[id] = texto
+        matriz_embeddings.agregar([id], [embedding], [(metadata or {}).get('timestamp')])
         
     except Exception as e:
         print(f"Error indexando documento {id}: {e}")
@@ -106,6 +277,8 @@ def indexar_documentos_batch(ids: List[str], textos: List[str], metadatas: List[
                 embeddings=embeddings_nuevos.tolist(),
                 metadatas=metadatas_nuevos  # PASAR METADATOS
             )
+            matriz_embeddings.agregar(ids_nuevos, embeddings_nuevos,
+                                      [m.get('timestamp') for m in metadatas_nuevos])
             print(f" Indexados {len(ids_nuevos)} documentos nuevos en batch")
         
         # Generar embeddings para actualizaciones
@@ -119,6 +292,8 @@ def indexar_documentos_batch(ids: List[str], textos: List[str], metadatas: List[
                 embeddings=embeddings_actualizar.tolist(),
                 metadatas=metadatas_actualizar  # ✅ PASAR METADATOS
             )
+            matriz_embeddings.agregar(ids_actualizar, embeddings_actualizar,
+                                      [m.get('timestamp') for m in metadatas_actualizar])
             print(f" Actualizados {len(ids_actualizar)} documentos en batch")
         
         #  Asegurar que ChromaDB persista los cambios
@@ -145,12 +320,13 @@ def indexar_documentos_batch(ids: List[str], textos: List[str], metadatas: List[
             except Exception as e2:
                 print(f" Error indexando {id}: {e2}")
 
-def buscar_similares(texto_consulta: str, k: int = 3):
-    """Busca documentos semánticamente similares CON embedding explícito."""
+def buscar_similares(texto_consulta: str, k: int = 3, embedding_consulta=None):
+    """Busca documentos semánticamente similares CON embedding explícito (reutilizable)."""
     try:
         # GENERAR EMBEDDING EXACTAMENTE COMO RAG
         print(f" Buscando similares para: '{texto_consulta[:50]}...'")
-        embedding_consulta = modelo_embeddings.encode(texto_consulta)  # SIN LISTA, SIN [0]
+        if embedding_consulta is None:
+            embedding_consulta = modelo_embeddings.encode(texto_consulta)  # SIN LISTA, SIN [0]
         print(f" Embedding generado: shape={embedding_consulta.shape}")
         
         # BUSCAR usando embedding explícito
@@ -177,6 +353,61 @@ def buscar_similares(texto_consulta: str, k: int = 3):
         traceback.print_exc()
         return []
 
+def buscar_similares_batch(textos_consulta: List[str], k: int = 3, embeddings_consulta=None) -> List[List[str]]:
+    """
+    Varias consultas en una sola llamada al modelo (encode de la lista) y una sola
+    consulta al índice vectorial. Devuelve los IDs similares de cada texto, en orden.
+    """
+    if not textos_consulta:
+        return []
+    if embeddings_consulta is None:
+        embeddings_consulta = modelo_embeddings.encode(textos_consulta, show_progress_bar=False)
+
+    resultado = coleccion.query(
+        query_embeddings=[np.asarray(embedding).tolist() for embedding in embeddings_consulta],
+        n_results=k
+    )
+    ids_por_consulta = (resultado or {}).get("ids") or []
+    print(f" Búsqueda batch: {len(textos_consulta)} consultas en una llamada al índice")
+    return [list(ids_por_consulta[i]) if i < len(ids_por_consulta) else [] for i in range(len(textos_consulta))]
+
+def buscar_similares_en_ventana(texto_consulta: str, k: int, ventana_inicio: str, ventana_fin: str,
+                                decaimiento_dias: float = 30.0, ids_en_ventana: List[str] = None,
+                                embedding_consulta=None) -> Dict:
+    """
+    Recuperación temporal en una sola pasada vectorizada sobre la matriz en memoria.
+    Devuelve el top-k real dentro de la ventana; si la ventana no contiene nodos,
+    el mismo cálculo se relaja con decaimiento por distancia a la ventana.
+    Si se pasan ids_en_ventana (índice temporal) solo se puntúan esas filas.
+    """
+    inicio_epoch = timestamp_a_epoch(ventana_inicio)
+    fin_epoch = timestamp_a_epoch(ventana_fin)
+    if embedding_consulta is None:
+        embedding_consulta = modelo_embeddings.encode(texto_consulta)
+
+    resultado = matriz_embeddings.buscar_top_k(embedding_consulta, k, inicio_epoch, fin_epoch,
+                                               ids_restringidos=ids_en_ventana)
+    if ids_en_ventana is not None:
+        resultado["total"] = len(matriz_embeddings.ids)
+    modo = "ventana"
+    if not resultado["resultados"]:
+        resultado = matriz_embeddings.buscar_top_k(embedding_consulta, k, inicio_epoch, fin_epoch,
+                                                   decaimiento_dias=decaimiento_dias)
+        modo = "decaimiento"
+
+    return {
+        "ids": [id for id, _ in resultado["resultados"]],
+        "puntajes": {id: round(puntaje, 4) for id, puntaje in resultado["resultados"]},
+        "en_ventana": resultado["en_ventana"],
+        "total_indexados": resultado["total"],
+        "modo": modo
+    }
+
+def eliminar_documentos(ids: List[str]):
+    """Elimina documentos de ChromaDB y de la matriz en memoria."""
+    coleccion.delete(ids=ids)
+    matriz_embeddings.eliminar(ids)
+
 # SIMILITUD BATCH
 def calcular_similitudes_batch(texto_nuevo: str, nodos_existentes: List[str]) -> Dict[str, float]:
     """
@@ -279,6 +510,7 @@ def reiniciar_coleccion():
         
         # Limpiar caché
         _embedding_cache = {}
+        matriz_embeddings.reiniciar()
         print(" Caché de embeddings limpiado")
         
         # Verificar estado
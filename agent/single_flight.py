@@ -0,0 +1,100 @@
+# agent/single_flight.py
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class _LlamadaEnVuelo:
+    """Llamada síncrona en curso: los que esperan se bloquean en el evento."""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Deduplica llamadas idénticas en vuelo: la primera con una clave ejecuta la
+    función y las concurrentes con la misma clave esperan y reciben su resultado
+    (o su excepción). No guarda nada una vez terminada la llamada.
+    """
+
+    def __init__(self, nombre: str = "single_flight"):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self._en_vuelo: Dict[str, _LlamadaEnVuelo] = {}
+        self._en_vuelo_async: Dict[Tuple[int, str], asyncio.Task] = {}
+
+        self.ejecuciones = 0
+        self.deduplicadas = 0
+        self.max_esperando = 0
+        self._esperando: Dict[Any, int] = {}
+
+    def ejecutar(self, clave: str, funcion: Callable[[], Any]) -> Any:
+        """Versión síncrona (hilos)."""
+        with self._lock:
+            llamada = self._en_vuelo.get(clave)
+            es_lider = llamada is None
+            if es_lider:
+                llamada = _LlamadaEnVuelo()
+                self._en_vuelo[clave] = llamada
+                self.ejecuciones += 1
+            else:
+                self._registrar_espera(clave)
+
+        if not es_lider:
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = funcion()
+            return llamada.resultado
+        except Exception as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+                self._esperando.pop(clave, None)
+            llamada.evento.set()
+
+    async def ejecutar_async(self, clave: str, fabrica: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Versión asíncrona. La llamada corre en su propia tarea: si se cancela el
+        request que la inició (cliente desconectado), los demás la siguen esperando.
+        """
+        clave_loop = (id(asyncio.get_running_loop()), clave)
+        with self._lock:
+            tarea = self._en_vuelo_async.get(clave_loop)
+            if tarea is None:
+                tarea = asyncio.ensure_future(fabrica())
+                self._en_vuelo_async[clave_loop] = tarea
+                self.ejecuciones += 1
+                tarea.add_done_callback(lambda _: self._terminar_async(clave_loop))
+            else:
+                self._registrar_espera(clave_loop)
+        return await asyncio.shield(tarea)
+
+    def _terminar_async(self, clave_loop: Tuple[int, str]):
+        with self._lock:
+            self._en_vuelo_async.pop(clave_loop, None)
+            self._esperando.pop(clave_loop, None)
+
+    def _registrar_espera(self, clave):
+        self.deduplicadas += 1
+        self._esperando[clave] = self._esperando.get(clave, 0) + 1
+        self.max_esperando = max(self.max_esperando, self._esperando[clave])
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            total = self.ejecuciones + self.deduplicadas
+            return {
+                "ejecuciones": self.ejecuciones,
+                "deduplicadas": self.deduplicadas,
+                "en_vuelo": len(self._en_vuelo) + len(self._en_vuelo_async),
+                "max_esperando_misma_clave": self.max_esperando,
+                "tasa_deduplicacion": round(self.deduplicadas / total, 3) if total else 0.0
+            }
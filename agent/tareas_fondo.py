@@ -0,0 +1,145 @@
+# agent/tareas_fondo.py
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Tuple, TypeVar
+import networkx as nx
+
+T = TypeVar("T")
+
+
+def reintentar_si_cambia(copiar: Callable[[], T], descripcion: str = "el grafo", reintentos: int = 5) -> T:
+    """
+    Ejecuta `copiar` (una copia o serialización que recorre estructuras compartidas
+    con la ingesta) y la reintenta si la ingesta las modifica mientras tanto.
+    """
+    for intento in range(reintentos):
+        try:
+            return copiar()
+        except RuntimeError:
+            # "dictionary changed size during iteration": la ingesta está escribiendo
+            time.sleep(0.05 * (intento + 1))
+    raise RuntimeError(f"No se pudo copiar {descripcion}: cambió durante todos los reintentos")
+
+
+def copiar_grafo_seguro(grafo: nx.DiGraph, atributos: Iterable[str] = ('peso_efectivo',),
+                        reintentos: int = 5) -> nx.DiGraph:
+    """
+    Copia liviana del grafo (nodos + aristas con los atributos pedidos) para
+    calcular en un hilo de fondo sin chocar con la ingesta concurrente.
+    Si el grafo cambia mientras se copia, se reintenta.
+    """
+    atributos = tuple(atributos)
+
+    def copiar() -> nx.DiGraph:
+        copia = nx.DiGraph()
+        copia.add_nodes_from(list(grafo.nodes()))
+        copia.add_edges_from([
+            (origen, destino, {clave: datos.get(clave, 0) for clave in atributos})
+            for origen, destino, datos in list(grafo.edges(data=True))
+        ])
+        return copia
+
+    return reintentar_si_cambia(copiar, reintentos=reintentos)
+
+
+class RefrescoEnSegundoPlano:
+    """
+    Resultado derivado del grafo que se recalcula en un hilo de fondo cuando
+    cambia la versión del grafo y se sirve siempre desde caché.
+    Las subclases implementan calcular().
+    """
+    nombre = "refresco"
+
+    def __init__(self, obtener_grafo: Callable[[], nx.DiGraph], obtener_version: Callable[[], int],
+                 espera_agrupacion_s: float = 1.0):
+        self._obtener_grafo = obtener_grafo
+        self._obtener_version = obtener_version
+        self.espera_agrupacion_s = espera_agrupacion_s  # Agrupa ráfagas de cambios de la ingesta
+
+        self._resultado = None
+        self._version_resultado = -1
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._hilo = None
+
+        self.calculando = False
+        self.ultimo_error = None
+        self.duracion_ms = 0.0
+        self.calculado_en = None
+
+    def notificar_cambio(self, version: int = None):
+        """Oyente de cambios del grafo: agenda un recálculo en segundo plano."""
+        self._iniciar_hilo()
+        self._evento.set()
+
+    def obtener(self) -> Tuple[Optional[object], int]:
+        """Devuelve (resultado_en_cache, version_del_resultado). Nunca bloquea."""
+        with self._lock:
+            return self._resultado, self._version_resultado
+
+    def estado(self) -> Dict:
+        version_actual = self._obtener_version()
+        with self._lock:
+            version_resultado = self._version_resultado
+        if self.calculando:
+            estado = "calculando"
+        elif version_resultado == version_actual:
+            estado = "actualizado"
+        elif version_resultado < 0:
+            estado = "sin_calcular"
+        else:
+            estado = "desactualizado"
+        return {
+            "estado": estado,
+            "version_grafo": version_actual,
+            "version_calculada": version_resultado,
+            "duracion_ms": round(self.duracion_ms, 2),
+            "calculado_en": self.calculado_en,
+            "ultimo_error": self.ultimo_error
+        }
+
+    def calcular(self, grafo: nx.DiGraph):
+        raise NotImplementedError
+
+    def recalcular_ahora(self):
+        """Recalcula de forma síncrona (útil para scripts y pruebas)."""
+        version = self._obtener_version()
+        self._ejecutar_calculo(version)
+
+    def _iniciar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._hilo = threading.Thread(target=self._bucle, name=f"refresco-{self.nombre}", daemon=True)
+        self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            self._evento.wait()
+            time.sleep(self.espera_agrupacion_s)
+            self._evento.clear()
+
+            version = self._obtener_version()
+            with self._lock:
+                if version == self._version_resultado:
+                    continue
+            self._ejecutar_calculo(version)
+
+    def _ejecutar_calculo(self, version: int):
+        self.calculando = True
+        inicio = time.time()
+        try:
+            resultado = self.calcular(self._obtener_grafo())
+            with self._lock:
+                self._resultado = resultado
+                self._version_resultado = version
+            self.ultimo_error = None
+            self.calculado_en = datetime.now().isoformat()
+        except Exception as e:
+            print(f" Error en refresco de fondo '{self.nombre}': {e}")
+            traceback.print_exc()
+            self.ultimo_error = str(e)
+        finally:
+            self.duracion_ms = (time.time() - inicio) * 1000
+            self.calculando = False
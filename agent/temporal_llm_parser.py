@@ -2,17 +2,25 @@
 import json
 import re
 import os
+import asyncio
 from datetime import datetime
 from typing import Dict, Optional
-import google.generativeai as genai
+from agent.temporal_parser import analizar_intencion_por_reglas
+from agent.cache_temporal import cache_temporal
+from agent.proveedor_llm import proveedor_llm
+from agent.plazo import PlazoConsulta
 
-# Configurar Gemini con API key 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
+if proveedor_llm.requiere_api_key and not GEMINI_API_KEY:
     print("⚠️ ADVERTENCIA: GEMINI_API_KEY no encontrada, el parser temporal fallará.")
-else:
-    genai.configure(api_key=GEMINI_API_KEY)
+
+CONFIGURACION_GENERACION = {
+    'temperature': 0.1,  # Baja temperatura para respuestas consistentes
+    'top_p': 0.8,
+    'top_k': 40,
+    'max_output_tokens': 500,
+}
 
 
 def analizar_temporalidad_con_llm(
@@ -21,7 +29,7 @@ def analizar_temporalidad_con_llm(
     factor_base: float = 1.5
 ) -> Dict:
     """
-    Analiza temporalidad usando Google Gemini
+    Analiza temporalidad usando el proveedor LLM configurado (Gemini por defecto)
         pregunta: Pregunta del usuario
         momento_consulta: Momento de la consulta (default: ahora)
         factor_base: Factor de refuerzo base configurado
@@ -33,11 +41,12 @@ def analizar_temporalidad_con_llm(
         # 1. Construir prompt
         prompt = _construir_prompt(pregunta, momento_consulta)
         
-        # 2. Llamar a Gemini
-        respuesta_texto = _llamar_gemini(prompt)
+        # 2. Llamar al LLM
+        respuesta_texto = _llamar_llm(prompt)
         
         # 3. Parsear y validar respuesta
         resultado = _parsear_respuesta(respuesta_texto, factor_base, momento_consulta)
+        resultado['fuente_analisis'] = 'llm'
         
         return resultado
         
@@ -47,6 +56,131 @@ def analizar_temporalidad_con_llm(
         return _crear_resultado_fallback(factor_base, momento_consulta, str(e))
 
 
+# Confianza mínima de las reglas locales para evitar la llamada al LLM
+UMBRAL_CONFIANZA_REGLAS = 0.8
+
+
+def analizar_temporalidad_hibrida(
+    pregunta: str,
+    momento_consulta: Optional[datetime] = None,
+    factor_base: float = 1.5,
+    umbral_confianza: float = UMBRAL_CONFIANZA_REGLAS
+) -> Dict:
+    """
+    Analiza temporalidad primero con reglas locales (temporal_parser); si la
+    pregunta es ambigua busca en el caché persistente y solo entonces llama a Gemini.
+    El resultado indica en 'fuente_analisis' si vino de 'reglas', 'llm' o 'fallback'.
+    """
+    if momento_consulta is None:
+        momento_consulta = datetime.now()
+    
+    resultado = _analizar_sin_llm(pregunta, momento_consulta, factor_base, umbral_confianza)
+    if resultado is not None:
+        return resultado
+    
+    # Circuito abierto: fallar rápido al parser local / fallback en vez de esperar al LLM
+    if not proveedor_llm.circuito.disponible():
+        return _analizar_solo_reglas(pregunta, momento_consulta, factor_base)
+    
+    resultado = analizar_temporalidad_con_llm(pregunta, momento_consulta, factor_base)
+    _guardar_en_cache(pregunta, momento_consulta, resultado)
+    return resultado
+
+
+async def analizar_temporalidad_hibrida_async(
+    pregunta: str,
+    momento_consulta: Optional[datetime] = None,
+    factor_base: float = 1.5,
+    umbral_confianza: float = UMBRAL_CONFIANZA_REGLAS,
+    plazo: Optional[PlazoConsulta] = None
+) -> Dict:
+    """
+    Versión asíncrona de analizar_temporalidad_hibrida (no bloquea un hilo durante el LLM).
+    Con `plazo`, si no alcanza el tiempo para el LLM (o no responde a tiempo) se
+    usa el resultado del parser local aunque tenga baja confianza.
+    """
+    if momento_consulta is None:
+        momento_consulta = datetime.now()
+    plazo = plazo or PlazoConsulta.sin_limite()
+    
+    resultado = _analizar_sin_llm(pregunta, momento_consulta, factor_base, umbral_confianza)
+    if resultado is not None:
+        return resultado
+    
+    if not proveedor_llm.circuito.disponible():
+        return _analizar_solo_reglas(pregunta, momento_consulta, factor_base)
+    
+    if not plazo.alcanza("analisis_temporal_llm"):
+        plazo.omitir("analisis_temporal_llm", "sin tiempo para consultar al LLM")
+        return _analizar_solo_reglas(pregunta, momento_consulta, factor_base)
+    
+    try:
+        resultado = await asyncio.wait_for(
+            analizar_temporalidad_con_llm_async(pregunta, momento_consulta, factor_base),
+            plazo.timeout_s("analisis_temporal_llm")
+        )
+    except asyncio.TimeoutError:
+        plazo.omitir("analisis_temporal_llm", "el LLM no respondió dentro del plazo")
+        return _analizar_solo_reglas(pregunta, momento_consulta, factor_base)
+    _guardar_en_cache(pregunta, momento_consulta, resultado)
+    return resultado
+
+
+async def analizar_temporalidad_con_llm_async(
+    pregunta: str,
+    momento_consulta: Optional[datetime] = None,
+    factor_base: float = 1.5
+) -> Dict:
+    """Igual que analizar_temporalidad_con_llm pero sin bloquear el hilo durante la llamada."""
+    if momento_consulta is None:
+        momento_consulta = datetime.now()
+    
+    try:
+        prompt = _construir_prompt(pregunta, momento_consulta)
+        respuesta_texto = await proveedor_llm.generar_async(prompt, CONFIGURACION_GENERACION)
+        resultado = _parsear_respuesta(respuesta_texto, factor_base, momento_consulta)
+        resultado['fuente_analisis'] = 'llm'
+        return resultado
+    except Exception as e:
+        print(f" Error en análisis temporal LLM: {e}")
+        return _crear_resultado_fallback(factor_base, momento_consulta, str(e))
+
+
+def _analizar_sin_llm(pregunta: str, momento_consulta: datetime, factor_base: float,
+                      umbral_confianza: float) -> Optional[Dict]:
+    """Reglas locales y luego caché. Devuelve None si hace falta consultar al LLM."""
+    datos_reglas = analizar_intencion_por_reglas(pregunta, momento_consulta)
+    if datos_reglas and datos_reglas.get('confianza', 0) >= umbral_confianza:
+        resultado = _construir_resultado(datos_reglas, factor_base, momento_consulta)
+        resultado['fuente_analisis'] = 'reglas'
+        return resultado
+    
+    resultado = cache_temporal.obtener(pregunta, momento_consulta)
+    if resultado is not None:
+        print(" Análisis temporal recuperado del caché")
+        resultado['factor_refuerzo_temporal'] = factor_base
+        return resultado
+    
+    print(" Pregunta ambigua para las reglas locales, consultando LLM...")
+    return None
+
+
+def _analizar_solo_reglas(pregunta: str, momento_consulta: datetime, factor_base: float) -> Dict:
+    """Resultado del parser local sin umbral de confianza (degradación por plazo o circuito abierto)."""
+    datos_reglas = analizar_intencion_por_reglas(pregunta, momento_consulta)
+    if not datos_reglas:
+        return _crear_resultado_fallback(factor_base, momento_consulta, "LLM no disponible o sin tiempo")
+    resultado = _construir_resultado(datos_reglas, factor_base, momento_consulta)
+    resultado['fuente_analisis'] = 'reglas_por_plazo'
+    return resultado
+
+
+def _guardar_en_cache(pregunta: str, momento_consulta: datetime, resultado: Dict):
+    # Los fallbacks por error no se cachean: el próximo intento debe volver a consultar
+    if resultado.get('fuente_analisis') == 'llm':
+        cache_temporal.guardar(pregunta, momento_consulta, resultado)
+
+
 def _construir_prompt(pregunta: str, momento: datetime) -> str:
     """Construye prompt  para Gemini"""
     
@@ -148,27 +282,12 @@ Responde ÚNICAMENTE con un JSON válido en este formato:
 RESPONDE AHORA:"""
 
 
-def _llamar_gemini(prompt: str) -> str:
-    """Llama a Google Gemini con configuración """
+def _llamar_llm(prompt: str) -> str:
+    """Llama al proveedor LLM configurado"""
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        generation_config = {
-            'temperature': 0.1,  # Baja temperatura para respuestas consistentes
-            'top_p': 0.8,
-            'top_k': 40,
-            'max_output_tokens': 500,
-        }
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config
-        )
-        
-        return response.text
-        
+        return proveedor_llm.generar(prompt, CONFIGURACION_GENERACION)
     except Exception as e:
-        raise Exception(f"Error llamando a Gemini: {str(e)}")
+        raise Exception(f"Error llamando al LLM: {str(e)}")
 
 
 def _parsear_respuesta(respuesta: str, factor_base: float, momento: datetime) -> Dict:
@@ -195,63 +314,7 @@ def _parsear_respuesta(respuesta: str, factor_base: float, momento: datetime) ->
         # Parsear JSON
         datos = json.loads(respuesta_limpia)
         
-        # Validar estructura
-        es_temporal = datos.get('es_temporal', False)
-        confianza = float(datos.get('confianza', 0.5))
-        
-        #  CLASIFICAR INTENCIÓN SEGÚN ESTÁNDARES DEL SISTEMA
-        if es_temporal:
-            # Detectar si es MIXTA (temporal + semántica)
-            # Si confianza baja, probablemente tiene componentes mixtos
-            if confianza < 0.8:
-                intencion = 'MIXTA'
-            else:
-                intencion = 'TEMPORAL'
-            
-            # Factor de refuerzo: mantener base (se amplifica en fórmula)
-            factor_refuerzo = factor_base
-        else:
-            # Consulta estructural/semántica pura
-            intencion = 'ESTRUCTURAL'
-            factor_refuerzo = factor_base
-        
-        # Logging para debugging
-        print(f"\n LLM ANÁLISIS COMPLETO:")
-        print(f"   ├─ es_temporal: {es_temporal}")
-        print(f"   ├─ intencion: '{intencion}'")
-        print(f"   ├─ confianza: {confianza:.2f}")
-        print(f"   ├─ factor_refuerzo: {factor_refuerzo}")
-        if es_temporal:
-            print(f"   ├─ ventana_temporal: {datos.get('ventana_inicio')} → {datos.get('ventana_fin')}")
-        else:
-            print(f"   ├─ ventana_temporal: NO (consulta estructural)")
-        print(f"   └─ explicacion: {datos.get('explicacion', 'N/A')[:80]}...")  
-              
-        # Construir resultado
-        resultado = {
-            'es_temporal': es_temporal,
-            'intencion_temporal': intencion,  # ← AHORA ES "TEMPORAL", "ESTRUCTURAL" o "MIXTA"
-            'confianza': confianza,
-            'factor_refuerzo_temporal': factor_refuerzo,
-            'momento_consulta': momento.isoformat(),
-            'explicacion': datos.get('explicacion', 'Sin explicación'),
-        }
-        
-        # Agregar ventana temporal si existe
-        if es_temporal:
-            ventana_inicio = datos.get('ventana_inicio')
-            ventana_fin = datos.get('ventana_fin')
-            
-            resultado['ventana_temporal'] = {
-                'inicio': ventana_inicio,
-                'fin': ventana_fin
-            }
-            resultado['timestamp_referencia'] = ventana_inicio
-        else:
-            resultado['ventana_temporal'] = None
-            resultado['timestamp_referencia'] = None
-        
-        return resultado
+        return _construir_resultado(datos, factor_base, momento)
         
     except json.JSONDecodeError as e:
         print(f" Error parseando JSON del LLM: {e}")
@@ -261,6 +324,67 @@ def _parsear_respuesta(respuesta: str, factor_base: float, momento: datetime) ->
         raise Exception(f"Error procesando respuesta: {str(e)}")
 
 
+def _construir_resultado(datos: Dict, factor_base: float, momento: datetime) -> Dict:
+    """Construye el resultado estándar a partir del JSON del LLM o de las reglas locales"""
+    # Validar estructura
+    es_temporal = datos.get('es_temporal', False)
+    confianza = float(datos.get('confianza', 0.5))
+
+    #  CLASIFICAR INTENCIÓN SEGÚN ESTÁNDARES DEL SISTEMA
+    if es_temporal:
+        # Detectar si es MIXTA (temporal + semántica)
+        # Si confianza baja, probablemente tiene componentes mixtos
+        if confianza < 0.8:
+            intencion = 'MIXTA'
+        else:
+            intencion = 'TEMPORAL'
+
+        # Factor de refuerzo: mantener base (se amplifica en fórmula)
+        factor_refuerzo = factor_base
+    else:
+        # Consulta estructural/semántica pura
+        intencion = 'ESTRUCTURAL'
+        factor_refuerzo = factor_base
+
+    # Logging para debugging
+    print(f"\n ANÁLISIS TEMPORAL COMPLETO:")
+    print(f"   ├─ es_temporal: {es_temporal}")
+    print(f"   ├─ intencion: '{intencion}'")
+    print(f"   ├─ confianza: {confianza:.2f}")
+    print(f"   ├─ factor_refuerzo: {factor_refuerzo}")
+    if es_temporal:
+        print(f"   ├─ ventana_temporal: {datos.get('ventana_inicio')} → {datos.get('ventana_fin')}")
+    else:
+        print(f"   ├─ ventana_temporal: NO (consulta estructural)")
+    print(f"   └─ explicacion: {datos.get('explicacion', 'N/A')[:80]}...")  
+
+    # Construir resultado
+    resultado = {
+        'es_temporal': es_temporal,
+        'intencion_temporal': intencion,  # ← AHORA ES "TEMPORAL", "ESTRUCTURAL" o "MIXTA"
+        'confianza': confianza,
+        'factor_refuerzo_temporal': factor_refuerzo,
+        'momento_consulta': momento.isoformat(),
+        'explicacion': datos.get('explicacion', 'Sin explicación'),
+    }
+
+    # Agregar ventana temporal si existe
+    if es_temporal:
+        ventana_inicio = datos.get('ventana_inicio')
+        ventana_fin = datos.get('ventana_fin')
+
+        resultado['ventana_temporal'] = {
+            'inicio': ventana_inicio,
+            'fin': ventana_fin
+        }
+        resultado['timestamp_referencia'] = ventana_inicio
+    else:
+        resultado['ventana_temporal'] = None
+        resultado['timestamp_referencia'] = None
+
+    return resultado
+
+
 def _crear_resultado_fallback(factor_base: float, momento: datetime, error_msg: str) -> Dict:
     """Crea resultado seguro en caso de error"""
     return {
@@ -271,5 +395,6 @@ def _crear_resultado_fallback(factor_base: float, momento: datetime, error_msg:
         'momento_consulta': momento.isoformat(),
         'explicacion': f'Error en análisis: {error_msg}',
         'ventana_temporal': None,
-        'timestamp_referencia': None
+        'timestamp_referencia': None,
+        'fuente_analisis': 'fallback'
     }
\ No newline at end of file
@@ -1,7 +1,7 @@
 # agent/temporal_parser.py 
 from datetime import datetime, timedelta
 import re
-from typing import Optional, Tuple, List
+from typing import Dict, Optional, Tuple, List
 from agent.utils import parse_iso_datetime_safe
 
 def parsear_referencia_temporal(texto_referencia: str, fecha_base: Optional[datetime] = None) -> Tuple[Optional[str], str]:
@@ -277,4 +277,186 @@ def detectar_palabras_temporales_simples(texto: str) -> List[str]:
             if palabra not in ' '.join(palabras_temporales_encontradas):  # Evitar duplicados
                 palabras_temporales_encontradas.append(palabra)
     
-    return palabras_temporales_encontradas
\ No newline at end of file
+    return palabras_temporales_encontradas
+
+# ANÁLISIS DE INTENCIÓN TEMPORAL POR REGLAS (camino rápido antes del LLM)
+
+_MESES = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6, 'julio': 7,
+    'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12
+}
+_DIAS_SEMANA = {
+    'lunes': 0, 'martes': 1, 'miércoles': 2, 'miercoles': 2, 'jueves': 3,
+    'viernes': 4, 'sábado': 5, 'sabado': 5, 'domingo': 6
+}
+_PATRON_MESES = '|'.join(_MESES.keys())
+_PATRON_DIAS = '|'.join(_DIAS_SEMANA.keys())
+
+# Pistas temporales que las reglas no resuelven con certeza: se delegan al LLM
+_PISTAS_AMBIGUAS = re.compile(
+    r'\b(cu[aá]ndo|programad[oa]s?|agenda|agendad[oa]s?|pendientes?|recientes?|recientemente|'
+    r'[uú]ltim[oa]s?|pr[oó]xim[oa]s?|fecha|fechas|plazos?|vence|vencimientos?|antes|despu[eé]s|durante|'
+    r'semanas?|mes|meses|años?|d[ií]as?|hora|horas|noche|tarde|temprano|'
+    + _PATRON_DIAS + r'|' + _PATRON_MESES + r'|\d{1,2}[/\-]\d{1,2}|\d{4})\b'
+)
+
+
+def _inicio_dia(fecha: datetime) -> datetime:
+    return fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _fin_dia(fecha: datetime) -> datetime:
+    return fecha.replace(hour=23, minute=59, second=59, microsecond=0)
+
+
+def _ventana_dia(fecha: datetime) -> Tuple[datetime, datetime]:
+    return _inicio_dia(fecha), _fin_dia(fecha)
+
+
+def _ventana_semana(fecha: datetime) -> Tuple[datetime, datetime]:
+    lunes = _inicio_dia(fecha - timedelta(days=fecha.weekday()))
+    return lunes, _fin_dia(lunes + timedelta(days=6))
+
+
+def _ventana_mes(año: int, mes: int) -> Tuple[datetime, datetime]:
+    # Normalizar meses fuera de rango (p. ej. mes 0 = diciembre del año anterior)
+    año += (mes - 1) // 12
+    mes = (mes - 1) % 12 + 1
+    inicio = datetime(año, mes, 1)
+    siguiente = datetime(año + 1, 1, 1) if mes == 12 else datetime(año, mes + 1, 1)
+    return inicio, _fin_dia(siguiente - timedelta(days=1))
+
+
+def _ventana_año(año: int) -> Tuple[datetime, datetime]:
+    return datetime(año, 1, 1), datetime(año, 12, 31, 23, 59, 59)
+
+
+def _detectar_ventanas(texto: str, momento: datetime) -> Optional[List[Tuple[str, datetime, datetime]]]:
+    """
+    Aplica los detectores en orden (de lo más específico a lo más general),
+    consumiendo cada expresión reconocida del texto.
+    Devuelve None si encuentra una expresión ambigua o una fecha inválida.
+    """
+    ventanas = []
+    detectores = [
+        # Fechas exactas
+        (r'\b(\d{1,2})[/\-](\d{1,2})[/\-](\d{4})\b',
+         lambda m: _ventana_dia(datetime(int(m.group(3)), int(m.group(2)), int(m.group(1))))),
+        (r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b',
+         lambda m: _ventana_dia(datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))))),
+        (r'\b(\d{1,2}) de (' + _PATRON_MESES + r')(?: (?:de |del )?(\d{4}))?\b',
+         lambda m: _ventana_dia(datetime(int(m.group(3) or momento.year), _MESES[m.group(2)], int(m.group(1))))),
+        # Días relativos
+        (r'\bpasado mañana\b', lambda m: _ventana_dia(momento + timedelta(days=2))),
+        (r'\banteayer\b', lambda m: _ventana_dia(momento - timedelta(days=2))),
+        (r'\besta mañana\b', lambda m: _ventana_dia(momento)),
+        (r'\bayer\b', lambda m: _ventana_dia(momento - timedelta(days=1))),
+        (r'\bhoy\b', lambda m: _ventana_dia(momento)),
+        (r'\bmañana\b', lambda m: _ventana_dia(momento + timedelta(days=1))),
+        # Semanas
+        (r'\b(?:la )?semana (?:pasada|anterior)\b', lambda m: _ventana_semana(momento - timedelta(weeks=1))),
+        (r'\b(?:la |esta )?(?:pr[oó]xima semana|semana (?:que viene|pr[oó]xima))\b',
+         lambda m: _ventana_semana(momento + timedelta(weeks=1))),
+        (r'\besta semana\b', lambda m: _ventana_semana(momento)),
+        # Meses
+        (r'\b(?:el )?mes (?:pasado|anterior)\b', lambda m: _ventana_mes(momento.year, momento.month - 1)),
+        (r'\b(?:el )?(?:pr[oó]ximo mes|mes (?:que viene|pr[oó]ximo))\b',
+         lambda m: _ventana_mes(momento.year, momento.month + 1)),
+        (r'\beste mes\b', lambda m: _ventana_mes(momento.year, momento.month)),
+        (r'\b(?:en |de |durante )?(?:el mes de )?(' + _PATRON_MESES + r')(?: (?:de |del )?(\d{4}))?\b',
+         lambda m: _ventana_mes(int(m.group(2) or momento.year), _MESES[m.group(1)])),
+        # Años
+        (r'\b(?:el )?año (?:pasado|anterior)\b', lambda m: _ventana_año(momento.year - 1)),
+        (r'\b(?:el )?(?:pr[oó]ximo año|año que viene)\b', lambda m: _ventana_año(momento.year + 1)),
+        (r'\beste año\b', lambda m: _ventana_año(momento.year)),
+        (r'\b(?:en |del |durante )?(?:el )?año (\d{4})\b', lambda m: _ventana_año(int(m.group(1)))),
+        # Períodos numéricos
+        (r'\b(?:los |las )?[uú]ltim[oa]s (\d+) (d[ií]as|semanas|meses)\b',
+         lambda m: (_inicio_dia(momento - _duracion(int(m.group(1)), m.group(2))), momento)),
+        (r'\b(?:los |las )?pr[oó]xim[oa]s (\d+) (d[ií]as|semanas|meses)\b',
+         lambda m: (momento, _fin_dia(momento + _duracion(int(m.group(1)), m.group(2))))),
+        (r'\bhace (\d+) (d[ií]as?)\b',
+         lambda m: _ventana_dia(momento - timedelta(days=int(m.group(1))))),
+        (r'\bhace (\d+) (semanas?)\b',
+         lambda m: _ventana_semana(momento - timedelta(weeks=int(m.group(1))))),
+        (r'\bhace (\d+) (mes|meses)\b',
+         lambda m: _ventana_mes(momento.year, momento.month - int(m.group(1)))),
+        # Días de la semana solo con dirección explícita
+        (r'\b(?:el )?(' + _PATRON_DIAS + r') (?:pasado|anterior)\b',
+         lambda m: _ventana_dia(momento - timedelta(days=(momento.weekday() - _DIAS_SEMANA[m.group(1)]) % 7 or 7))),
+        (r'\b(?:el )?(' + _PATRON_DIAS + r') (?:pr[oó]ximo|que viene)\b',
+         lambda m: _ventana_dia(momento + timedelta(days=(_DIAS_SEMANA[m.group(1)] - momento.weekday()) % 7 or 7))),
+    ]
+
+    # "la mañana" (por/de/en/a la mañana, toda la mañana) y "media mañana" son franja horaria,
+    # no el día siguiente: sin el día explícito, que resuelva el LLM ("esta mañana" sí es hoy)
+    if re.search(r'\b(?:la|media) mañana\b', texto):
+        return None
+
+    for patron, construir_ventana in detectores:
+        for match in list(re.finditer(patron, texto)):
+            try:
+                inicio, fin = construir_ventana(match)
+            except (ValueError, KeyError, OverflowError):
+                return None
+            ventanas.append((match.group().strip(), inicio, fin))
+        texto = re.sub(patron, ' ', texto)
+
+    # Si queda alguna pista temporal sin resolver, la consulta es ambigua
+    if _PISTAS_AMBIGUAS.search(texto):
+        return None
+
+    return ventanas
+
+
+def _duracion(cantidad: int, unidad: str) -> timedelta:
+    if unidad.startswith('semana'):
+        return timedelta(weeks=cantidad)
+    if unidad.startswith('mes'):
+        return timedelta(days=cantidad * 30)  # Aproximación, igual que parsear_referencia_temporal
+    return timedelta(days=cantidad)
+
+
+def analizar_intencion_por_reglas(pregunta: str, momento: Optional[datetime] = None) -> Optional[Dict]:
+    """
+    Clasifica la intención temporal y construye la ventana localmente.
+    Devuelve un dict con el mismo formato que la respuesta JSON del LLM
+    (es_temporal, confianza, ventana_inicio, ventana_fin, explicacion),
+    o None si la pregunta es ambigua y conviene consultar al LLM.
+    """
+    if momento is None:
+        momento = datetime.now()
+
+    texto = pregunta.lower()
+    texto = re.sub(r'[¿?¡!.,;:"()]', ' ', texto)
+    texto = re.sub(r'\s+', ' ', texto).strip()
+
+    ventanas = _detectar_ventanas(texto, momento)
+    if ventanas is None:
+        return None
+
+    if not ventanas:
+        # Sin ninguna pista temporal: consulta estructural (mismo criterio conservador del LLM)
+        return {
+            "es_temporal": False,
+            "confianza": 0.9,
+            "ventana_inicio": None,
+            "ventana_fin": None,
+            "explicacion": "Reglas: sin referencias temporales, consulta estructural",
+            "expresion_detectada": None
+        }
+
+    distintas = {(inicio, fin) for _, inicio, fin in ventanas}
+    if len(distintas) > 1:
+        # Varias ventanas distintas ("ayer y la semana pasada"): dejar que decida el LLM
+        return None
+
+    expresion, inicio, fin = ventanas[0]
+    return {
+        "es_temporal": True,
+        "confianza": 0.9,
+        "ventana_inicio": inicio.strftime('%Y-%m-%dT%H:%M:%S'),
+        "ventana_fin": fin.strftime('%Y-%m-%dT%H:%M:%S'),
+        "explicacion": f"Reglas: expresión temporal '{expresion}'",
+        "expresion_detectada": expresion
+    }
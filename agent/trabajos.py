@@ -0,0 +1,96 @@
+# agent/trabajos.py
+import asyncio
+import threading
+import time
+import traceback
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+TTL_TRABAJOS_S = 3600  # Los trabajos terminados se pueden consultar durante 1 hora
+MAX_TRABAJOS = 1000
+
+
+class RegistroTrabajos:
+    """
+    Trabajos en segundo plano consultables por ID (polling).
+    Se usa para diferir la respuesta del LLM: el endpoint devuelve la recuperación
+    y el árbol enseguida, y la respuesta se consulta después en /trabajos/{id}.
+    """
+
+    def __init__(self, ttl_s: float = TTL_TRABAJOS_S, max_trabajos: int = MAX_TRABAJOS):
+        self.ttl_s = ttl_s
+        self.max_trabajos = max_trabajos
+        self._lock = threading.Lock()
+        self._trabajos: Dict[str, Dict] = {}
+        self._tareas: Dict[str, asyncio.Task] = {}  # Referencias para que el loop no descarte las tareas
+
+        self.lanzados = 0
+        self.completados = 0
+        self.fallidos = 0
+
+    def lanzar(self, fabrica: Callable[[], Awaitable[Dict]]) -> str:
+        """Programa la corrutina en el loop actual y devuelve el ID del trabajo."""
+        trabajo_id = str(uuid.uuid4())
+        with self._lock:
+            self._purgar()
+            self._trabajos[trabajo_id] = {"estado": "pendiente", "creado_en": time.time()}
+            self.lanzados += 1
+        self._tareas[trabajo_id] = asyncio.create_task(self._ejecutar(trabajo_id, fabrica))
+        return trabajo_id
+
+    async def _ejecutar(self, trabajo_id: str, fabrica: Callable[[], Awaitable[Dict]]):
+        self._actualizar(trabajo_id, estado="en_curso", iniciado_en=time.time())
+        try:
+            resultado = await fabrica()
+        except Exception as e:
+            print(f"❌ Error en trabajo {trabajo_id}: {e}")
+            traceback.print_exc()
+            self._actualizar(trabajo_id, estado="error", error=str(e), terminado_en=time.time())
+            with self._lock:
+                self.fallidos += 1
+        else:
+            self._actualizar(trabajo_id, estado="completado", resultado=resultado, terminado_en=time.time())
+            with self._lock:
+                self.completados += 1
+        finally:
+            self._tareas.pop(trabajo_id, None)
+
+    def obtener(self, trabajo_id: str) -> Optional[Dict]:
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+            if trabajo is None:
+                return None
+            trabajo = dict(trabajo)
+        fin = trabajo.get("terminado_en", time.time())
+        trabajo["duracion_ms"] = round((fin - trabajo["creado_en"]) * 1000, 2)
+        return trabajo
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            en_curso = sum(1 for t in self._trabajos.values() if t["estado"] in ("pendiente", "en_curso"))
+            return {
+                "trabajos": len(self._trabajos),
+                "en_curso": en_curso,
+                "lanzados": self.lanzados,
+                "completados": self.completados,
+                "fallidos": self.fallidos
+            }
+
+    def _actualizar(self, trabajo_id: str, **cambios):
+        with self._lock:
+            if trabajo_id in self._trabajos:
+                self._trabajos[trabajo_id].update(cambios)
+
+    def _purgar(self):
+        """Descarta trabajos terminados vencidos y, si sobran, los terminados más viejos."""
+        ahora = time.time()
+        terminados = sorted(
+            (t["terminado_en"], trabajo_id) for trabajo_id, t in self._trabajos.items() if "terminado_en" in t
+        )
+        for terminado_en, trabajo_id in terminados:
+            if ahora - terminado_en > self.ttl_s or len(self._trabajos) >= self.max_trabajos:
+                del self._trabajos[trabajo_id]
+
+
+# Instancia global
+registro_trabajos = RegistroTrabajos()
@@ -82,4 +82,22 @@ def normalizar_timestamp_para_guardar(timestamp_str: str) -> str:
         
     except Exception as e:
         print(f"⚠️ Error normalizando timestamp '{timestamp_str}': {e}")
-        return None
\ No newline at end of file
+        return None
+
+def timestamp_a_epoch(timestamp) -> Optional[float]:
+    """
+    Convierte un timestamp ISO a segundos epoch (float) para comparaciones
+    vectorizadas. Los datetime naive se interpretan como UTC de forma consistente.
+    """
+    if not timestamp:
+        return None
+    try:
+        # Camino rápido y silencioso para el formato normalizado YYYY-MM-DDTHH:MM:SS
+        dt = datetime.fromisoformat(str(timestamp).strip())
+    except (ValueError, TypeError):
+        dt = parse_iso_datetime_safe(timestamp)
+        if not dt:
+            return None
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None)
+    return dt.replace(tzinfo=timezone.utc).timestamp()
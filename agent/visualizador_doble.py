@@ -1,8 +1,9 @@
 # agent/visualizador_doble.py
-from typing import Dict, List, Set
-from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
 import networkx as nx
 from datetime import datetime
+from agent.agregado_conversaciones import AgregadoConversaciones
+from agent.layout_grafo import calcular_layout_completo, escala_layout
 
 class VisualizadorDobleNivel:
     """
@@ -10,21 +11,35 @@ class VisualizadorDobleNivel:
     - Vista Macro: Conversaciones como nodos
     - Vista Micro: Fragmentos individuales con conexiones 
     """
-    def __init__(self, grafo_contextos, metadatos_contextos, conversaciones_metadata, fragmentos_metadata):
+    def __init__(self, grafo_contextos, metadatos_contextos, conversaciones_metadata, fragmentos_metadata,
+                 agregado: AgregadoConversaciones = None,
+                 ubicar: Callable[[str], Optional[Tuple[float, float]]] = None):
         self.grafo_contextos = grafo_contextos
         self.metadatos_contextos = metadatos_contextos
         self.conversaciones_metadata = conversaciones_metadata
         self.fragmentos_metadata = fragmentos_metadata
+        # Relaciones entre conversaciones ya agregadas (si no viene, se calcula recorriendo las aristas)
+        self.agregado = agregado
+        # Posición (x, y) precalculada de un fragmento; si no viene, vis.js los ubica con física
+        self.ubicar = ubicar
     
-    def generar_vista_macro_conversaciones(self) -> Dict:
+    def _obtener_agregado(self) -> AgregadoConversaciones:
+        if self.agregado is None:
+            self.agregado = AgregadoConversaciones(self.grafo_contextos, self.metadatos_contextos)
+        return self.agregado
+    
+    def generar_vista_macro_conversaciones(self, conversaciones_ids: Set[str] = None) -> Dict:
         """
         Vista MACRO: Nodos = conversaciones completas, aristas = relaciones calculadas desde fragmentos.
+            conversaciones_ids: Si se especifica, solo esas conversaciones y las relaciones entre ellas
         """
         nodos_conversaciones = []
         edges_conversaciones = []
         
         # 1. Crear nodos de conversaciones
         for conv_id, conv_data in self.conversaciones_metadata.items():
+            if conversaciones_ids is not None and conv_id not in conversaciones_ids:
+                continue
             # Calcular estadísticas de la conversación
             fragmentos_ids = conv_data.get('fragmentos_ids', [])
             total_fragmentos = len(fragmentos_ids)
@@ -89,60 +104,23 @@ Dominio: {conv_data.get('metadata', {}).get('dominio', 'N/A')}"""
                 "size": max(15, min(40, total_fragmentos * 3))  # Tamaño proporcional a fragmentos
             })
         
-        # 2. Calcular relaciones entre conversaciones basadas en fragmentos internos
-        relaciones_conversaciones = defaultdict(lambda: {
-            'peso_total': 0.0,
-            'conexiones_fragmentos': 0,
-            'max_peso_individual': 0.0,
-            'tipos_relacion': set(),
-            'detalles_conexiones': []
-        })
-        
-        # Iterar sobre todas las aristas de fragmentos
-        for origen, destino, datos_arista in self.grafo_contextos.edges(data=True):
-            # Obtener conversaciones origen de cada fragmento
-            conv_origen = self.metadatos_contextos.get(origen, {}).get('conversacion_id')
-            conv_destino = self.metadatos_contextos.get(destino, {}).get('conversacion_id')
-            
-            # Si ambos fragmentos pertenecen a conversaciones diferentes
-            if conv_origen and conv_destino and conv_origen != conv_destino:
-                # Crear clave única para el par de conversaciones
-                par_conv = tuple(sorted([conv_origen, conv_destino]))
-                
-                peso_efectivo = datos_arista.get('peso_efectivo', 0)
-                peso_estructural = datos_arista.get('peso_estructural', 0) 
-                relevancia_temporal = datos_arista.get('relevancia_temporal', 0)
-                
-                # Acumular estadísticas de relación
-                rel_data = relaciones_conversaciones[par_conv]
-                rel_data['peso_total'] += peso_efectivo
-                rel_data['conexiones_fragmentos'] += 1
-                rel_data['max_peso_individual'] = max(rel_data['max_peso_individual'], peso_efectivo)
-                
-                # Clasificar tipo de relación
-                if relevancia_temporal > 0.3:
-                    rel_data['tipos_relacion'].add('temporal')
-                else:
-                    rel_data['tipos_relacion'].add('semantica')
-                
-                # Guardar detalles de conexión
-                rel_data['detalles_conexiones'].append({
-                    'fragmento_origen': origen,
-                    'fragmento_destino': destino,
-                    'peso_efectivo': peso_efectivo,
-                    'peso_estructural': peso_estructural,
-                    'relevancia_temporal': relevancia_temporal
-                })
+        # 2. Relaciones entre conversaciones: tabla agregada desde las aristas entre fragmentos
+        relaciones_conversaciones = self._obtener_agregado().pares()
+        if conversaciones_ids is not None:
+            relaciones_conversaciones = [
+                (par, datos) for par, datos in relaciones_conversaciones
+                if par[0] in conversaciones_ids and par[1] in conversaciones_ids
+            ]
         
         # 3. Crear aristas entre conversaciones
-        for (conv_a, conv_b), datos_relacion in relaciones_conversaciones.items():
+        for (conv_a, conv_b), datos_relacion in relaciones_conversaciones:
             if datos_relacion['peso_total'] > 0.3:  # Umbral mínimo para mostrar relación
                 # Peso promedio de conexiones
                 peso_promedio = datos_relacion['peso_total'] / datos_relacion['conexiones_fragmentos']
                 peso_normalizado = min(1.0, datos_relacion['peso_total'] / 2.0)  # Normalizar para visualización
                 
                 # Determinar color según tipo de relación predominante
-                es_temporal = 'temporal' in datos_relacion['tipos_relacion']
+                es_temporal = datos_relacion['es_temporal']
                 color_arista = "#4caf50" if es_temporal else "#2196f3"
                 
                 # Label con información agregada
@@ -174,6 +152,9 @@ Tipos: {tipos_str}"""
         # Eliminar aristas duplicadas y convertir a bidireccionales
         edges_conversaciones = self._eliminar_aristas_duplicadas(edges_conversaciones)
         
+        if self.ubicar is not None:
+            self._ubicar_conversaciones(nodos_conversaciones, relaciones_conversaciones)
+        
         return {
             "nodes": nodos_conversaciones,
             "edges": edges_conversaciones,
@@ -197,31 +178,7 @@ Tipos: {tipos_str}"""
         else:
             from agent.grafo import exportar_grafo_para_visualizacion
             # Vista micro completa (todos los fragmentos)
-            grafo_base = exportar_grafo_para_visualizacion()
-            
-            # Enriquecer con información de conversación
-            for nodo in grafo_base["nodes"]:
-                nodo_id = nodo["id"]
-                meta = self.metadatos_contextos.get(nodo_id, {})
-                
-                if meta.get("es_fragmento"):
-                    conv_id = meta.get("conversacion_id")
-                    conv_titulo = ""
-                    
-                    if conv_id and conv_id in self.conversaciones_metadata:
-                        conv_data = self.conversaciones_metadata[conv_id]
-                        conv_titulo = conv_data.get("titulo", "")
-                    
-                    # Actualizar tooltip con información de conversación
-                    titulo_original = nodo.get("title", "")
-                    nodo["title"] = f"{titulo_original}\n🗣️ Conversación: {conv_titulo}\n📍 Fragmento {meta.get('posicion_fragmento', '?')}/{meta.get('total_fragmentos_conversacion', '?')}"
-                    
-                    # Modificar label para indicar que es fragmento
-                    label_original = nodo.get("label", "")
-                    nodo["label"] = f"🧩 {label_original}"
-
-            # Eliminar aristas duplicadas y convertir a bidireccionales
-            grafo_base["edges"] = self._eliminar_aristas_duplicadas(grafo_base["edges"])
+            grafo_base = self.adaptar_a_vista_micro(exportar_grafo_para_visualizacion())
             
             grafo_base["meta"] = {
                 "tipo_vista": "micro_fragmentos_completa",
@@ -232,6 +189,37 @@ Tipos: {tipos_str}"""
             
             return grafo_base
     
+    def adaptar_a_vista_micro(self, grafo_base: Dict) -> Dict:
+        """
+        Nodos y aristas de exportar_grafo_para_visualizacion en formato de la vista micro:
+        datos de conversación en los fragmentos y una arista no dirigida por par.
+        Se usa tanto para la vista completa como para los deltas de /grafo/cambios.
+        """
+        # Enriquecer con información de conversación
+        for nodo in grafo_base["nodes"]:
+            nodo_id = nodo["id"]
+            meta = self.metadatos_contextos.get(nodo_id, {})
+            
+            if meta.get("es_fragmento"):
+                conv_id = meta.get("conversacion_id")
+                conv_titulo = ""
+                
+                if conv_id and conv_id in self.conversaciones_metadata:
+                    conv_data = self.conversaciones_metadata[conv_id]
+                    conv_titulo = conv_data.get("titulo", "")
+                
+                # Actualizar tooltip con información de conversación
+                titulo_original = nodo.get("title", "")
+                nodo["title"] = f"{titulo_original}\n🗣️ Conversación: {conv_titulo}\n📍 Fragmento {meta.get('posicion_fragmento', '?')}/{meta.get('total_fragmentos_conversacion', '?')}"
+                
+                # Modificar label para indicar que es fragmento
+                label_original = nodo.get("label", "")
+                nodo["label"] = f"🧩 {label_original}"
+
+        # Eliminar aristas duplicadas y convertir a bidireccionales
+        grafo_base["edges"] = self._eliminar_aristas_duplicadas(grafo_base["edges"])
+        return grafo_base
+    
     def _generar_vista_micro_filtrada(self, conversacion_id: str) -> Dict:
         """Vista micro filtrada para una conversación específica."""
         if conversacion_id not in self.conversaciones_metadata:
@@ -277,7 +265,7 @@ Tipos: {tipos_str}"""
                 Fragmento {posicion_pdf + 1} de {total_frags_pdf}
                 Tipo: PDF
                 Temporal: {'Sí' if es_temporal else 'No'}
-                Texto: {texto[:100]}..."""
+                Texto: {meta.get('resumen') or texto[:100] + '...'}"""
                     
                 else:
                     # FRAGMENTO DE CONVERSACIÓN NORMAL
@@ -299,7 +287,7 @@ Tipos: {tipos_str}"""
                 Tipo: {tipo_contexto}
                 Temporal: {'Sí' if es_temporal else 'No'}
                 Palabras clave: {', '.join(meta.get('palabras_clave', [])[:5])}
-                Texto: {texto[:100]}..."""
+                Texto: {meta.get('resumen') or texto[:100] + '...'}"""
                 
                 nodos_filtrados.append({
                     "id": frag_id,
@@ -308,12 +296,14 @@ Tipos: {tipos_str}"""
                     "group": "temporal" if es_temporal else "atemporal",
                     "tipo_contexto": tipo_contexto,
                     "posicion": posicion,
-                    "shape": "box"
+                    "shape": "box",
+                    **self._coordenadas(frag_id)
                 })
         
-        # 2. Crear aristas entre fragmentos de esta conversación
-        for origen, destino, datos in self.grafo_contextos.edges(data=True):
-            if origen in fragmentos_ids and destino in fragmentos_ids:
+        # 2. Crear aristas entre fragmentos de esta conversación (solo las suyas, desde el índice)
+        for origen, destino in self._obtener_agregado().aristas_de_conversacion(conversacion_id, solo_internas=True):
+            datos = self.grafo_contextos.get_edge_data(origen, destino)
+            if datos is not None and origen in fragmentos_ids and destino in fragmentos_ids:
                 # Obtener datos de la arista
                 peso_estructural = datos.get('peso_estructural', 0)
                 relevancia_temporal = datos.get('relevancia_temporal', 0)
@@ -355,6 +345,35 @@ Tipos: {tipos_str}"""
             }
         }
     
+    def _coordenadas(self, nodo_id: str) -> Dict:
+        posicion = self.ubicar(nodo_id) if self.ubicar is not None else None
+        return {"x": posicion[0], "y": posicion[1]} if posicion else {}
+    
+    def _ubicar_conversaciones(self, nodos_conversaciones: List[Dict], relaciones: List):
+        """
+        Layout de la vista macro: parte del centroide de los fragmentos de cada
+        conversación en el layout micro y lo ajusta sobre el grafo de conversaciones
+        (son pocas, así que es barato y queda cacheado con la vista).
+        """
+        grafo_macro = nx.Graph()
+        iniciales = {}
+        for nodo in nodos_conversaciones:
+            conv_id = nodo["id"]
+            grafo_macro.add_node(conv_id)
+            posiciones = [p for p in map(self.ubicar, self.conversaciones_metadata[conv_id].get('fragmentos_ids', [])) if p]
+            if posiciones:
+                iniciales[conv_id] = (sum(p[0] for p in posiciones) / len(posiciones),
+                                      sum(p[1] for p in posiciones) / len(posiciones))
+        for (conv_a, conv_b), datos_relacion in relaciones:
+            if conv_a in grafo_macro and conv_b in grafo_macro:
+                grafo_macro.add_edge(conv_a, conv_b, peso_efectivo=datos_relacion['peso_total'])
+        
+        escala = escala_layout(grafo_macro.number_of_nodes())
+        posiciones = calcular_layout_completo(grafo_macro, iniciales)
+        for nodo in nodos_conversaciones:
+            x, y = posiciones[nodo["id"]]
+            nodo["x"], nodo["y"] = round(x * escala, 1), round(y * escala, 1)
+    
     def obtener_estadisticas_doble_nivel(self) -> Dict:
         """Estadísticas comparativas entre ambos niveles de visualización."""
         # Estadísticas de conversaciones (macro)
@@ -371,19 +390,11 @@ Tipos: {tipos_str}"""
             if meta.get('es_fragmento') and meta.get('es_temporal')
         )
         
-        # Relaciones entre niveles
-        relaciones_intra_conversacion = 0  # Entre fragmentos de misma conversación
-        relaciones_inter_conversacion = 0  # Entre fragmentos de diferentes conversaciones
-        
-        for origen, destino, datos in self.grafo_contextos.edges(data=True):
-            conv_origen = self.metadatos_contextos.get(origen, {}).get('conversacion_id')
-            conv_destino = self.metadatos_contextos.get(destino, {}).get('conversacion_id')
-            
-            if conv_origen and conv_destino:
-                if conv_origen == conv_destino:
-                    relaciones_intra_conversacion += 1
-                else:
-                    relaciones_inter_conversacion += 1
+        # Relaciones entre niveles: contadores que se mantienen al ingerir cada nodo y en los recálculos completos
+        estadisticas_agregado = self._obtener_agregado().estadisticas()
+        relaciones_intra_conversacion = estadisticas_agregado["intra_conversacion"]  # Entre fragmentos de misma conversación
+        relaciones_inter_conversacion = estadisticas_agregado["inter_conversacion"]  # Entre fragmentos de diferentes conversaciones
+        total_relaciones = estadisticas_agregado["total_aristas"]
         
         # Distribución por tipos
         tipos_conversaciones = {}
@@ -413,11 +424,12 @@ Tipos: {tipos_str}"""
             "relaciones": {
                 "intra_conversacion": relaciones_intra_conversacion,
                 "inter_conversacion": relaciones_inter_conversacion,
-                "total_relaciones": self.grafo_contextos.number_of_edges()
+                "pares_conversaciones_relacionadas": estadisticas_agregado["pares_conversaciones"],
+                "total_relaciones": total_relaciones
             },
             "metricas": {
                 "promedio_fragmentos_por_conversacion": round(total_fragmentos / max(1, total_conversaciones), 2),
-                "ratio_relaciones_internas": round(relaciones_intra_conversacion / max(1, self.grafo_contextos.number_of_edges()) * 100, 1),
+                "ratio_relaciones_internas": round(relaciones_intra_conversacion / max(1, total_relaciones) * 100, 1),
                 "ratio_temporal_micro": round(fragmentos_temporales / max(1, total_fragmentos) * 100, 1)
             }
         }
@@ -480,8 +492,8 @@ Tipos: {tipos_str}"""
                     edge_existente['width'] = max(1, peso_promedio * 5)
                 
             else:
-                # Primera vez que vemos este par, agregarlo
-                aristas_unicas[clave] = edge.copy()
+                # Primera vez que vemos este par, agregarlo (con ID estable para actualizarla en el cliente)
+                aristas_unicas[clave] = {**edge, 'id': f"{clave[0]}|{clave[1]}"}
         
         # Convertir a bidireccionales (sin flechas)
         resultado = []
@@ -5,15 +5,15 @@ from dotenv import load_dotenv
 # Cargar variables de entorno del archivo .env
 load_dotenv()
 import json
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Union
 import os
 from agent import grafo, responder
 from agent.semantica import indexar_documento, buscar_similares
-from agent.temporal_llm_parser import analizar_temporalidad_con_llm
+from agent.temporal_llm_parser import analizar_temporalidad_hibrida, analizar_temporalidad_hibrida_async
 from datetime import datetime
 from agent.text_batch_processor import TextBatchProcessor
 from agent.utils import parse_iso_datetime_safe
@@ -25,9 +25,18 @@ import shutil
 from agent import grafo as modulo_grafo
 import networkx as nx
 from agent.metricas import metricas_sistema
+from agent.cache_temporal import cache_temporal
+from agent.cache_respuestas import cache_respuestas
+from agent.presupuesto_prompt import (seleccionar_contextos, pesos_desde_arbol, estimar_tokens,
+                                      PRESUPUESTO_TOKENS_PROMPT, MODO_PROMPT)
+from agent.plazo import PlazoConsulta, PLAZO_CONSULTA_MS
+from agent.trabajos import registro_trabajos
 import time
 import traceback
-from agent.semantica import coleccion
+import asyncio
+from agent.cliente_llm import cliente_llm
+from agent.proveedor_llm import proveedor_llm
+from agent.semantica import coleccion, matriz_embeddings
 
 # Inicialización
 grafo.cargar_desde_disco()
@@ -43,6 +52,9 @@ parametros_sistema = {
     'umbral_similitud': 0.5,
     'factor_refuerzo_temporal': 1.5,
     'k_resultados': 5,
+    'presupuesto_tokens_prompt': PRESUPUESTO_TOKENS_PROMPT,
+    'modo_prompt': MODO_PROMPT,
+    'modo_respuesta': responder.MODO_RESPUESTA,
 }
 
 class EntradaContexto(BaseModel):
@@ -55,6 +67,9 @@ class ConfiguracionParametros(BaseModel):
     umbral_similitud: Optional[float] = None
     factor_refuerzo_temporal: Optional[float] = None
     k_resultados: Optional[int] = None 
+    presupuesto_tokens_prompt: Optional[int] = None
+    modo_prompt: Optional[str] = None
+    modo_respuesta: Optional[str] = None
 
 class EntradaTextoPlano(BaseModel):
     texto: str
@@ -90,23 +105,98 @@ def obtener_contextos():
     return grafo.obtener_todos()
 
 @app.get("/preguntar/")
-def preguntar(pregunta: str):
+async def preguntar(pregunta: str):
     """Responde a una pregunta considerando momento de consulta."""
+    estado = await _preparar_preguntar(pregunta)
+    if "respuesta_inmediata" in estado:
+        return estado["respuesta_inmediata"]
+
+    # Generar respuesta con IA (o reutilizarla del caché)
+    respuesta = await _generar_respuesta(estado)
+    return _armar_respuesta_preguntar(estado, respuesta)
+
+async def _generar_respuesta(estado: Dict) -> str:
+    """
+    Respuesta del LLM para una consulta ya preparada. Si la misma pregunta recuperó
+    los mismos contextos sin cambios, se reutiliza la respuesta del caché.
+    Con muchos contextos (según modo_respuesta) responde en modo map-reduce.
+    """
+    variante, contextos = _modo_generacion(estado)
+    plazo = estado.get("plazo")
+    respuesta = cache_respuestas.obtener(estado["pregunta"], contextos, variante)
+    estado["cache_hit"] = respuesta is not None
+    if respuesta is None:
+        if variante == "map_reduce":
+            resultado = await responder.responder_map_reduce_async(
+                estado["pregunta"], contextos, pesos_desde_arbol(estado["subgrafo"]),
+                parametros_sistema.get('presupuesto_tokens_prompt', PRESUPUESTO_TOKENS_PROMPT),
+                plazo=plazo
+            )
+            respuesta = resultado["respuesta"]
+            _registrar_map_reduce(estado, resultado["informe"])
+            incompleta = "error" in resultado["informe"]  # Algún grupo de la fase map falló
+        else:
+            respuesta = await responder.responder_con_ia_async(estado["pregunta"], contextos, plazo=plazo)
+            incompleta = False
+        # Las respuestas degradadas (solo recuperación, por plazo o circuito abierto) no se cachean
+        if not incompleta and not responder.es_solo_recuperacion(respuesta):
+            cache_respuestas.guardar(estado["pregunta"], contextos, respuesta, variante)
+    return respuesta
+
+def _modo_generacion(estado: Dict):
+    """
+    ('', contextos del prompt) para la respuesta directa, o ('map_reduce', todos los
+    contextos recuperados) cuando corresponde map-reduce: cada grupo tiene su propio presupuesto.
+    """
+    modo = parametros_sistema.get('modo_respuesta', responder.MODO_RESPUESTA)
+    if responder.debe_usar_map_reduce(estado["contextos_recuperados"], modo):
+        return "map_reduce", estado["contextos_recuperados"]
+    return "", estado["contextos_relevantes"]
+
+def _registrar_map_reduce(estado: Dict, informe: Dict):
+    """Guarda el informe map-reduce en el estado y marca qué contextos entraron a algún prompt parcial."""
+    estado["map_reduce"] = informe
+    en_prompt = set(informe.get("contextos_en_prompt", []))
+    for info_ctx in estado["contextos_utilizados"]:
+        info_ctx["en_prompt"] = info_ctx["id"] in en_prompt
+
+def _aplicar_presupuesto_prompt(pregunta: str, contextos_relevantes: Dict, contextos_utilizados_info: List[Dict],
+                                arbol: Dict):
+    """
+    Selecciona y recorta los contextos que van al prompt según el presupuesto de tokens,
+    priorizando por peso_efectivo del árbol. Marca en contextos_utilizados cuáles entraron.
+    """
+    presupuesto = parametros_sistema.get('presupuesto_tokens_prompt', PRESUPUESTO_TOKENS_PROMPT)
+    contextos_prompt, informe = seleccionar_contextos(
+        pregunta, contextos_relevantes, pesos_desde_arbol(arbol), presupuesto,
+        modo=parametros_sistema.get('modo_prompt', MODO_PROMPT)
+    )
+    informe["tokens_prompt"] = estimar_tokens(responder.construir_prompt(pregunta, contextos_prompt))
+    print(f"Prompt: {informe['contextos_incluidos']}/{informe['contextos_recibidos']} contextos, "
+          f"~{informe['tokens_prompt']} tokens (presupuesto {presupuesto})")
+
+    for info_ctx in contextos_utilizados_info:
+        info_ctx["en_prompt"] = info_ctx["id"] in contextos_prompt
+        info_ctx["recortado"] = info_ctx["id"] in informe["recortados"]
+    return contextos_prompt, informe
+
+async def _preparar_preguntar(pregunta: str) -> Dict:
+    """Etapa de recuperación de /preguntar/: análisis, contextos y subgrafo (sin llamar al LLM para responder)."""
     pregunta = pregunta.strip()
     momento_consulta = datetime.now()  # Capturar momento exacto
     todos_contextos = grafo.obtener_todos()
 
     if not todos_contextos:
-        return {
+        return {"respuesta_inmediata": {
             "respuesta": "[ERROR] No hay contextos almacenados en el sistema",
             "contextos_utilizados": [],
             "subgrafo": {"nodes": [], "edges": [], "meta": {"error": "No hay contextos"}},
             "momento_consulta": momento_consulta.isoformat()
-        }
+        }}
 
     try:
         # Análisis completo con momento de consulta
-        analisis_completo = grafo.analizar_consulta_completa(pregunta, momento_consulta)
+        analisis_completo = await grafo.analizar_consulta_completa_async(pregunta, momento_consulta)
         analisis_intencion = analisis_completo["analisis_intencion"]
         ids_similares = analisis_completo["contextos_recuperados"]
         arbol = analisis_completo["arbol_consulta"]
@@ -115,7 +205,7 @@ def preguntar(pregunta: str):
     except Exception as e:
         print(f"Error en análisis: {e}")
         # Fallback a búsqueda básica
-        ids_similares = buscar_similares(pregunta, k=5)
+        ids_similares = await asyncio.to_thread(buscar_similares, pregunta, 5)
         analisis_intencion = {"error": f"Error en análisis: {str(e)}"}
         estrategia = {"error": "Estrategia fallback aplicada"}
         arbol = {"nodes": [], "edges": [], "meta": {"error": "Error en construcción"}}
@@ -158,16 +248,35 @@ def preguntar(pregunta: str):
             contextos_utilizados_info.append(info_ctx)
 
     if not contextos_relevantes:
-        return {
+        return {"respuesta_inmediata": {
             "respuesta": "[ERROR] No se encontraron contextos relevantes",
             "contextos_utilizados": [],
             "subgrafo": {"nodes": [], "edges": [], "meta": {"error": "Sin contextos relevantes"}},
             "analisis_intencion": analisis_intencion,
             "momento_consulta": momento_consulta.isoformat()
-        }
+        }}
 
-    # Generar respuesta con IA
-    respuesta = responder.responder_con_ia(pregunta, contextos_relevantes)
+    contextos_prompt, informe_prompt = _aplicar_presupuesto_prompt(
+        pregunta, contextos_relevantes, contextos_utilizados_info, arbol
+    )
+
+    return {
+        "pregunta": pregunta,
+        "momento_consulta": momento_consulta,
+        "contextos_relevantes": contextos_prompt,
+        "contextos_recuperados": contextos_relevantes,
+        "contextos_utilizados": contextos_utilizados_info,
+        "subgrafo": arbol,
+        "analisis_intencion": analisis_intencion,
+        "estrategia_aplicada": estrategia,
+        "presupuesto_prompt": informe_prompt
+    }
+
+def _armar_respuesta_preguntar(estado: Dict, respuesta: str) -> Dict:
+    """Arma la respuesta final de /preguntar/ a partir de la recuperación y el texto del LLM."""
+    momento_consulta = estado["momento_consulta"]
+    contextos_utilizados_info = estado["contextos_utilizados"]
+    estrategia = estado["estrategia_aplicada"]
 
     # Información adicional mejorada
     titulos_utilizados = [c["titulo"] for c in contextos_utilizados_info]
@@ -188,22 +297,43 @@ def preguntar(pregunta: str):
     return {
         "respuesta": respuesta_completa,
         "contextos_utilizados": contextos_utilizados_info,
-        "subgrafo": arbol,
-        "analisis_intencion": analisis_intencion,
+        "subgrafo": estado["subgrafo"],
+        "analisis_intencion": estado["analisis_intencion"],
         "estrategia_aplicada": estrategia,
-        "momento_consulta": momento_consulta.isoformat()
+        "momento_consulta": momento_consulta.isoformat(),
+        "presupuesto_prompt": estado["presupuesto_prompt"],
+        "map_reduce": estado.get("map_reduce"),
+        "cache_hit": estado.get("cache_hit", False)
     }
 
 @app.get("/preguntar-con-propagacion/")
-def preguntar_con_propagacion(pregunta: str, usar_propagacion: bool = True, max_pasos: int = 2,
-                             factor_decaimiento: float = None, umbral_activacion: float = None,k_inicial: int = None):
-    """Responde a una pregunta usando propagación de activación."""
-    # INICIAR MEDICIÓN DE TIEMPO
-    tiempo_inicio = time.time()
+async def preguntar_con_propagacion(pregunta: str, usar_propagacion: bool = True, max_pasos: int = 2,
+                             factor_decaimiento: float = None, umbral_activacion: float = None,k_inicial: int = None,
+                             plazo_ms: int = None, asincrono: bool = False):
+    """
+    Responde a una pregunta usando propagación de activación.
+    plazo_ms: tiempo máximo de la consulta (default PLAZO_CONSULTA_MS). Si no alcanza, se omiten
+    etapas en orden: árbol/explicaciones de propagación, saltos, análisis temporal LLM y respuesta LLM.
+    asincrono: devuelve enseguida la recuperación, el árbol y un trabajo_id; la respuesta
+    del LLM se genera en segundo plano y se consulta en /trabajos/{trabajo_id}.
+    """
+    estado = await _preparar_preguntar_con_propagacion(pregunta, usar_propagacion, max_pasos,
+                                                       factor_decaimiento, umbral_activacion, k_inicial,
+                                                       plazo_ms)
+    if "respuesta_inmediata" in estado:
+        return estado["respuesta_inmediata"]
 
-    # VALIDACIÓN DE ENTRADA
+    if asincrono:
+        return _lanzar_respuesta_diferida(estado, _armar_respuesta_con_propagacion)
+
+    # Generar respuesta con IA (o reutilizarla del caché)
+    respuesta = await _generar_respuesta(estado)
+    return _armar_respuesta_con_propagacion(estado, respuesta)
+
+def _limpiar_pregunta(pregunta: str):
+    """(pregunta limpia, None) o (pregunta, respuesta de error) si es inválida."""
     if not pregunta or len(pregunta.strip()) < 2:
-        return {
+        return pregunta, {
             "respuesta": "[ERROR] Pregunta demasiado corta o vacía",
             "contextos_utilizados": [],
             "subgrafo": {"nodes": [], "edges": [], "meta": {"error": "Entrada inválida"}},
@@ -215,23 +345,43 @@ def preguntar_con_propagacion(pregunta: str, usar_propagacion: bool = True, max_
     pregunta = re.sub(r'\s+', ' ', pregunta).strip()
     
     if len(pregunta) < 3:
-        return {
+        return pregunta, {
             "respuesta": "[ERROR] Pregunta demasiado corta después de limpieza",
             "contextos_utilizados": [],
             "subgrafo": {"nodes": [], "edges": [], "meta": {"error": "Entrada inválida"}},
             "momento_consulta": datetime.now().isoformat()
         }
-    momento_consulta = datetime.now()
+    return pregunta, None
+
+async def _preparar_preguntar_con_propagacion(pregunta: str, usar_propagacion: bool = True, max_pasos: int = 2,
+                                              factor_decaimiento: float = None, umbral_activacion: float = None,
+                                              k_inicial: int = None, plazo_ms: int = None,
+                                              plazo: PlazoConsulta = None, analisis_previo: Dict = None,
+                                              momento_consulta: datetime = None) -> Dict:
+    """
+    Etapa de recuperación de /preguntar-con-propagacion/ (sin llamar al LLM para responder).
+    /preguntar/batch pasa el plazo ya iniciado y el análisis ya calculado (analisis_previo).
+    """
+    # INICIAR MEDICIÓN DE TIEMPO
+    tiempo_inicio = time.time()
+    if plazo is None:
+        plazo = PlazoConsulta(plazo_ms if plazo_ms is not None else PLAZO_CONSULTA_MS)
+
+    # VALIDACIÓN DE ENTRADA
+    pregunta, respuesta_invalida = _limpiar_pregunta(pregunta)
+    if respuesta_invalida:
+        return {"respuesta_inmediata": respuesta_invalida}
+    momento_consulta = momento_consulta or datetime.now()
     todos_contextos = grafo.obtener_todos()
 
     if not todos_contextos:
-        return {
+        return {"respuesta_inmediata": {
             "respuesta": "[ERROR] No hay contextos almacenados en el sistema",
             "contextos_utilizados": [],
             "subgrafo": {"nodes": [], "edges": [], "meta": {"error": "No hay contextos"}},
             "momento_consulta": momento_consulta.isoformat(),
             "propagacion": {"error": "Sin contextos base"}
-        }
+        }}
 
     try:
         # Usar k_inicial del parámetro o el valor configurado en el sistema
@@ -241,13 +391,20 @@ def preguntar_con_propagacion(pregunta: str, usar_propagacion: bool = True, max_
         print(f"Factor base configurado: {factor_base}")
         print(f"k_inicial: {k_busqueda}") 
         
-        # Análisis con propagación
-        analisis_completo = grafo.analizar_consulta_con_propagacion(
-            pregunta, momento_consulta, usar_propagacion, max_pasos,
-            factor_decaimiento, umbral_activacion,
-            k_inicial=k_busqueda,
-            factor_refuerzo_temporal_custom=factor_base
-        )
+        if analisis_previo is not None:
+            analisis_completo = analisis_previo
+        else:
+            # Análisis básico asíncrono (LLM sin bloquear) + propagación en un hilo
+            analisis_basico = await grafo.analizar_consulta_completa_async(pregunta, momento_consulta, plazo=plazo)
+            analisis_completo = await asyncio.to_thread(
+                grafo.analizar_consulta_con_propagacion,
+                pregunta, momento_consulta, usar_propagacion, max_pasos,
+                factor_decaimiento, umbral_activacion,
+                k_inicial=k_busqueda,
+                factor_refuerzo_temporal_custom=factor_base,
+                analisis_basico=analisis_basico,
+                plazo=plazo
+            )
         # VERIFICAR que se aplicó en la respuesta
         if 'estrategia_aplicada' in analisis_completo:
             analisis_completo['estrategia_aplicada']['factor_refuerzo_configurado'] = factor_base
@@ -261,7 +418,7 @@ def preguntar_con_propagacion(pregunta: str, usar_propagacion: bool = True, max_
     except Exception as e:
         print(f"Error en análisis con propagación: {e}")
         # Fallback a método básico
-        ids_similares = buscar_similares(pregunta, k=5)
+        ids_similares = await asyncio.to_thread(buscar_similares, pregunta, 5)
         analisis_intencion = {"error": f"Error en análisis: {str(e)}"}
         estrategia = {"error": "Estrategia fallback aplicada"}
         arbol = {"nodes": [], "edges": [], "meta": {"error": "Error en construcción"}}
@@ -328,17 +485,44 @@ def preguntar_con_propagacion(pregunta: str, usar_propagacion: bool = True, max_
             contextos_utilizados_info.append(info_ctx)
 
     if not contextos_relevantes:
-        return {
+        return {"respuesta_inmediata": {
             "respuesta": "[ERROR] No se encontraron contextos relevantes",
             "contextos_utilizados": [],
             "subgrafo": {"nodes": [], "edges": [], "meta": {"error": "Sin contextos relevantes"}},
             "analisis_intencion": analisis_intencion,
             "momento_consulta": momento_consulta.isoformat(),
             "propagacion": info_propagacion
-        }
+        }}
 
-    # Generar respuesta con IA
-    respuesta = responder.responder_con_ia(pregunta, contextos_relevantes)
+    contextos_prompt, informe_prompt = _aplicar_presupuesto_prompt(
+        pregunta, contextos_relevantes, contextos_utilizados_info, arbol
+    )
+
+    return {
+        "pregunta": pregunta,
+        "momento_consulta": momento_consulta,
+        "tiempo_inicio": tiempo_inicio,
+        "plazo": plazo,
+        "usar_propagacion": usar_propagacion,
+        "presupuesto_prompt": informe_prompt,
+        "contextos_relevantes": contextos_prompt,
+        "contextos_recuperados": contextos_relevantes,
+        "contextos_utilizados": contextos_utilizados_info,
+        "subgrafo": arbol,
+        "analisis_intencion": analisis_intencion,
+        "estrategia_aplicada": estrategia,
+        "propagacion": info_propagacion
+    }
+
+def _armar_respuesta_con_propagacion(estado: Dict, respuesta: str) -> Dict:
+    """Arma la respuesta final con propagación, registra la métrica de tiempo y loguea profundidades."""
+    pregunta = estado["pregunta"]
+    momento_consulta = estado["momento_consulta"]
+    tiempo_inicio = estado["tiempo_inicio"]
+    usar_propagacion = estado["usar_propagacion"]
+    contextos_utilizados_info = estado["contextos_utilizados"]
+    estrategia = estado["estrategia_aplicada"]
+    info_propagacion = estado["propagacion"]
 
     # Información adicional mejorada
     titulos_utilizados = [c["titulo"] for c in contextos_utilizados_info]
@@ -371,7 +555,8 @@ def preguntar_con_propagacion(pregunta: str, usar_propagacion: bool = True, max_
         pregunta=pregunta,
         tiempo_ms=tiempo_ms,
         contextos_utilizados=len(contextos_utilizados_info),
-        usa_propagacion=usar_propagacion
+        usa_propagacion=usar_propagacion,
+        cache_hit=estado.get("cache_hit", False)
     )
 
     # LOGGING DE MÉTRICAS DE PROFUNDIDAD 
@@ -436,15 +621,234 @@ def preguntar_con_propagacion(pregunta: str, usar_propagacion: bool = True, max_
     return {
         "respuesta": respuesta_completa,
         "contextos_utilizados": contextos_utilizados_info,
-        "subgrafo": arbol,
-        "analisis_intencion": analisis_intencion,
+        "subgrafo": estado["subgrafo"],
+        "analisis_intencion": estado["analisis_intencion"],
         "estrategia_aplicada": estrategia,
         "momento_consulta": momento_consulta.isoformat(),
         "propagacion": info_propagacion,
+        "presupuesto_prompt": estado["presupuesto_prompt"],
+        "map_reduce": estado.get("map_reduce"),
+        "etapas_omitidas": [o["etapa"] for o in estado["plazo"].etapas_omitidas],
+        "plazo": estado["plazo"].informe(),
+        "cache_hit": estado.get("cache_hit", False),
         "tiempo_respuesta_ms": round(tiempo_ms, 2),  
         "tiempo_respuesta_segundos": round(tiempo_ms / 1000, 2)  
     }
 
+def _lanzar_respuesta_diferida(estado: Dict, armar_respuesta) -> Dict:
+    """
+    Modo asíncrono: la respuesta del LLM se genera en un trabajo en segundo plano y
+    se devuelve ya lo que no depende de ella (contextos, subgrafo, análisis).
+    """
+    async def _responder():
+        respuesta = await _generar_respuesta(estado)
+        return armar_respuesta(estado, respuesta)
+
+    trabajo_id = registro_trabajos.lanzar(_responder)
+    inmediata = {
+        "trabajo_id": trabajo_id,
+        "estado_trabajo": "pendiente",
+        "url_resultado": f"/trabajos/{trabajo_id}",
+        "respuesta": None,
+        "contextos_utilizados": estado["contextos_utilizados"],
+        "subgrafo": estado["subgrafo"],
+        "analisis_intencion": estado["analisis_intencion"],
+        "estrategia_aplicada": estado["estrategia_aplicada"],
+        "momento_consulta": estado["momento_consulta"].isoformat(),
+        "presupuesto_prompt": estado["presupuesto_prompt"]
+    }
+    if "propagacion" in estado:
+        inmediata["propagacion"] = estado["propagacion"]
+    return inmediata
+
+@app.get("/trabajos/{trabajo_id}")
+def obtener_trabajo(trabajo_id: str):
+    """Estado de un trabajo en segundo plano; con estado 'completado' trae la respuesta completa en 'resultado'."""
+    trabajo = registro_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return {"status": "error", "mensaje": "Trabajo no encontrado o expirado"}
+    return {"trabajo_id": trabajo_id, **trabajo}
+
+@app.get("/trabajos-estadisticas/")
+def estadisticas_trabajos():
+    """Estadísticas de los trabajos en segundo plano"""
+    return registro_trabajos.estadisticas()
+
+def _evento_sse(evento: str, datos: Dict) -> str:
+    """Formatea un evento Server-Sent Events con datos JSON."""
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+
+async def _emitir_respuesta_sse(estado: Dict, armar_respuesta):
+    """
+    Eventos SSE de una consulta: 'contexto' (recuperación y subgrafo) apenas termina
+    la recuperación, 'token' por cada fragmento del LLM y 'fin' con la respuesta
+    completa y sus metadatos (contextos_utilizados, estrategia_aplicada, ...).
+    """
+    if "respuesta_inmediata" in estado:
+        yield _evento_sse("fin", estado["respuesta_inmediata"])
+        return
+
+    yield _evento_sse("contexto", {
+        "contextos_utilizados": estado["contextos_utilizados"],
+        "subgrafo": estado["subgrafo"],
+        "analisis_intencion": estado["analisis_intencion"],
+        "momento_consulta": estado["momento_consulta"].isoformat()
+    })
+
+    variante, contextos = _modo_generacion(estado)
+    respuesta = cache_respuestas.obtener(estado["pregunta"], contextos, variante)
+    estado["cache_hit"] = respuesta is not None
+    if respuesta is not None:
+        yield _evento_sse("token", {"texto": respuesta})
+    else:
+        informe_stream = {}  # Tiempos del map-reduce y "error" si falló algún grupo o el LLM a mitad del stream
+        plazo = estado.get("plazo")
+        if variante == "map_reduce":
+            # Fase map sin streaming; solo la síntesis se envía a medida que se genera
+            generador = responder.responder_map_reduce_stream(
+                estado["pregunta"], contextos, pesos_desde_arbol(estado["subgrafo"]),
+                parametros_sistema.get('presupuesto_tokens_prompt', PRESUPUESTO_TOKENS_PROMPT),
+                informe=informe_stream, plazo=plazo
+            )
+        else:
+            generador = responder.responder_con_ia_stream(estado["pregunta"], contextos, informe=informe_stream,
+                                                          plazo=plazo)
+
+        fragmentos = []
+        async for fragmento in generador:
+            fragmentos.append(fragmento)
+            yield _evento_sse("token", {"texto": fragmento})
+
+        respuesta = responder.postprocesar_respuesta("".join(fragmentos).strip(), contextos)
+        if variante == "map_reduce":
+            _registrar_map_reduce(estado, informe_stream)
+        # Un stream cortado por un error (o una síntesis con grupos fallidos) no se cachea
+        if not informe_stream.get("error") and not responder.es_solo_recuperacion(respuesta):
+            cache_respuestas.guardar(estado["pregunta"], contextos, respuesta, variante)
+    yield _evento_sse("fin", armar_respuesta(estado, respuesta))
+
+def _respuesta_sse(eventos) -> StreamingResponse:
+    return StreamingResponse(eventos, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/preguntar/stream/")
+async def preguntar_stream(pregunta: str):
+    """Como /preguntar/ pero enviando la respuesta por Server-Sent Events a medida que se genera."""
+    estado = await _preparar_preguntar(pregunta)
+    return _respuesta_sse(_emitir_respuesta_sse(estado, _armar_respuesta_preguntar))
+
+@app.get("/preguntar-con-propagacion/stream/")
+async def preguntar_con_propagacion_stream(pregunta: str, usar_propagacion: bool = True, max_pasos: int = 2,
+                                           factor_decaimiento: float = None, umbral_activacion: float = None,
+                                           k_inicial: int = None, plazo_ms: int = None):
+    """Como /preguntar-con-propagacion/ pero enviando la respuesta por Server-Sent Events."""
+    estado = await _preparar_preguntar_con_propagacion(pregunta, usar_propagacion, max_pasos,
+                                                       factor_decaimiento, umbral_activacion, k_inicial,
+                                                       plazo_ms)
+    return _respuesta_sse(_emitir_respuesta_sse(estado, _armar_respuesta_con_propagacion))
+
+MAX_PREGUNTAS_BATCH = 32
+
+class EntradaBatch(BaseModel):
+    preguntas: List[str]
+    usar_propagacion: bool = True
+    max_pasos: int = 2
+    k_inicial: Optional[int] = None
+    max_concurrencia: int = 4
+    plazo_ms: Optional[int] = None
+
+@app.post("/preguntar/batch")
+async def preguntar_batch(entrada: EntradaBatch):
+    """
+    Responde varias preguntas compartiendo el trabajo común: un solo encode y una sola
+    consulta al índice vectorial, propagación reutilizada entre preguntas con semillas
+    en común y llamadas al LLM con a lo sumo `max_concurrencia` en paralelo.
+    plazo_ms rige para el batch completo (cada pregunta degrada sus etapas según lo que quede).
+    """
+    if not entrada.preguntas:
+        return {"status": "error", "mensaje": "No se recibieron preguntas"}
+    if len(entrada.preguntas) > MAX_PREGUNTAS_BATCH:
+        return {"status": "error", "mensaje": f"Máximo {MAX_PREGUNTAS_BATCH} preguntas por batch"}
+    if entrada.max_concurrencia < 1:
+        return {"status": "error", "mensaje": "max_concurrencia debe ser al menos 1"}
+
+    tiempo_inicio = time.time()
+    momento_consulta = datetime.now()
+    plazo_ms = entrada.plazo_ms if entrada.plazo_ms is not None else PLAZO_CONSULTA_MS
+
+    # Las inválidas se responden sin pasar por el análisis
+    resultados: List[Optional[Dict]] = [None] * len(entrada.preguntas)
+    validas = []  # (posición, pregunta limpia)
+    for posicion, pregunta in enumerate(entrada.preguntas):
+        pregunta_limpia, respuesta_invalida = _limpiar_pregunta(pregunta)
+        if respuesta_invalida:
+            resultados[posicion] = respuesta_invalida
+        else:
+            validas.append((posicion, pregunta_limpia))
+
+    plazos = {posicion: PlazoConsulta(plazo_ms) for posicion, _ in validas}
+    tiempos_batch = {}
+    info_propagacion_batch = {}
+    analisis_por_posicion = {}
+    if validas and grafo.obtener_todos():
+        try:
+            batch = await grafo.analizar_consultas_batch_async(
+                [pregunta for _, pregunta in validas], momento_consulta,
+                usar_propagacion=entrada.usar_propagacion, max_pasos=entrada.max_pasos,
+                k_inicial=entrada.k_inicial, factor_refuerzo=parametros_sistema.get('factor_refuerzo_temporal', 1.5),
+                plazos=[plazos[posicion] for posicion, _ in validas],
+                max_concurrencia_llm=entrada.max_concurrencia
+            )
+            analisis_por_posicion = {posicion: analisis for (posicion, _), analisis in zip(validas, batch["analisis"])}
+            tiempos_batch = batch["tiempos_ms"]
+            info_propagacion_batch = batch["propagacion"]
+        except Exception as e:
+            print(f"Error en análisis batch: {e}")
+            traceback.print_exc()
+            return {"status": "error", "mensaje": f"Error en análisis batch: {str(e)}"}
+
+    # Recuperación de cada pregunta con su análisis ya calculado
+    inicio_recuperacion = time.time()
+    estados = {}
+    for posicion, pregunta in validas:
+        estado = await _preparar_preguntar_con_propagacion(
+            pregunta, entrada.usar_propagacion, entrada.max_pasos, k_inicial=entrada.k_inicial,
+            plazo=plazos[posicion], analisis_previo=analisis_por_posicion.get(posicion),
+            momento_consulta=momento_consulta
+        )
+        if "respuesta_inmediata" in estado:
+            resultados[posicion] = estado["respuesta_inmediata"]
+        else:
+            estado["tiempo_inicio"] = tiempo_inicio  # La latencia de cada pregunta cuenta desde el inicio del batch
+            estados[posicion] = estado
+    tiempos_batch["armado_contextos"] = round((time.time() - inicio_recuperacion) * 1000, 2)
+
+    # Respuestas del LLM con concurrencia acotada
+    semaforo = asyncio.Semaphore(entrada.max_concurrencia)
+
+    async def _responder(posicion: int, estado: Dict):
+        async with semaforo:
+            respuesta = await _generar_respuesta(estado)
+        resultados[posicion] = _armar_respuesta_con_propagacion(estado, respuesta)
+
+    inicio_llm = time.time()
+    await asyncio.gather(*[_responder(posicion, estado) for posicion, estado in estados.items()])
+    tiempos_batch["respuestas_llm"] = round((time.time() - inicio_llm) * 1000, 2)
+
+    tiempo_total_ms = (time.time() - tiempo_inicio) * 1000
+    tiempos_batch["total"] = round(tiempo_total_ms, 2)
+    return {
+        "resultados": [
+            {"pregunta": pregunta, **resultado} for pregunta, resultado in zip(entrada.preguntas, resultados)
+        ],
+        "total_preguntas": len(entrada.preguntas),
+        "respondidas_por_llm": len(estados),
+        "cache_hits": sum(1 for estado in estados.values() if estado.get("cache_hit")),
+        "propagacion": info_propagacion_batch,
+        "tiempos_ms": tiempos_batch,
+        "tiempo_promedio_por_pregunta_ms": round(tiempo_total_ms / len(entrada.preguntas), 2)
+    }
+
 @app.post("/configurar-propagacion/")
 def configurar_parametros_propagacion_endpoint(factor_decaimiento: float = None, umbral_activacion: float = None):
     """Configura parámetros del algoritmo de propagación."""
@@ -492,7 +896,7 @@ def analizar_query(pregunta: str):
     """Analiza la intención temporal de una pregunta."""
     momento_consulta = datetime.now()
     factor_base = parametros_sistema.get('factor_refuerzo_temporal', 1.5)
-    return analizar_temporalidad_con_llm(pregunta, momento_consulta, factor_base)
+    return analizar_temporalidad_hibrida(pregunta, momento_consulta, factor_base)
 
 # ENDPOINTS PARA CONVERSACIONES
 class EntradaConversacion(BaseModel):
@@ -661,20 +1065,131 @@ class DatasetUpload(BaseModel):
     sobrescribir: bool = False
     
 #ENDPOINTS PARA VISUALIZACIÓN DOBLE NIVEL
+def _respuesta_vista(request: Request, vista: str, filtro_conversacion: str = None) -> Response:
+    """
+    Vista del grafo desde el caché pre-serializado. Con If-None-Match igual al ETag
+    vigente responde 304 sin cuerpo; Cache-Control no-cache hace que el navegador revalide.
+    """
+    return _respuesta_con_etag(request, *grafo.exportar_vista_serializada(vista, filtro_conversacion))
+
+def _respuesta_con_etag(request: Request, cuerpo: bytes, etag: str) -> Response:
+    cabeceras = {"ETag": etag, "Cache-Control": "no-cache"}
+    etags_cliente = [e.strip().removeprefix("W/") for e in request.headers.get("if-none-match", "").split(",")]
+    if etag in etags_cliente or "*" in etags_cliente:
+        return Response(status_code=304, headers=cabeceras)
+    return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
+
 @app.get("/grafo/macro/conversaciones/")
-def exportar_grafo_macro():
+def exportar_grafo_macro(request: Request):
     """Vista macro: conversaciones como nodos, relaciones agregadas."""
-    return grafo.exportar_grafo_macro_conversaciones()
+    return _respuesta_vista(request, "macro")
 
 @app.get("/grafo/micro/fragmentos/")
-def exportar_grafo_micro_completo():
+def exportar_grafo_micro_completo(request: Request):
     """Vista micro: todos los fragmentos individuales."""
-    return grafo.exportar_grafo_micro_fragmentos()
+    return _respuesta_vista(request, "micro")
 
 @app.get("/grafo/micro/conversacion/{conversacion_id}")
-def exportar_grafo_micro_conversacion(conversacion_id: str):
+def exportar_grafo_micro_conversacion(conversacion_id: str, request: Request):
     """Vista micro filtrada: solo fragmentos de una conversación específica."""
-    return grafo.exportar_grafo_micro_fragmentos(conversacion_id)
+    return _respuesta_vista(request, "micro", conversacion_id)
+
+@app.get("/grafo/lod")
+def exportar_grafo_lod(request: Request, nivel: str = "clusters", cluster: Optional[str] = None,
+                       conversacion: Optional[str] = None, x_min: Optional[float] = None,
+                       y_min: Optional[float] = None, x_max: Optional[float] = None,
+                       y_max: Optional[float] = None, limite: int = grafo.LIMITE_NODOS_LOD):
+    """
+    Vista por nivel de detalle: nivel=clusters, conversaciones (de un cluster) o fragmentos
+    (de un cluster y/o conversación). Con x_min/y_min/x_max/y_max solo se envía lo que cae en pantalla.
+    """
+    coordenadas = (x_min, y_min, x_max, y_max)
+    if any(c is not None for c in coordenadas) and any(c is None for c in coordenadas):
+        return {"status": "error", "mensaje": "La ventana requiere x_min, y_min, x_max e y_max"}
+    ventana = coordenadas if x_min is not None else None
+    return _respuesta_con_etag(request, *grafo.exportar_vista_lod_serializada(
+        nivel, cluster, conversacion, ventana, max(1, min(5000, limite))
+    ))
+
+@app.get("/grafo/comunidades/estado/")
+def estado_comunidades_grafo():
+    """Estado de la detección de comunidades (calculada en segundo plano por versión del grafo)"""
+    comunidades, _ = grafo.servicio_comunidades.obtener()
+    return {
+        **grafo.servicio_comunidades.estado(),
+        "algoritmo": comunidades["algoritmo"] if comunidades else None,
+        "total_clusters": len(comunidades["clusters"]) if comunidades else 0,
+        "aristas_entre_clusters": len(comunidades["aristas"]) if comunidades else 0
+    }
+
+@app.get("/grafo/cambios")
+def cambios_grafo(desde: int):
+    """
+    Nodos y aristas de la vista micro agregados, modificados o eliminados desde la versión `desde`
+    (meta.version_grafo de la vista). Con completo=true hay que recargar la vista entera.
+    """
+    return grafo.exportar_cambios_grafo(desde)
+
+# Clientes conectados a /grafo/ws: (cola con la última versión, loop del cliente)
+_suscriptores_cambios = set()
+
+def _ofrecer_version(cola: asyncio.Queue, version: int):
+    """Deja en la cola solo la versión más nueva (el cliente pide el delta acumulado)."""
+    if cola.full():
+        cola.get_nowait()
+    cola.put_nowait(version)
+
+def _notificar_version_grafo(version: int):
+    # Se llama desde el hilo que modificó el grafo: pasar al loop de cada conexión
+    for cola, loop in list(_suscriptores_cambios):
+        loop.call_soon_threadsafe(_ofrecer_version, cola, version)
+
+grafo.suscribir_cambios_grafo(_notificar_version_grafo)
+
+@app.websocket("/grafo/ws")
+async def canal_cambios_grafo(websocket: WebSocket):
+    """Avisa {"version": N} al conectarse y en cada cambio del grafo; el delta se pide a /grafo/cambios."""
+    await websocket.accept()
+    cola = asyncio.Queue(maxsize=1)
+    suscriptor = (cola, asyncio.get_running_loop())
+    _suscriptores_cambios.add(suscriptor)
+    try:
+        await websocket.send_json({"version": grafo.obtener_version_grafo()})
+        while True:
+            version = await cola.get()
+            await websocket.send_json({"version": version})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f" Cliente de cambios del grafo desconectado: {e}")
+    finally:
+        _suscriptores_cambios.discard(suscriptor)
+
+@app.get("/grafo/cache/estadisticas/")
+def estadisticas_cache_visualizacion():
+    """Aciertos y tamaño del caché de vistas serializadas"""
+    return {
+        "version_grafo": grafo.obtener_version_grafo(),
+        **grafo.cache_visualizacion.estadisticas(),
+        "registro_cambios": grafo.registro_cambios.estadisticas(),
+        "clientes_en_vivo": len(_suscriptores_cambios)
+    }
+
+@app.get("/grafo/layout/estado/")
+def estado_layout_grafo():
+    """Estado del layout de la visualización (calculado en segundo plano por versión del grafo)"""
+    layout, _ = grafo.servicio_layout.obtener()
+    return {
+        **grafo.servicio_layout.estado(),
+        "nodos_ubicados": len(layout["posiciones"]) if layout else 0,
+        "modo": layout["modo"] if layout else None,
+        "nodos_nuevos": layout["nodos_nuevos"] if layout else 0
+    }
+
+@app.get("/centralidad/")
+def obtener_centralidad(top_k: Optional[int] = None, pagina: int = 1, por_pagina: int = 20):
+    """Ranking de centralidad (calculado en segundo plano por versión del grafo)."""
+    return grafo.obtener_centralidad(top_k, pagina, por_pagina)
 
 @app.get("/estadisticas/doble-nivel/")
 def obtener_estadisticas_doble_nivel():
@@ -743,6 +1258,24 @@ def configurar_parametros_sistema(config: ConfiguracionParametros):
             else:
                 return {"status": "error", "mensaje": "k_resultados debe estar entre 3 y 15"}
         
+        if config.presupuesto_tokens_prompt is not None:
+            if 500 <= config.presupuesto_tokens_prompt <= 30000:
+                parametros_sistema['presupuesto_tokens_prompt'] = config.presupuesto_tokens_prompt
+            else:
+                return {"status": "error", "mensaje": "presupuesto_tokens_prompt debe estar entre 500 y 30000"}
+        
+        if config.modo_prompt is not None:
+            if config.modo_prompt in ("completo", "resumenes"):
+                parametros_sistema['modo_prompt'] = config.modo_prompt
+            else:
+                return {"status": "error", "mensaje": "modo_prompt debe ser 'completo' o 'resumenes'"}
+        
+        if config.modo_respuesta is not None:
+            if config.modo_respuesta in ("directo", "map_reduce", "auto"):
+                parametros_sistema['modo_respuesta'] = config.modo_respuesta
+            else:
+                return {"status": "error", "mensaje": "modo_respuesta debe ser 'directo', 'map_reduce' o 'auto'"}
+        
         # RECALCULAR RELACIONES SI CAMBIÓ EL UMBRAL
         mensaje_recalculo = ""
         if recalcular_relaciones:
@@ -809,11 +1342,11 @@ def obtener_estado_parametros():
     }
 
 @app.get("/debug-temporal/")
-def debug_analisis_temporal(pregunta: str):
+async def debug_analisis_temporal(pregunta: str):
     """Endpoint para debuggear análisis temporal."""
     momento_consulta = datetime.now()
     factor_base = parametros_sistema.get('factor_refuerzo_temporal', 1.5)
-    analisis = analizar_temporalidad_con_llm(
+    analisis = await analizar_temporalidad_hibrida_async(
         pregunta, 
         momento_consulta, 
         factor_base
@@ -984,6 +1517,9 @@ async def borrar_todos_datos():
         modulo_grafo.conversaciones_metadata = {}
         modulo_grafo.fragmentos_metadata = {}
         modulo_grafo.propagador_global = None
+        modulo_grafo.indice_dos_saltos = None
+        modulo_grafo.indice_temporal.reconstruir({})
+        modulo_grafo.registrar_cambio_grafo(reinicio=True)
         
         # 2. Borrar archivos de datos persistentes
         archivos_a_borrar = [
@@ -1026,8 +1562,10 @@ async def borrar_todos_datos():
             if todos_ids:
                 coleccion.delete(ids=todos_ids)
                 print(f"ChromaDB limpiado: {len(todos_ids)} documentos eliminados")
+            matriz_embeddings.reiniciar()
         except Exception as e:
             print(f"Error limpiando ChromaDB: {e}")
+        cache_respuestas.limpiar()
         
         # 6. Recrear directorios necesarios
         os.makedirs("data", exist_ok=True)
@@ -1073,6 +1611,64 @@ def limpiar_historial_metricas():
     metricas_sistema._guardar_historial()
     return {"status": "success", "mensaje": "Historial de métricas limpiado"}
 
+@app.get("/cache-temporal/estadisticas/")
+def obtener_estadisticas_cache_temporal():
+    """Aciertos/fallos del caché de análisis temporal"""
+    return cache_temporal.obtener_estadisticas()
+
+@app.delete("/cache-temporal/limpiar/")
+def limpiar_cache_temporal():
+    """Vacía el caché de análisis temporal"""
+    cache_temporal.limpiar()
+    return {"status": "success", "mensaje": "Caché temporal limpiado"}
+
+@app.get("/cliente-llm/estadisticas/")
+def obtener_estadisticas_cliente_llm():
+    """Concurrencia, llamadas, errores y timeouts del cliente asíncrono del LLM"""
+    return cliente_llm.estadisticas()
+
+@app.get("/proveedor-llm/estadisticas/")
+def obtener_estadisticas_proveedor_llm():
+    """Proveedor LLM activo (gemini, stub, grabar, reproducir) y tiempo acumulado en el LLM"""
+    return proveedor_llm.estadisticas()
+
+@app.on_event("shutdown")
+async def cerrar_cliente_llm():
+    """Cierra las conexiones HTTP reutilizadas del cliente LLM y escribe los cachés y grabaciones pendientes"""
+    await cliente_llm.cerrar()
+    cache_respuestas.guardar_ahora()
+    cache_temporal.guardar_ahora()
+    proveedor_llm.guardar_ahora()
+
+@app.get("/cache-respuestas/estadisticas/")
+def obtener_estadisticas_cache_respuestas():
+    """Aciertos/fallos del caché de respuestas del LLM"""
+    return cache_respuestas.obtener_estadisticas()
+
+@app.delete("/cache-respuestas/limpiar/")
+def limpiar_cache_respuestas():
+    """Vacía el caché de respuestas del LLM"""
+    cache_respuestas.limpiar()
+    return {"status": "success", "mensaje": "Caché de respuestas limpiado"}
+
+@app.get("/estado-llm/")
+def estado_llm():
+    """Estado de la capa de resiliencia del LLM: circuit breaker, timeouts, hedging y latencias"""
+    return {"proveedor": proveedor_llm.nombre, **proveedor_llm.estado_resiliencia()}
+
+@app.post("/estado-llm/fallas/")
+def configurar_fallas_llm(tasa_errores: float = None, tasa_lentas: float = None, latencia_lenta_ms: float = None):
+    """Inyección de fallas del proveedor stub (simular un incidente del LLM)"""
+    if not hasattr(proveedor_llm, "configurar_fallas"):
+        return {"status": "error", "mensaje": "La inyección de fallas solo está disponible con LLM_PROVEEDOR=stub"}
+    proveedor_llm.configurar_fallas(tasa_errores, tasa_lentas, latencia_lenta_ms)
+    return {"status": "success", "fallas": proveedor_llm.estadisticas()["fallas"]}
+
+@app.get("/resumenes/estado/")
+def estado_resumenes():
+    """Estado de la etapa de resúmenes extractivos en segundo plano"""
+    return grafo.servicio_resumenes.estado()
+
 # Servir archivos estáticos
 os.makedirs("static", exist_ok=True)
 app.mount("/", StaticFiles(directory="static", html=True), name="static")
\ No newline at end of file
@@ -4,6 +4,21 @@ let vistaActual = 'macro';
 let conversacionesList = {};
 let conversacionFiltroSeleccionada = null;
 
+// Sincronización en vivo: versión del grafo mostrada y DataSets para aplicar deltas
+let versionGrafoActual = null;
+let nodosDataSet = null;
+let aristasDataSet = null;
+let sincronizando = false;
+let cambiosPendientes = false;
+let recargaProgramada = null;
+
+// Vista por nivel de detalle: clusters -> conversaciones de un cluster -> fragmentos
+let lodNivel = 'clusters';
+let lodCluster = null;
+let lodConversacion = null;
+let lodVentanaActiva = false;  // Tras mover/zoomear, el LOD pide solo lo que está en pantalla
+let recargaVentanaProgramada = null;
+
 // PALETA DE COLORES 
 const coloresTipoContexto = {
     'reunion': {
@@ -83,6 +98,13 @@ function cambiarVista(nuevaVista) {
         conversacionFiltroSeleccionada = null;
     }
     
+    if (nuevaVista === 'clusters') {
+        lodNivel = 'clusters';
+        lodCluster = null;
+        lodConversacion = null;
+        lodVentanaActiva = false;
+    }
+    
     actualizarTituloVista();
     cargarGrafo();
 }
@@ -91,13 +113,15 @@ function actualizarTituloVista() {
     const titulos = {
         'macro': 'Vista Macro - Conversaciones',
         'micro': 'Vista Micro - Fragmentos/Contextos Completa',
-        'micro-filtrada': 'Vista Micro - Fragmentos Filtrada'
+        'micro-filtrada': 'Vista Micro - Fragmentos Filtrada',
+        'clusters': 'Vista por Clusters'
     };
     
     const descripciones = {
         'macro': 'Cada nodo representa una conversación completa',
         'micro': 'Cada nodo representa un fragmento o contexto individual',
-        'micro-filtrada': 'Fragmentos de una conversación específica'
+        'micro-filtrada': 'Fragmentos de una conversación específica',
+        'clusters': 'Doble clic en un nodo para ver su detalle, doble clic en el fondo para volver'
     };
     
     document.getElementById('tituloVista').textContent = titulos[vistaActual] || titulos['macro'];
@@ -280,6 +304,7 @@ Tipo: ${relevanciaTemp > 0.3 ? 'Temporal' : 'Semántica'}`;
         }
         
         return {
+            id: edge.id,
             from: edge.from,
             to: edge.to,
             label: label,
@@ -315,10 +340,13 @@ Tipo: ${relevanciaTemp > 0.3 ? 'Temporal' : 'Semántica'}`;
 // CARGA Y VISUALIZACIÓN DEL GRAFO
 async function cargarGrafo() {
     const container = document.getElementById('grafoContainer');
+    nodosDataSet = null;
+    aristasDataSet = null;
     container.innerHTML = '<div class="flex items-center justify-center h-full text-gray-500"><p class="text-lg">⏳ Cargando grafo...</p></div>';
     
     try {
         let url = '';
+        let params = {};
         
         switch(vistaActual) {
             case 'macro':
@@ -334,10 +362,23 @@ async function cargarGrafo() {
                 }
                 url = `/grafo/micro/conversacion/${conversacionFiltroSeleccionada}`;
                 break;
+            case 'clusters':
+                url = '/grafo/lod';
+                params = parametrosLod();
+                break;
         }
         
-        const response = await axios.get(url);
+        const response = await axios.get(url, { params });
         const data = response.data;
+        versionGrafoActual = data.meta ? data.meta.version_grafo : null;
+        
+        if (data.status === 'error') {
+            container.innerHTML = `<div class="flex items-center justify-center h-full text-orange-500"><p>${data.mensaje}</p></div>`;
+            return;
+        }
+        if (data.meta && data.meta.truncado) {
+            mostrarNotificacion(`Mostrando ${data.meta.total_enviados} de ${data.meta.total_disponibles} nodos`, 'warning');
+        }
         
         if (!data.nodes || data.nodes.length === 0) {
             container.innerHTML = '<div class="flex items-center justify-center h-full text-gray-500"><p>No hay datos para visualizar</p></div>';
@@ -348,9 +389,10 @@ async function cargarGrafo() {
         document.getElementById('totalNodos').textContent = data.nodes.length;
         document.getElementById('totalAristas').textContent = data.edges.length;
         
-        // Procesar y renderizar
-        const nodosProcesados = procesarNodos(data.nodes, vistaActual);
-        const aristasProcesadas = procesarAristas(data.edges, vistaActual);
+        // Procesar y renderizar (clusters y conversaciones del LOD se dibujan como la vista macro)
+        const estilo = vistaActual === 'clusters' ? (lodNivel === 'fragmentos' ? 'micro' : 'macro') : vistaActual;
+        const nodosProcesados = procesarNodos(data.nodes, estilo);
+        const aristasProcesadas = procesarAristas(data.edges, estilo);
         
         // Actualizar leyenda
         actualizarLeyenda();
@@ -373,6 +415,11 @@ function renderizarGrafo(nodos, aristas) {
     
     const nodes = new vis.DataSet(nodos);
     const edges = new vis.DataSet(aristas);
+    nodosDataSet = nodes;
+    aristasDataSet = edges;
+    
+    // Con el layout calculado en el servidor (x/y en todos los nodos) no hace falta simular física
+    const preposicionado = nodos.length > 0 && nodos.every(n => n.x !== undefined && n.y !== undefined);
     
     const options = {
         nodes: {
@@ -384,7 +431,7 @@ function renderizarGrafo(nodos, aristas) {
             selectionWidth: 3
         },
         physics: {
-            enabled: true,
+            enabled: !preposicionado,
             barnesHut: {
                 gravitationalConstant: -8000,
                 centralGravity: 0.3,
@@ -413,7 +460,7 @@ function renderizarGrafo(nodos, aristas) {
             multiselect: true
         },
         layout: {
-            improvedLayout: vistaActual === 'macro',
+            improvedLayout: !preposicionado && vistaActual === 'macro',
             randomSeed: vistaActual === 'macro' ? 42 : undefined
         }
     };
@@ -429,6 +476,21 @@ function renderizarGrafo(nodos, aristas) {
         }
     });
     
+    networkInstance.on('doubleClick', function(params) {
+        if (vistaActual !== 'clusters') return;
+        if (params.nodes.length > 0) {
+            bajarNivelLod(params.nodes[0]);
+        } else {
+            subirNivelLod();
+        }
+    });
+    
+    // Vista por clusters: al mover o zoomear se piden los nodos de la nueva ventana
+    networkInstance.on('zoom', programarRecargaVentanaLod);
+    networkInstance.on('dragEnd', function(params) {
+        if (params.nodes.length === 0) programarRecargaVentanaLod();
+    });
+    
     networkInstance.on('stabilizationIterationsDone', function() {
         networkInstance.setOptions({ physics: false });
     });
@@ -446,6 +508,87 @@ function renderizarGrafo(nodos, aristas) {
     }, 100);
 }
 
+function parametrosLod() {
+    const params = { nivel: lodNivel };
+    if (lodCluster) params.cluster = lodCluster;
+    if (lodConversacion) params.conversacion = lodConversacion;
+    const ventana = lodVentanaActiva ? ventanaVisible() : null;
+    if (ventana) Object.assign(params, ventana);
+    return params;
+}
+
+// Rectángulo visible en coordenadas del lienzo (las mismas del layout del servidor)
+function ventanaVisible() {
+    if (!networkInstance) return null;
+    const container = document.getElementById('grafoContainer');
+    const esquina1 = networkInstance.DOMtoCanvas({ x: 0, y: 0 });
+    const esquina2 = networkInstance.DOMtoCanvas({ x: container.clientWidth, y: container.clientHeight });
+    return {
+        x_min: Math.min(esquina1.x, esquina2.x),
+        y_min: Math.min(esquina1.y, esquina2.y),
+        x_max: Math.max(esquina1.x, esquina2.x),
+        y_max: Math.max(esquina1.y, esquina2.y)
+    };
+}
+
+function programarRecargaVentanaLod() {
+    if (vistaActual !== 'clusters') return;
+    clearTimeout(recargaVentanaProgramada);
+    recargaVentanaProgramada = setTimeout(recargarVentanaLod, 400);
+}
+
+// Pide los nodos de la ventana visible y actualiza los DataSets sin redibujar ni mover la cámara
+async function recargarVentanaLod() {
+    if (vistaActual !== 'clusters' || !nodosDataSet) return;
+    lodVentanaActiva = true;
+    try {
+        const { data } = await axios.get('/grafo/lod', { params: parametrosLod() });
+        if (data.status === 'error' || !data.nodes) return;
+        
+        const estilo = lodNivel === 'fragmentos' ? 'micro' : 'macro';
+        const nodos = procesarNodos(data.nodes, estilo);
+        const idsVisibles = new Set(nodos.map(n => n.id));
+        nodosDataSet.remove(nodosDataSet.getIds().filter(id => !idsVisibles.has(id)));
+        nodosDataSet.update(nodos);
+        aristasDataSet.clear();
+        aristasDataSet.add(procesarAristas(data.edges, estilo));
+        versionGrafoActual = data.meta ? data.meta.version_grafo : versionGrafoActual;
+        
+        document.getElementById('totalNodos').textContent = nodosDataSet.length;
+        document.getElementById('totalAristas').textContent = aristasDataSet.length;
+    } catch (error) {
+        console.error('Error cargando la ventana visible:', error);
+    }
+}
+
+function bajarNivelLod(nodoId) {
+    lodVentanaActiva = false;
+    if (lodNivel === 'clusters') {
+        lodCluster = nodoId;
+        lodNivel = 'conversaciones';
+    } else if (lodNivel === 'conversaciones') {
+        lodConversacion = nodoId;
+        lodNivel = 'fragmentos';
+    } else {
+        return;
+    }
+    cargarGrafo();
+}
+
+function subirNivelLod() {
+    lodVentanaActiva = false;
+    if (lodNivel === 'fragmentos') {
+        lodConversacion = null;
+        lodNivel = 'conversaciones';
+    } else if (lodNivel === 'conversaciones') {
+        lodCluster = null;
+        lodNivel = 'clusters';
+    } else {
+        return;
+    }
+    cargarGrafo();
+}
+
 function actualizarLeyenda() {
     const leyendaContainer = document.getElementById('leyendaContenido');
     
@@ -531,16 +674,74 @@ function actualizarGrafo() {
     cargarGrafo();
 }
 
+// SINCRONIZACIÓN EN VIVO (WebSocket + deltas)
+function conectarCambiosGrafo() {
+    const protocolo = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(`${protocolo}://${window.location.host}/grafo/ws`);
+    
+    socket.onmessage = (evento) => {
+        const { version } = JSON.parse(evento.data);
+        if (versionGrafoActual !== null && version !== versionGrafoActual) {
+            alCambiarGrafo();
+        }
+    };
+    // Reintentar si se corta (p. ej. reinicio del servidor)
+    socket.onclose = () => setTimeout(conectarCambiosGrafo, 3000);
+}
+
+function alCambiarGrafo() {
+    if (vistaActual === 'micro' && nodosDataSet) {
+        aplicarCambiosGrafo();
+        return;
+    }
+    // Macro y micro filtrada se recargan enteras (con ETag), agrupando ráfagas de cambios
+    clearTimeout(recargaProgramada);
+    recargaProgramada = setTimeout(cargarGrafo, 1500);
+}
+
+async function aplicarCambiosGrafo() {
+    if (sincronizando) {
+        cambiosPendientes = true;
+        return;
+    }
+    sincronizando = true;
+    try {
+        do {
+            cambiosPendientes = false;
+            const { data } = await axios.get('/grafo/cambios', { params: { desde: versionGrafoActual } });
+            
+            if (data.completo) {
+                await cargarGrafo();
+                return;
+            }
+            
+            nodosDataSet.update(procesarNodos(data.nodos, vistaActual));
+            nodosDataSet.remove(data.nodos_eliminados);
+            aristasDataSet.update(procesarAristas(data.aristas, vistaActual));
+            aristasDataSet.remove(data.aristas_eliminadas);
+            versionGrafoActual = data.version;
+            
+            document.getElementById('totalNodos').textContent = nodosDataSet.length;
+            document.getElementById('totalAristas').textContent = aristasDataSet.length;
+        } while (cambiosPendientes);
+    } catch (error) {
+        console.error('Error aplicando cambios del grafo:', error);
+    } finally {
+        sincronizando = false;
+    }
+}
+
 // INICIALIZACIÓN
 document.addEventListener('DOMContentLoaded', function() {
     // Cargar grafo inicial
     cargarGrafo();
+    conectarCambiosGrafo();
     
     // Detectar parámetros URL si se pasa una vista específica
     const urlParams = new URLSearchParams(window.location.search);
     const vistaParam = urlParams.get('vista');
     
-    if (vistaParam && ['macro', 'micro', 'micro-filtrada'].includes(vistaParam)) {
+    if (vistaParam && ['macro', 'micro', 'micro-filtrada', 'clusters'].includes(vistaParam)) {
         const radioId = `vista${vistaParam.charAt(0).toUpperCase() + vistaParam.slice(1).replace('-', '')}`;
         const radio = document.getElementById(radioId);
         if (radio) {
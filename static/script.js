@@ -180,38 +180,36 @@ async function preguntarConPropagacion() {
             max_pasos: parametrosPropagacion.max_pasos,
             factor_decaimiento: parametrosPropagacion.factor_decaimiento,
             umbral_activacion: parametrosPropagacion.umbral_activacion,
-            k_inicial: kResultados
+            k_inicial: kResultados,
+            asincrono: true
         });
         
+        // Modo asíncrono: contextos y árbol llegan enseguida, la respuesta del LLM después
         const res = await axios.get(`/preguntar-con-propagacion/?${params}`);
+        mostrarRecuperacion(res.data, elementos);
+        
+        let datos = res.data;
+        if (datos.trabajo_id) {
+            elementos.respuesta.innerHTML = "Contextos recuperados. Generando respuesta...";
+            datos = await esperarTrabajo(datos.trabajo_id);
+        }
         
         // CAPTURAR TIEMPO DE RESPUESTA 
-        const tiempoMs = res.data.tiempo_respuesta_ms || 0;
+        const tiempoMs = datos.tiempo_respuesta_ms || 0;
         
         // Mostrar respuesta con badge de tiempo
-        elementos.respuesta.innerHTML = res.data.respuesta + ' ' + formatearTiempoRespuesta(tiempoMs);
-        ultimaRespuesta = res.data.respuesta;
+        elementos.respuesta.innerHTML = datos.respuesta + ' ' + formatearTiempoRespuesta(tiempoMs);
+        ultimaRespuesta = datos.respuesta;
         ultimaPregunta = pregunta;
 
         // ACTUALIZAR MÉTRICAS 
         actualizarUltimaConsulta(tiempoMs);
         
-        // Mostrar información de estrategia
-        if (res.data.analisis_intencion && res.data.estrategia_aplicada) {
-            mostrarInformacionEstrategia(res.data, elementos);
-        }
-        
         // Mostrar botones según resultados
-        if (res.data.respuesta && !res.data.respuesta.startsWith("[ERROR]")) {
+        if (datos.respuesta && !datos.respuesta.startsWith("[ERROR]")) {
             elementos.botonAgregar.style.display = 'block';
         }
         
-        const subgrafo = res.data.subgrafo;
-        if (subgrafo && subgrafo.nodes && subgrafo.nodes.length > 0) {
-            ultimoSubgrafo = subgrafo;
-            elementos.botonArbol.style.display = 'block';
-        }
-        
     } catch (error) {
         elementos.respuesta.innerText = `Error: ${error.message}`;
         elementos.botonAgregar.style.display = 'none';
@@ -219,6 +217,30 @@ async function preguntarConPropagacion() {
     }
 }
 
+function mostrarRecuperacion(data, elementos) {
+    // Información de estrategia y árbol (no dependen de la respuesta del LLM)
+    if (data.analisis_intencion && data.estrategia_aplicada) {
+        mostrarInformacionEstrategia(data, elementos);
+    }
+    
+    const subgrafo = data.subgrafo;
+    if (subgrafo && subgrafo.nodes && subgrafo.nodes.length > 0) {
+        ultimoSubgrafo = subgrafo;
+        elementos.botonArbol.style.display = 'block';
+    }
+}
+
+async function esperarTrabajo(trabajoId, intervaloMs = 500) {
+    // Polling del trabajo en segundo plano hasta que termine
+    while (true) {
+        const res = await axios.get(`/trabajos/${trabajoId}`);
+        if (res.data.estado === 'completado') return res.data.resultado;
+        if (res.data.estado === 'error') throw new Error(res.data.error);
+        if (res.data.status === 'error') throw new Error(res.data.mensaje);
+        await new Promise(resolver => setTimeout(resolver, intervaloMs));
+    }
+}
+
 function mostrarInformacionEstrategia(data, elementos) {
     const analisis = data.analisis_intencion;
     const estrategia = data.estrategia_aplicada;
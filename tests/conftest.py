@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os
+import sys
+
+# Los tests no usan red: el proveedor LLM global es el stub sin latencia
+os.environ.setdefault("LLM_PROVEEDOR", "stub")
+os.environ.setdefault("LLM_STUB_LATENCIA", "fija:0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
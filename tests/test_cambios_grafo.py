@@ -0,0 +1,53 @@
+# tests/test_cambios_grafo.py
+from agent.cambios_grafo import RegistroCambiosGrafo
+
+
+def test_delta_acumula_nodos_y_aristas_desde_la_version():
+    registro = RegistroCambiosGrafo()
+    registro.registrar(1, nodos=["a"], aristas=[("a", "b")])
+    registro.registrar(2, nodos=["c"], aristas=[("c", "a")])
+    registro.registrar(3, nodos=["d"])
+
+    cambios = registro.cambios_desde(1, 3)
+    assert cambios == {"completo": False, "nodos": {"c", "d"}, "aristas": {("a", "c")}}
+
+
+def test_misma_version_no_tiene_cambios():
+    registro = RegistroCambiosGrafo()
+    registro.registrar(1, nodos=["a"])
+    assert registro.cambios_desde(1, 1) == {"completo": False, "nodos": set(), "aristas": set()}
+
+
+def test_aristas_se_normalizan_sin_direccion():
+    registro = RegistroCambiosGrafo()
+    registro.registrar(1, aristas=[("b", "a"), ("a", "b")])
+    assert registro.cambios_desde(0, 1)["aristas"] == {("a", "b")}
+
+
+def test_reinicio_obliga_a_recargar_a_quien_venga_de_antes():
+    registro = RegistroCambiosGrafo()
+    registro.registrar(1, nodos=["a"])
+    registro.registrar(2, reinicio=True)
+    registro.registrar(3, nodos=["b"])
+
+    assert registro.cambios_desde(1, 3) == {"completo": True}
+    # Quien ya vio el reinicio recibe solo lo posterior
+    assert registro.cambios_desde(2, 3) == {"completo": False, "nodos": {"b"}, "aristas": set()}
+
+
+def test_log_truncado_obliga_a_recargar():
+    registro = RegistroCambiosGrafo(max_versiones=3)
+    for version in range(1, 6):
+        registro.registrar(version, nodos=[f"n{version}"])
+
+    # Quedan las versiones 3, 4 y 5: desde 2 todavía se puede armar el delta, desde 1 no
+    assert registro.cambios_desde(2, 5) == {"completo": False, "nodos": {"n3", "n4", "n5"}, "aristas": set()}
+    assert registro.cambios_desde(1, 5) == {"completo": True}
+    assert registro.estadisticas()["version_mas_antigua"] == 3
+
+
+def test_version_futura_o_log_vacio_obliga_a_recargar():
+    registro = RegistroCambiosGrafo()
+    # Cliente de otra ejecución del servidor
+    assert registro.cambios_desde(10, 2) == {"completo": True}
+    assert registro.cambios_desde(0, 2) == {"completo": True}
@@ -0,0 +1,61 @@
+# tests/test_indice_dos_saltos.py
+import random
+import networkx as nx
+import pytest
+from agent.indice_dos_saltos import IndiceDosSaltos
+from agent.propagacion import PropagadorActivacion
+
+
+def _grafo_aleatorio(nodos: int = 40, aristas: int = 160, semilla: int = 7) -> nx.DiGraph:
+    azar = random.Random(semilla)
+    grafo = nx.DiGraph()
+    grafo.add_nodes_from(f"n{i}" for i in range(nodos))
+    while grafo.number_of_edges() < aristas:
+        origen, destino = azar.sample(range(nodos), 2)
+        grafo.add_edge(f"n{origen}", f"n{destino}", peso_efectivo=round(azar.uniform(0.0, 1.0), 3))
+    return grafo
+
+
+@pytest.mark.parametrize("activacion_inicial", [1.0, 0.6, 0.3])
+def test_propagacion_indexada_equivale_a_recorrer_el_grafo(activacion_inicial):
+    grafo = _grafo_aleatorio()
+    indexado = PropagadorActivacion(grafo, {}, IndiceDosSaltos(grafo, umbral=0.1))
+    recorrido = PropagadorActivacion(grafo, {})
+    assert indexado._indice_dos_saltos_vigente()
+
+    for nodo in grafo.nodes():
+        esperado = recorrido.propagar_desde_nodo(nodo, activacion_inicial, max_pasos=2)
+        obtenido = indexado.propagar_desde_nodo(nodo, activacion_inicial, max_pasos=2)
+        assert obtenido["activaciones"] == pytest.approx(esperado["activaciones"])
+        assert obtenido["profundidades"] == esperado["profundidades"]
+
+
+def test_actualizacion_incremental_equivale_a_reconstruir():
+    grafo = _grafo_aleatorio(semilla=11)
+    indice = IndiceDosSaltos(grafo, umbral=0.1)
+
+    azar = random.Random(3)
+    for numero in range(5):
+        nuevo = f"nuevo{numero}"
+        grafo.add_node(nuevo)
+        for vecino in azar.sample(sorted(grafo.nodes()), 6):
+            if vecino == nuevo:
+                continue
+            grafo.add_edge(nuevo, vecino, peso_efectivo=round(azar.uniform(0.0, 1.0), 3))
+            grafo.add_edge(vecino, nuevo, peso_efectivo=round(azar.uniform(0.0, 1.0), 3))
+        indice.actualizar_nodo_nuevo(nuevo)
+
+    reconstruido = IndiceDosSaltos(grafo, umbral=0.1)
+    for nodo in grafo.nodes():
+        assert indice.obtener(nodo) == reconstruido.obtener(nodo)
+
+
+def test_cambio_de_umbral_reconstruye_el_indice():
+    grafo = _grafo_aleatorio()
+    indice = IndiceDosSaltos(grafo, umbral=0.1)
+    propagador = PropagadorActivacion(grafo, {}, indice)
+
+    propagador.configurar_parametros(umbral_activacion=0.3)
+    assert indice.umbral == 0.3
+    assert propagador._indice_dos_saltos_vigente()
+    assert indice.obtener("n0") == IndiceDosSaltos(grafo, umbral=0.3).obtener("n0")
@@ -0,0 +1,105 @@
+# tests/test_resiliencia_llm.py
+import asyncio
+import time
+import pytest
+from agent import responder
+from agent.cliente_llm import ErrorLLM
+from agent.proveedor_llm import ProveedorStub
+from agent.resiliencia_llm import CircuitoAbiertoError, CircuitoLLM, TiempoAgotadoLLM
+
+ESPERA_CIRCUITO_S = 0.05
+CONTEXTOS = {"ctx1": {"titulo": "Reunión de planificación", "texto": "Se acordó el cronograma del proyecto."}}
+
+
+def _stub_con_circuito(**fallas) -> ProveedorStub:
+    proveedor = ProveedorStub(latencia="fija:0", semilla="0", **fallas)
+    proveedor.circuito = CircuitoLLM(umbral_fallos=3, espera_s=ESPERA_CIRCUITO_S)
+    return proveedor
+
+
+def test_circuito_se_abre_prueba_y_se_cierra():
+    proveedor = _stub_con_circuito(tasa_errores=1.0)
+
+    # cerrado -> abierto tras umbral_fallos fallos seguidos
+    for _ in range(3):
+        assert proveedor.circuito.estado()["estado"] == "cerrado"
+        with pytest.raises(ErrorLLM):
+            proveedor.generar("prompt")
+    assert proveedor.circuito.estado()["estado"] == "abierto"
+
+    # abierto: falla al instante sin llamar al stub
+    with pytest.raises(CircuitoAbiertoError):
+        proveedor.generar("prompt")
+    assert proveedor.fallas_inyectadas["errores"] == 3
+    assert proveedor.circuito.estado()["rechazadas"] == 1
+
+    # semiabierto: pasada la espera entra una sola llamada de prueba
+    time.sleep(ESPERA_CIRCUITO_S * 1.5)
+    assert proveedor.circuito.disponible()
+    proveedor.circuito.verificar()
+    assert proveedor.circuito.estado()["estado"] == "semiabierto"
+    with pytest.raises(CircuitoAbiertoError):
+        proveedor.circuito.verificar()
+    proveedor.circuito.liberar_prueba()
+
+    # La prueba sale bien: semiabierto -> cerrado
+    proveedor.configurar_fallas(tasa_errores=0.0)
+    assert proveedor.generar("prompt").startswith("Respuesta simulada del stub")
+    assert proveedor.circuito.estado()["estado"] == "cerrado"
+    assert proveedor.circuito.estado()["aperturas"] == 1
+
+
+def test_prueba_fallida_en_semiabierto_vuelve_a_abrir():
+    proveedor = _stub_con_circuito(tasa_errores=1.0)
+    for _ in range(3):
+        with pytest.raises(ErrorLLM):
+            proveedor.generar("prompt")
+
+    time.sleep(ESPERA_CIRCUITO_S * 1.5)
+    with pytest.raises(ErrorLLM):
+        proveedor.generar("prompt")
+    assert proveedor.circuito.estado()["estado"] == "abierto"
+    assert not proveedor.circuito.disponible()
+
+
+def test_circuito_abierto_responde_solo_con_lo_recuperado(monkeypatch):
+    proveedor = _stub_con_circuito(tasa_errores=1.0)
+    monkeypatch.setattr(responder, "proveedor_llm", proveedor)
+
+    # Los fallos del LLM se informan como error mientras el circuito sigue cerrado
+    for _ in range(3):
+        assert asyncio.run(responder.responder_con_ia_async("¿Qué se acordó?", CONTEXTOS)).startswith("[ERROR]")
+
+    respuesta = asyncio.run(responder.responder_con_ia_async("¿Qué se acordó?", CONTEXTOS))
+    assert respuesta.startswith(responder.MOTIVO_CIRCUITO)
+    assert responder.es_solo_recuperacion(respuesta)
+    assert "Reunión de planificación" in respuesta
+    assert proveedor.fallas_inyectadas["errores"] == 3
+
+
+def test_llamada_lenta_supera_el_timeout():
+    proveedor = _stub_con_circuito(tasa_lentas=1.0, latencia_lenta_ms=1000)
+    proveedor.timeout_s = 0.05
+
+    with pytest.raises(TiempoAgotadoLLM):
+        asyncio.run(proveedor.generar_async("prompt"))
+    assert proveedor.timeouts == 1
+    assert proveedor.circuito.estado()["fallos_seguidos"] == 1
+
+
+def test_cobertura_gana_cuando_la_primera_llamada_es_lenta():
+    # Con semilla "0" y tasa_lentas=0.5 la primera llamada sorteada es lenta y la segunda no
+    proveedor = _stub_con_circuito(tasa_lentas=0.5, latencia_lenta_ms=1000)
+    proveedor.hedging = True
+    for _ in range(20):
+        proveedor.latencias.registrar(20.0)
+
+    inicio = time.time()
+    respuesta = asyncio.run(proveedor.generar_async("prompt"))
+    duracion_ms = (time.time() - inicio) * 1000
+
+    assert respuesta.startswith("Respuesta simulada del stub")
+    assert proveedor.fallas_inyectadas["lentas"] == 1
+    assert proveedor.hedges_lanzados == 1
+    assert proveedor.hedges_ganadores == 1
+    assert duracion_ms < 500
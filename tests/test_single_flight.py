@@ -0,0 +1,88 @@
+# tests/test_single_flight.py
+import asyncio
+import threading
+import time
+import pytest
+from agent.single_flight import SingleFlight
+
+
+def test_llamadas_concurrentes_con_la_misma_clave_ejecutan_una_vez():
+    sf = SingleFlight()
+    ejecuciones = []
+    resultados = []
+
+    def funcion():
+        ejecuciones.append(1)
+        time.sleep(0.1)
+        return "respuesta"
+
+    hilos = [threading.Thread(target=lambda: resultados.append(sf.ejecutar("clave", funcion))) for _ in range(5)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(ejecuciones) == 1
+    assert resultados == ["respuesta"] * 5
+    estadisticas = sf.estadisticas()
+    assert estadisticas["ejecuciones"] == 1
+    assert estadisticas["deduplicadas"] == 4
+    assert estadisticas["en_vuelo"] == 0
+
+
+def test_el_error_del_lider_llega_a_los_que_esperan():
+    sf = SingleFlight()
+    errores = []
+
+    def funcion():
+        time.sleep(0.1)
+        raise ValueError("falla")
+
+    def llamar():
+        try:
+            sf.ejecutar("clave", funcion)
+        except ValueError as e:
+            errores.append(str(e))
+
+    hilos = [threading.Thread(target=llamar) for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == ["falla"] * 3
+    assert sf.estadisticas()["ejecuciones"] == 1
+
+
+def test_claves_distintas_no_se_deduplican():
+    sf = SingleFlight()
+    assert sf.ejecutar("a", lambda: 1) == 1
+    assert sf.ejecutar("b", lambda: 2) == 2
+    # Una llamada terminada no queda guardada: la misma clave vuelve a ejecutar
+    assert sf.ejecutar("a", lambda: 3) == 3
+    assert sf.estadisticas()["ejecuciones"] == 3
+
+
+def test_async_deduplica_y_sobrevive_a_la_cancelacion_del_lider():
+    sf = SingleFlight()
+    ejecuciones = []
+
+    async def fabrica():
+        ejecuciones.append(1)
+        await asyncio.sleep(0.1)
+        return "respuesta"
+
+    async def principal():
+        lider = asyncio.ensure_future(sf.ejecutar_async("clave", fabrica))
+        await asyncio.sleep(0)
+        seguidores = [asyncio.ensure_future(sf.ejecutar_async("clave", fabrica)) for _ in range(3)]
+        await asyncio.sleep(0)
+        lider.cancel()
+        resultados = await asyncio.gather(*seguidores)
+        with pytest.raises(asyncio.CancelledError):
+            await lider
+        return resultados
+
+    assert asyncio.run(principal()) == ["respuesta"] * 3
+    assert len(ejecuciones) == 1
+    assert sf.estadisticas()["deduplicadas"] == 3